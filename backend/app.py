@@ -8,6 +8,7 @@ import uuid
 import logging
 import os
 import sys
+import threading
 import time
 import datetime
 from sqlalchemy import or_, func
@@ -18,6 +19,9 @@ import io
 import requests
 import traceback
 
+# Add parent directory to path to ensure imports work (database.py uses thinkforge.db)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 # Import database configuration
 from database import get_db, engine, SessionLocal
 
@@ -27,9 +31,6 @@ from llm_service import LLMService
 # Import prompts
 from prompts import REASONING_TRACE_PROMPT
 
-# Add parent directory to path to ensure imports work
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-
 # Import the ThinkForge framework
 try:
     from thinkforge.controller import (
@@ -69,21 +70,16 @@ SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", "0.85"))
 # Create a singleton instance of Text2SQLController to be reused across requests
 controller_instance = None
 db_for_controller = None
-similarity_util = None
 
 def get_controller(db_session):
     """Get a shared instance of Text2SQLController"""
-    global controller_instance, db_for_controller, similarity_util
-    if similarity_util is None:
-        logger.info("Initializing shared similarity utility")
-        from thinkforge import Text2SQLSimilarity
-        similarity_util = Text2SQLSimilarity(model_name=DEFAULT_MODEL_NAME)
+    global controller_instance, db_for_controller
     if controller_instance is None:
         logger.info("Initializing singleton Text2SQLController instance")
+        # The controller reuses the similarity utility (and model) loaded for DEFAULT_MODEL_NAME
         controller_instance = Text2SQLController(
             db_session=db_session, similarity_model_name=DEFAULT_MODEL_NAME
         )
-        controller_instance.similarity_util = similarity_util
         db_for_controller = db_session
     else:
         # Update the database session if it's different, but keep the same controller
@@ -149,6 +145,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Buffered usage_count increments are only written by a later cache hit, so an
+# idle process flushes them on this timer (NLC_USAGE_FLUSH_INTERVAL seconds)
+USAGE_FLUSH_INTERVAL = float(os.environ.get("NLC_USAGE_FLUSH_INTERVAL", "5"))
+usage_flush_stop = threading.Event()
+
+
+def flush_usage_counts_once():
+    """Write the shared controller's buffered usage_count increments with a temporary session."""
+    if controller_instance is None:
+        return
+    db = SessionLocal()
+    try:
+        # The controller keeps its own session; only this flush uses the temporary one
+        controller_instance.flush_usage(session=db)
+    except Exception as e:
+        logger.error(f"Failed to flush usage counts: {e}")
+    finally:
+        db.close()
+
+
+def flush_usage_counts_periodically():
+    """Flush usage counts every USAGE_FLUSH_INTERVAL seconds until shutdown."""
+    while not usage_flush_stop.wait(USAGE_FLUSH_INTERVAL):
+        flush_usage_counts_once()
+
+
+@app.on_event("startup")
+def start_usage_flush_timer():
+    """Start the background usage_count flush when buffering is enabled."""
+    if USAGE_FLUSH_INTERVAL > 0:
+        threading.Thread(
+            target=flush_usage_counts_periodically, name="nlc-usage-flush", daemon=True
+        ).start()
+
+
+@app.on_event("shutdown")
+def flush_usage_counts():
+    """Stop the flush timer and write usage_count increments still buffered."""
+    usage_flush_stop.set()
+    flush_usage_counts_once()
+
 # Mount static files directory
 # Use an absolute path based on the current file's location
 # static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../frontend/static"))
@@ -262,7 +300,7 @@ async def get_cache_stats(
         # Get recent usage data (last 30 days)
         recent_usage = []
         try:
-            thirty_days_ago = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+            thirty_days_ago = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(days=30)
             usage_query = db.query(
                 func.date_trunc('day', UsageLog.timestamp).label('date'),
                 func.count(UsageLog.id).label('count')
@@ -766,7 +804,7 @@ async def create_cache_entry(entry: CacheEntryCreate, db: Session = Depends(get_
 @app.get("/v1/cache/{entry_id}")
 async def get_cache_entry(entry_id: int, db: Session = Depends(get_db)):
     """Get a specific cache entry by ID"""
-    entry = db.query(Text2SQLCache).filter(Text2SQLCache.id == entry_id).first()
+    entry = db.get(Text2SQLCache, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail=f"Cache entry with ID {entry_id} not found")
     
@@ -837,7 +875,7 @@ async def delete_cache_entry_api(entry_id: int, db: Session = Depends(get_db)):
 @app.post("/v1/cache/{entry_id}/test")
 async def test_cache_entry(entry_id: int, db: Session = Depends(get_db)):
     """Test a cache entry for validity"""
-    entry = db.query(Text2SQLCache).filter(Text2SQLCache.id == entry_id).first()
+    entry = db.get(Text2SQLCache, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail=f"Cache entry with ID {entry_id} not found")
     
@@ -876,7 +914,7 @@ async def test_cache_entry(entry_id: int, db: Session = Depends(get_db)):
         
         # Update validity in database
         entry.status = "active" if is_valid else "inactive"
-        entry.updated_at = datetime.datetime.now()
+        entry.updated_at = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
         db.commit()
         
         return {
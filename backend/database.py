@@ -6,13 +6,14 @@ Provides a dependency (`get_db`) for FastAPI endpoints to obtain a database sess
 """
 
 import os
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import logging
 import urllib.parse
 
+from thinkforge.db import get_engine
+
 load_dotenv() # Load environment variables from .env file
 
 logger = logging.getLogger(__name__)
@@ -37,7 +38,8 @@ logger.info(f"Database URL: {SQLALCHEMY_DATABASE_URL}")
 
 # --- Engine and Session Setup ---
 try:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    # Shared with the thinkforge package so the whole process uses one connection pool
+    engine = get_engine(SQLALCHEMY_DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
 
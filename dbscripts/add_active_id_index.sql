@@ -0,0 +1,10 @@
+-- Migration script to index the ids of active text2sql_cache entries
+-- Workflow execution prefetches its steps with id IN (...) AND status = 'active';
+-- the partial index answers that from active rows only, instead of combining the
+-- primary key with the status index.
+
+-- Define schema name (replace during deployment with actual schema name)
+\set schema_name 'public'
+
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_active_id
+    ON :"schema_name".text2sql_cache(id) WHERE status = 'active';
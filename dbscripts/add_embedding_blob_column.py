@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Add embedding_blob column to text2sql_cache table
+
+This script adds the embedding_blob column (raw float32 embedding bytes) to the
+text2sql_cache table if it doesn't exist, then backfills it from the JSONB
+vector_embedding of existing rows in batches.
+It uses SQLAlchemy to connect to the database and execute the SQL commands.
+"""
+
+import os
+import sys
+import logging
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+import numpy as np
+import orjson
+import urllib.parse
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("add_embedding_blob_column")
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection details
+DB_USER = os.environ.get("POSTGRES_USER", "user")
+DB_PASSWORD = os.environ.get("POSTGRES_PASSWORD", "password")
+DB_PASSWORD_encoded = urllib.parse.quote_plus(DB_PASSWORD)
+DB_HOST = os.environ.get("POSTGRES_HOST", "localhost")
+DB_PORT = os.environ.get("POSTGRES_PORT", "5432")
+DB_NAME = os.environ.get("POSTGRES_DB", "mcp_cache_db")
+DB_SCHEMA = os.environ.get("DB_SCHEMA", "public")
+
+# Full database URL (can be overridden by DATABASE_URL env var)
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL",
+    f"postgresql://{DB_USER}:{DB_PASSWORD_encoded}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# Rows converted per UPDATE round trip
+BATCH_SIZE = int(os.environ.get("BACKFILL_BATCH_SIZE", "1000"))
+
+
+def add_embedding_blob_column():
+    """Add embedding_blob column to the text2sql_cache table and backfill it."""
+    try:
+        logger.info(f"Connecting to database: {DATABASE_URL}")
+
+        # Create engine; psycopg2 decodes the JSONB embeddings with the faster parser
+        engine = create_engine(DATABASE_URL, json_deserializer=orjson.loads)
+
+        # Connect to the database
+        with engine.connect() as connection:
+            # Check if column exists
+            check_query = text(f"""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = '{DB_SCHEMA}'
+            AND table_name = 'text2sql_cache'
+            AND column_name = 'embedding_blob'
+            """)
+
+            result = connection.execute(check_query)
+            column_exists = result.fetchone() is not None
+
+            if column_exists:
+                logger.info("embedding_blob column already exists in the text2sql_cache table.")
+            else:
+                logger.info("Adding embedding_blob column to the text2sql_cache table...")
+
+                # Add the column
+                add_column_query = text(f"""
+                ALTER TABLE {DB_SCHEMA}.text2sql_cache
+                ADD COLUMN embedding_blob BYTEA
+                """)
+
+                connection.execute(add_column_query)
+                connection.commit()
+                logger.info("Column added successfully.")
+
+            # Backfill rows that only have the JSONB embedding
+            select_query = text(f"""
+            SELECT id, vector_embedding
+            FROM {DB_SCHEMA}.text2sql_cache
+            WHERE embedding_blob IS NULL
+            AND vector_embedding IS NOT NULL
+            AND id > :last_id
+            ORDER BY id
+            LIMIT :batch_size
+            """)
+            update_query = text(f"""
+            UPDATE {DB_SCHEMA}.text2sql_cache
+            SET embedding_blob = :blob
+            WHERE id = :id
+            """)
+
+            last_id = 0
+            backfilled = 0
+            while True:
+                rows = connection.execute(
+                    select_query, {"last_id": last_id, "batch_size": BATCH_SIZE}
+                ).fetchall()
+                if not rows:
+                    break
+                params = []
+                for row_id, embedding in rows:
+                    if isinstance(embedding, (str, bytes)):
+                        embedding = orjson.loads(embedding)
+                    params.append({
+                        "id": row_id,
+                        "blob": np.asarray(embedding, dtype=np.float32).tobytes(),
+                    })
+                connection.execute(update_query, params)
+                connection.commit()
+                last_id = rows[-1][0]
+                backfilled += len(params)
+                logger.info(f"Backfilled {backfilled} embeddings...")
+
+            logger.info(f"Backfill complete: {backfilled} rows updated.")
+
+        return True
+    except Exception as e:
+        logger.error(f"Error adding embedding_blob column: {e}")
+        return False
+
+if __name__ == "__main__":
+    if add_embedding_blob_column():
+        logger.info("Successfully added embedding_blob column to the text2sql_cache table.")
+        sys.exit(0)
+    else:
+        logger.error("Failed to add embedding_blob column to the text2sql_cache table.")
+        sys.exit(1)
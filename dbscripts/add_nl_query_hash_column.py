@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Add nl_query_hash column to text2sql_cache table
+
+This script adds the indexed nl_query_hash column (hash of the normalised
+nl_query) to the text2sql_cache table if it doesn't exist, then backfills it for
+existing rows in batches. The hash is computed in Python with the same function
+the library uses, so it matches what new writes store.
+It uses SQLAlchemy to connect to the database and execute the SQL commands.
+"""
+
+import os
+import sys
+import logging
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+import urllib.parse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from thinkforge.models import hash_nl_query
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("add_nl_query_hash_column")
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection details
+DB_USER = os.environ.get("POSTGRES_USER", "user")
+DB_PASSWORD = os.environ.get("POSTGRES_PASSWORD", "password")
+DB_PASSWORD_encoded = urllib.parse.quote_plus(DB_PASSWORD)
+DB_HOST = os.environ.get("POSTGRES_HOST", "localhost")
+DB_PORT = os.environ.get("POSTGRES_PORT", "5432")
+DB_NAME = os.environ.get("POSTGRES_DB", "mcp_cache_db")
+DB_SCHEMA = os.environ.get("DB_SCHEMA", "public")
+
+# Full database URL (can be overridden by DATABASE_URL env var)
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL",
+    f"postgresql://{DB_USER}:{DB_PASSWORD_encoded}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# Rows hashed per UPDATE round trip
+BATCH_SIZE = int(os.environ.get("BACKFILL_BATCH_SIZE", "1000"))
+
+
+def add_nl_query_hash_column():
+    """Add nl_query_hash column and its index to the text2sql_cache table and backfill it."""
+    try:
+        logger.info(f"Connecting to database: {DATABASE_URL}")
+
+        # Create engine
+        engine = create_engine(DATABASE_URL)
+
+        # Connect to the database
+        with engine.connect() as connection:
+            # Check if column exists
+            check_query = text(f"""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = '{DB_SCHEMA}'
+            AND table_name = 'text2sql_cache'
+            AND column_name = 'nl_query_hash'
+            """)
+
+            result = connection.execute(check_query)
+            column_exists = result.fetchone() is not None
+
+            if column_exists:
+                logger.info("nl_query_hash column already exists in the text2sql_cache table.")
+            else:
+                logger.info("Adding nl_query_hash column to the text2sql_cache table...")
+
+                # Add the column and its index
+                connection.execute(text(f"""
+                ALTER TABLE {DB_SCHEMA}.text2sql_cache
+                ADD COLUMN nl_query_hash VARCHAR(32)
+                """))
+                connection.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS idx_text2sql_cache_nl_query_hash
+                ON {DB_SCHEMA}.text2sql_cache(nl_query_hash)
+                """))
+                connection.commit()
+                logger.info("Column added successfully.")
+
+            # Backfill rows written before the column existed
+            select_query = text(f"""
+            SELECT id, nl_query
+            FROM {DB_SCHEMA}.text2sql_cache
+            WHERE nl_query_hash IS NULL
+            AND id > :last_id
+            ORDER BY id
+            LIMIT :batch_size
+            """)
+            update_query = text(f"""
+            UPDATE {DB_SCHEMA}.text2sql_cache
+            SET nl_query_hash = :nl_query_hash
+            WHERE id = :id
+            """)
+
+            last_id = 0
+            backfilled = 0
+            while True:
+                rows = connection.execute(
+                    select_query, {"last_id": last_id, "batch_size": BATCH_SIZE}
+                ).fetchall()
+                if not rows:
+                    break
+                params = [
+                    {"id": row_id, "nl_query_hash": hash_nl_query(nl_query)}
+                    for row_id, nl_query in rows
+                ]
+                connection.execute(update_query, params)
+                connection.commit()
+                last_id = rows[-1][0]
+                backfilled += len(params)
+                logger.info(f"Backfilled {backfilled} hashes...")
+
+            logger.info(f"Backfill complete: {backfilled} rows updated.")
+
+        return True
+    except Exception as e:
+        logger.error(f"Error adding nl_query_hash column: {e}")
+        return False
+
+if __name__ == "__main__":
+    if add_nl_query_hash_column():
+        logger.info("Successfully added nl_query_hash column to the text2sql_cache table.")
+        sys.exit(0)
+    else:
+        logger.error("Failed to add nl_query_hash column to the text2sql_cache table.")
+        sys.exit(1)
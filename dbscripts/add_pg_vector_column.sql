@@ -0,0 +1,24 @@
+-- Migration script to enable pgvector similarity search on text2sql_cache
+-- Adds the pg_vector column used when USE_PG_VECTOR=true and an HNSW index
+-- so cosine-distance searches are answered from the index instead of a table scan.
+
+-- Define schema name (replace during deployment with actual schema name)
+\set schema_name 'public'
+
+-- Requires the pgvector extension to be available on the server
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Embedding column (dimension must match the sentence-transformers model, 768 by default)
+ALTER TABLE :"schema_name".text2sql_cache ADD COLUMN IF NOT EXISTS pg_vector vector(768);
+
+-- Approximate nearest-neighbour index for the <=> (cosine distance) operator
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_pg_vector_hnsw
+    ON :"schema_name".text2sql_cache USING hnsw (pg_vector vector_cosine_ops);
+
+-- Backfill pg_vector from the JSONB embeddings of existing rows
+UPDATE :"schema_name".text2sql_cache
+SET pg_vector = vector_embedding::text::vector
+WHERE pg_vector IS NULL AND vector_embedding IS NOT NULL;
+
+-- Rows written since embeddings moved to embedding_blob have no JSONB copy;
+-- Text2SQLController.embed_missing_entries() fills pg_vector for those.
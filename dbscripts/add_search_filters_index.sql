@@ -0,0 +1,10 @@
+-- Migration script to index the search filter columns of text2sql_cache together
+-- search_query resolves its status/template_type/catalog_* filters in SQL before
+-- scoring; the composite index answers the common equality combinations (status
+-- first, as every search filters on it) without intersecting single-column indexes.
+
+-- Define schema name (replace during deployment with actual schema name)
+\set schema_name 'public'
+
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_search_filters
+    ON :"schema_name".text2sql_cache(status, template_type, catalog_type, catalog_subtype, catalog_name);
@@ -0,0 +1,13 @@
+-- Migration script to index text2sql_cache.tags for tag lookups
+-- get_query_by_tags filters with the JSONB @> (containment) and ? (key exists)
+-- operators, which a GIN index answers without scanning the table.
+
+-- Define schema name (replace during deployment with actual schema name)
+\set schema_name 'public'
+
+-- Tables created by SQLAlchemy before tags became JSONB on PostgreSQL store it as json
+ALTER TABLE :"schema_name".text2sql_cache ALTER COLUMN tags TYPE JSONB USING tags::jsonb;
+
+-- jsonb_ops (the default operator class) supports both @> and ?
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_tags_gin
+    ON :"schema_name".text2sql_cache USING gin (tags);
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Add usage_count column to text2sql_cache table
+
+This script adds the usage_count column to the text2sql_cache table if it doesn't exist.
+It uses SQLAlchemy to connect to the database and execute the SQL command.
+"""
+
+import os
+import sys
+import logging
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+import urllib.parse
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("add_usage_count_column")
+
+# Load environment variables
+load_dotenv()
+
+# Get database connection details
+DB_USER = os.environ.get("POSTGRES_USER", "user")
+DB_PASSWORD = os.environ.get("POSTGRES_PASSWORD", "password")
+DB_PASSWORD_encoded = urllib.parse.quote_plus(DB_PASSWORD)
+DB_HOST = os.environ.get("POSTGRES_HOST", "localhost")
+DB_PORT = os.environ.get("POSTGRES_PORT", "5432")
+DB_NAME = os.environ.get("POSTGRES_DB", "mcp_cache_db")
+DB_SCHEMA = os.environ.get("DB_SCHEMA", "public")
+
+# Full database URL (can be overridden by DATABASE_URL env var)
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL",
+    f"postgresql://{DB_USER}:{DB_PASSWORD_encoded}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+def add_usage_count_column():
+    """Add usage_count column to the text2sql_cache table if it doesn't exist."""
+    try:
+        logger.info(f"Connecting to database: {DATABASE_URL}")
+        
+        # Create engine
+        engine = create_engine(DATABASE_URL)
+        
+        # Connect to the database
+        with engine.connect() as connection:
+            # Check if column exists
+            check_query = text(f"""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_schema = '{DB_SCHEMA}' 
+            AND table_name = 'text2sql_cache' 
+            AND column_name = 'usage_count'
+            """)
+            
+            result = connection.execute(check_query)
+            column_exists = result.fetchone() is not None
+            
+            if column_exists:
+                logger.info("usage_count column already exists in the text2sql_cache table.")
+            else:
+                logger.info("Adding usage_count column to the text2sql_cache table...")
+                
+                # Add the column
+                add_column_query = text(f"""
+                ALTER TABLE {DB_SCHEMA}.text2sql_cache 
+                ADD COLUMN usage_count INTEGER NOT NULL DEFAULT 0
+                """)
+                
+                connection.execute(add_column_query)
+                connection.commit()
+                logger.info("Column added successfully.")
+        
+        return True
+    except Exception as e:
+        logger.error(f"Error adding usage_count column: {e}")
+        return False
+
+if __name__ == "__main__":
+    if add_usage_count_column():
+        logger.info("Successfully added usage_count column to the text2sql_cache table.")
+        sys.exit(0)
+    else:
+        logger.error("Failed to add usage_count column to the text2sql_cache table.")
+        sys.exit(1) 
\ No newline at end of file
@@ -5,19 +5,34 @@
 -- Create schema if it doesn't exist
 CREATE SCHEMA IF NOT EXISTS :"schema_name";
 
+-- Every statement below is idempotent, so the script can be re-run on an existing database.
+-- The enum types are created inside DO blocks (psql does not expand variables there),
+-- so they go into the schema through search_path.
+SET search_path TO :"schema_name";
+
 -- Create enum type for template types
-CREATE TYPE :"schema_name".template_type AS ENUM ('sql', 'url', 'api', 'workflow', 'graphql', 'regex', 'script', 'nosql', 'cli', 'prompt', 'configuration', 'reasoning_steps', 'dsl');
+DO $$ BEGIN
+    CREATE TYPE template_type AS ENUM ('sql', 'url', 'api', 'workflow', 'graphql', 'regex', 'script', 'nosql', 'cli', 'prompt', 'configuration', 'reasoning_steps', 'dsl');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- Create enum type for status
-CREATE TYPE :"schema_name".status_type AS ENUM ('pending', 'active', 'archive');
+DO $$ BEGIN
+    CREATE TYPE status_type AS ENUM ('pending', 'active', 'archive');
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+RESET search_path;
 
 -- Create text2sql_cache table
-CREATE TABLE :"schema_name".text2sql_cache (
+CREATE TABLE IF NOT EXISTS :"schema_name".text2sql_cache (
     id SERIAL PRIMARY KEY,
     nl_query VARCHAR NOT NULL,
+    nl_query_hash VARCHAR(32),
     template TEXT NOT NULL,
     template_type :"schema_name".template_type NOT NULL DEFAULT 'sql',
     vector_embedding JSONB,
+    embedding_blob BYTEA,
     is_template BOOLEAN NOT NULL DEFAULT FALSE,
     entity_replacements JSONB,
     reasoning_trace TEXT,
@@ -26,21 +41,28 @@ CREATE TABLE :"schema_name".text2sql_cache (
     catalog_subtype VARCHAR,
     catalog_name VARCHAR,
     status :"schema_name".status_type NOT NULL DEFAULT 'active',
+    usage_count INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create indexes for better query performance
-CREATE INDEX idx_text2sql_cache_nl_query ON :"schema_name".text2sql_cache(nl_query);
-CREATE INDEX idx_text2sql_cache_template_type ON :"schema_name".text2sql_cache(template_type);
-CREATE INDEX idx_text2sql_cache_is_template ON :"schema_name".text2sql_cache(is_template);
-CREATE INDEX idx_text2sql_cache_catalog_type ON :"schema_name".text2sql_cache(catalog_type);
-CREATE INDEX idx_text2sql_cache_catalog_subtype ON :"schema_name".text2sql_cache(catalog_subtype);
-CREATE INDEX idx_text2sql_cache_catalog_name ON :"schema_name".text2sql_cache(catalog_name);
-CREATE INDEX idx_text2sql_cache_status ON :"schema_name".text2sql_cache(status);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_nl_query ON :"schema_name".text2sql_cache(nl_query);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_nl_query_hash ON :"schema_name".text2sql_cache(nl_query_hash);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_template_type ON :"schema_name".text2sql_cache(template_type);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_is_template ON :"schema_name".text2sql_cache(is_template);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_catalog_type ON :"schema_name".text2sql_cache(catalog_type);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_catalog_subtype ON :"schema_name".text2sql_cache(catalog_subtype);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_catalog_name ON :"schema_name".text2sql_cache(catalog_name);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_status ON :"schema_name".text2sql_cache(status);
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_tags_gin ON :"schema_name".text2sql_cache USING gin (tags);
+-- Composite index for the status/template/catalog filters applied by every search
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_search_filters ON :"schema_name".text2sql_cache(status, template_type, catalog_type, catalog_subtype, catalog_name);
+-- Partial index for point lookups of active entries (workflow step prefetch)
+CREATE INDEX IF NOT EXISTS idx_text2sql_cache_active_id ON :"schema_name".text2sql_cache(id) WHERE status = 'active';
 
 -- Create usage_log table
-CREATE TABLE :"schema_name".usage_log (
+CREATE TABLE IF NOT EXISTS :"schema_name".usage_log (
     id SERIAL PRIMARY KEY,
     cache_entry_id INTEGER REFERENCES :"schema_name".text2sql_cache(id) ON DELETE SET NULL,
     timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -58,11 +80,11 @@ CREATE TABLE :"schema_name".usage_log (
 );
 
 -- Create index for usage_log
-CREATE INDEX idx_usage_log_cache_entry_id ON :"schema_name".usage_log(cache_entry_id);
-CREATE INDEX idx_usage_log_timestamp ON :"schema_name".usage_log(timestamp);
+CREATE INDEX IF NOT EXISTS idx_usage_log_cache_entry_id ON :"schema_name".usage_log(cache_entry_id);
+CREATE INDEX IF NOT EXISTS idx_usage_log_timestamp ON :"schema_name".usage_log(timestamp);
 
 -- Create cache_audit_log table
-CREATE TABLE :"schema_name".cache_audit_log (
+CREATE TABLE IF NOT EXISTS :"schema_name".cache_audit_log (
     id SERIAL PRIMARY KEY,
     cache_entry_id INTEGER REFERENCES :"schema_name".text2sql_cache(id) ON DELETE CASCADE,
     changed_field VARCHAR NOT NULL,
@@ -74,8 +96,8 @@ CREATE TABLE :"schema_name".cache_audit_log (
 );
 
 -- Create index for cache_audit_log
-CREATE INDEX idx_cache_audit_log_cache_entry_id ON :"schema_name".cache_audit_log(cache_entry_id);
-CREATE INDEX idx_cache_audit_log_timestamp ON :"schema_name".cache_audit_log(timestamp);
+CREATE INDEX IF NOT EXISTS idx_cache_audit_log_cache_entry_id ON :"schema_name".cache_audit_log(cache_entry_id);
+CREATE INDEX IF NOT EXISTS idx_cache_audit_log_timestamp ON :"schema_name".cache_audit_log(timestamp);
 
 -- Create trigger to automatically update updated_at timestamp
 CREATE OR REPLACE FUNCTION :"schema_name".update_updated_at_column()
@@ -86,6 +108,7 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+DROP TRIGGER IF EXISTS update_text2sql_cache_updated_at ON :"schema_name".text2sql_cache;
 CREATE TRIGGER update_text2sql_cache_updated_at
     BEFORE UPDATE ON :"schema_name".text2sql_cache
     FOR EACH ROW
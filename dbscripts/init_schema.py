@@ -4,9 +4,12 @@ Database Schema Initialization Utility
 
 This script creates or updates the database schema for the NL Cache Framework.
 It reads the schema name from the environment variables and replaces it in the SQL scripts.
+create_tables.sql only creates objects that are missing, so the script can be
+re-run against an existing database; it runs in a single transaction, so an
+unexpected error leaves the database unchanged.
 
 Usage:
-    python dbscripts/init_schema.py [--create-schema]
+    python dbscripts/init_schema.py [--create-schema] [--use-psql]
 """
 
 import os
@@ -14,8 +17,10 @@ import sys
 import argparse
 import logging
 import subprocess
+import pathlib
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2 import sql
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -41,29 +46,40 @@ DATABASE_URL = os.environ.get(
 # Path to SQL script
 SQL_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "create_tables.sql")
 
+# Script read once at import, with the schema name left as a format field
+_SQL_SCRIPT = pathlib.Path(SQL_SCRIPT_PATH).read_text().replace("{", "{{").replace("}", "}}")
+
+# psql flavour: the \set line is rewritten and psql expands :"schema_name" itself
+_SQL_TEMPLATE = _SQL_SCRIPT.replace("\\set schema_name 'public'", "\\set schema_name '{schema}'")
+
+# Server-side flavour: psql meta-commands dropped and the variable expanded here
+_SERVER_SQL_TEMPLATE = "\n".join(
+    line for line in _SQL_SCRIPT.splitlines() if not line.lstrip().startswith("\\")
+).replace(':"schema_name"', "{schema}")
+
+
+def get_connection():
+    """Open a psycopg2 connection using the configured database settings."""
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+
 
 def create_schema():
     """Create the schema if it doesn't exist."""
     try:
         logger.info(f"Connecting to database: {DATABASE_URL}")
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
+        conn = get_connection()
         conn.autocommit = True
         cursor = conn.cursor()
         
-        # Check if schema exists
-        cursor.execute(f"SELECT schema_name FROM information_schema.schemata WHERE schema_name = '{DB_SCHEMA}'")
-        if cursor.fetchone() is None:
-            logger.info(f"Schema '{DB_SCHEMA}' does not exist. Creating...")
-            cursor.execute(f"CREATE SCHEMA {DB_SCHEMA}")
-            logger.info(f"Schema '{DB_SCHEMA}' created successfully.")
-        else:
-            logger.info(f"Schema '{DB_SCHEMA}' already exists.")
+        # Single idempotent DDL statement with the schema name quoted as an identifier
+        cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(DB_SCHEMA)))
+        logger.info(f"Schema '{DB_SCHEMA}' is present.")
         
         conn.close()
         return True
@@ -72,18 +88,41 @@ def create_schema():
         return False
 
 
-def run_sql_script():
-    """Run the SQL script with the correct schema name."""
+def run_sql_script(use_psql=False):
+    """Run the SQL script with the correct schema name.
+
+    The script is executed over a single psycopg2 connection in one transaction;
+    every statement in it is idempotent, so existing objects are kept and any
+    other error rolls the whole script back. Pass use_psql=True to run it
+    through the psql client instead.
+    """
+    if use_psql:
+        return run_sql_script_psql()
+
     try:
-        # Read the SQL script
-        with open(SQL_SCRIPT_PATH, 'r') as f:
-            sql_script = f.read()
-        
-        # Create a temporary file with the schema name replaced
+        conn = get_connection()
+        try:
+            with conn, conn.cursor() as cursor:
+                schema = sql.Identifier(DB_SCHEMA).as_string(conn)
+                logger.info(f"Running SQL script with schema: {DB_SCHEMA}")
+                cursor.execute(_SERVER_SQL_TEMPLATE.format(schema=schema))
+        finally:
+            conn.close()
+
+        logger.info("SQL script executed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Error running SQL script: {e}")
+        return False
+
+
+def run_sql_script_psql():
+    """Run the SQL script through the psql client with the correct schema name."""
+    try:
+        # Create a temporary file with the schema name filled in
         temp_script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp_create_tables.sql")
         with open(temp_script_path, 'w') as f:
-            # Replace the schema name in the script
-            f.write(sql_script.replace("\\set schema_name 'public'", f"\\set schema_name '{DB_SCHEMA}'"))
+            f.write(_SQL_TEMPLATE.format(schema=DB_SCHEMA))
         
         # Run the script using psql
         psql_command = [
@@ -101,13 +140,20 @@ def run_sql_script():
         env["PGPASSWORD"] = DB_PASSWORD
         
         logger.info(f"Running SQL script with schema: {DB_SCHEMA}")
-        result = subprocess.run(psql_command, env=env, capture_output=True, text=True)
-        
-        # Clean up the temporary file
-        os.unlink(temp_script_path)
+        try:
+            # Discard stdout and relay stderr as it is produced instead of buffering it all
+            process = subprocess.Popen(
+                psql_command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+            )
+            for line in process.stderr:
+                logger.warning(f"psql: {line.rstrip()}")
+            returncode = process.wait()
+        finally:
+            # Clean up the temporary file
+            os.unlink(temp_script_path)
         
-        if result.returncode != 0:
-            logger.error(f"Error executing SQL script: {result.stderr}")
+        if returncode != 0:
+            logger.error(f"Error executing SQL script: psql exited with status {returncode}")
             return False
         
         logger.info("SQL script executed successfully")
@@ -121,6 +167,7 @@ def main():
     """Main function"""
     parser = argparse.ArgumentParser(description="Initialize database schema for NL Cache Framework")
     parser.add_argument("--create-schema", action="store_true", help="Create the schema if it doesn't exist")
+    parser.add_argument("--use-psql", action="store_true", help="Run the SQL script through the psql client")
     args = parser.parse_args()
     
     logger.info(f"Initializing database schema: {DB_SCHEMA}")
@@ -130,7 +177,7 @@ def main():
             logger.error("Failed to create schema")
             sys.exit(1)
     
-    if not run_sql_script():
+    if not run_sql_script(use_psql=args.use_psql):
         logger.error("Failed to run SQL script")
         sys.exit(1)
     
@@ -6,23 +6,79 @@ This script demonstrates how DSL components can be retrieved from the ThinkForge
 cache and composed together to build complex database queries.
 """
 
-import json
-from typing import Dict, List, Any, Optional
+import argparse
+import asyncio
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, List, Any, Optional, Tuple
+
+import orjson
+
+
+# component_type -> (clause bucket, renderer for component_data)
+_HANDLERS = {
+    'TABLE': lambda d: ('tables', d.get('table_name')),
+    'COLUMN': lambda d: ('columns', d.get('qualified_name') or f"{d.get('table_name')}.{d.get('column_name')}"),
+    'JOIN': lambda d: ('joins', f"{d.get('join_type', 'INNER')} JOIN {d.get('right_table')} ON {d.get('join_condition')}"),
+    'FILTER': lambda d: ('filters', d.get('filter_condition')),
+    'AGGREGATE': lambda d: ('aggregates', f"{d.get('expression')} AS {d.get('alias')}"),
+    'GROUP_BY': lambda d: ('group_bys', d.get('group_expression')),
+    'ORDER_BY': lambda d: ('order_bys', d.get('order_expression')),
+    'LIMIT': lambda d: ('limits', str(d.get('limit_count'))),
+}
+
+
+class DSLComponent:
+    """
+    A DSL component template decoded once, with its SQL fragment rendered up front
+    so that SQL assembly is only bucketing and joining strings.
+    """
+
+    __slots__ = ('component_type', 'component_data', 'bucket', 'fragment')
+
+    def __init__(self, component_type: Optional[str], component_data: Dict[str, Any]):
+        self.component_type = component_type
+        self.component_data = component_data
+        handler = _HANDLERS.get(component_type)
+        self.bucket, self.fragment = handler(component_data) if handler else (None, None)
+
+    @classmethod
+    def parse(cls, template: Any) -> "DSLComponent":
+        """
+        Build a component from a cached template (JSON text/bytes or a decoded dict).
+        """
+        template_data = orjson.loads(template) if isinstance(template, (str, bytes)) else template
+        return cls(template_data.get('component_type'), template_data.get('component_data', {}))
 
 
 class DSLQueryBuilder:
     """
     Utility class to build SQL queries from DSL components stored in ThinkForge cache.
     """
-    
-    def __init__(self, cache_controller):
+
+    TEMPLATE_TYPE = "dsl"
+    SIMILARITY_THRESHOLD = 0.7
+
+    def __init__(self, cache_controller, cache_size: int = 4096):
         """
         Initialize the DSL Query Builder with a ThinkForge controller.
         
         Args:
             cache_controller: An instance of Text2SQLController
+            cache_size: Maximum number of component lookups to memoise
         """
         self.controller = cache_controller
+        self.cache_size = cache_size
+        # LRU of (query_part, template_type, threshold) -> matching components
+        self._component_cache: "OrderedDict[Tuple[str, str, float], List[Dict[str, Any]]]" = OrderedDict()
+        # The controller's session and the memo are shared, so lookups run one at a time
+        self._lookup_lock = threading.Lock()
+        # LRU of template text -> decoded DSLComponent; kept apart from the
+        # returned matches so they stay plain JSON-serialisable dicts
+        self._parsed_templates: "OrderedDict[Any, DSLComponent]" = OrderedDict()
+        self._parse_lock = threading.Lock()
         
     def find_dsl_components(self, query_parts: List[str]) -> List[Dict[str, Any]]:
         """
@@ -34,21 +90,71 @@ class DSLQueryBuilder:
         Returns:
             List of matching DSL components from the cache
         """
-        components = []
+        with self._lookup_lock:
+            keys = [(part, self.TEMPLATE_TYPE, self.SIMILARITY_THRESHOLD) for part in query_parts]
+
+            # Look up every part not already memoised with a single batched search
+            misses = list(dict.fromkeys(key for key in keys if key not in self._component_cache))
+            fresh = {}
+            if misses:
+                matches_per_part = self.controller.search_query_batch(
+                    [part for part, _, _ in misses],
+                    template_type=self.TEMPLATE_TYPE,
+                    similarity_threshold=self.SIMILARITY_THRESHOLD,
+                    per_query_limit=1
+                )
+                fresh = dict(zip(misses, matches_per_part))
+                # Decode each template now, so building SQL from these matches does no JSON parsing
+                for matches in fresh.values():
+                    for match in matches:
+                        self._parse_template(match['template'])
+
+            components = []
+            for key in keys:
+                matches = fresh[key] if key in fresh else self._component_cache[key]
+                self._remember(key, matches)
+                components.extend(matches)
+
+            return components
+
+    async def afind_dsl_components(self, query_parts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Async variant of find_dsl_components for use inside an event loop.
+
+        The batched lookup runs in the default executor so the loop is not
+        blocked while the controller embeds the parts and queries the cache.
         
-        for query_part in query_parts:
-            # Search for DSL components matching this part
-            matches = self.controller.search_query(
-                nl_query=query_part,
-                template_type="dsl",
-                similarity_threshold=0.7,
-                limit=1
-            )
+        Args:
+            query_parts: List of natural language descriptions of needed components
             
-            if matches:
-                components.extend(matches)
-                
-        return components
+        Returns:
+            List of matching DSL components from the cache
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.find_dsl_components, query_parts)
+
+    def _parse_template(self, template: Any) -> DSLComponent:
+        """Return the decoded component for a template, parsing each template text once."""
+        if not isinstance(template, (str, bytes)):
+            return DSLComponent.parse(template)
+        with self._parse_lock:
+            parsed = self._parsed_templates.get(template)
+            if parsed is not None:
+                self._parsed_templates.move_to_end(template)
+                return parsed
+        parsed = DSLComponent.parse(template)
+        with self._parse_lock:
+            self._parsed_templates[template] = parsed
+            while len(self._parsed_templates) > self.cache_size:
+                self._parsed_templates.popitem(last=False)
+        return parsed
+
+    def _remember(self, key: Tuple[str, str, float], matches: List[Dict[str, Any]]) -> None:
+        """Store a lookup result, evicting the least recently used entry when full."""
+        self._component_cache[key] = matches
+        self._component_cache.move_to_end(key)
+        while len(self._component_cache) > self.cache_size:
+            self._component_cache.popitem(last=False)
     
     def build_sql_from_components(self, components: List[Dict[str, Any]]) -> str:
         """
@@ -61,70 +167,51 @@ class DSLQueryBuilder:
             Generated SQL query string
         """
         # Parse components by type
-        tables = []
-        columns = []
-        joins = []
-        filters = []
-        aggregates = []
-        group_bys = []
-        order_bys = []
-        limits = []
-        
+        buckets = defaultdict(list)
         for component in components:
-            template_data = json.loads(component['template']) if isinstance(component['template'], str) else component['template']
-            component_type = template_data.get('component_type')
-            component_data = template_data.get('component_data', {})
-            
-            if component_type == 'TABLE':
-                tables.append(component_data.get('table_name'))
-            elif component_type == 'COLUMN':
-                columns.append(component_data.get('qualified_name') or 
-                             f"{component_data.get('table_name')}.{component_data.get('column_name')}")
-            elif component_type == 'JOIN':
-                joins.append(f"{component_data.get('join_type', 'INNER')} JOIN {component_data.get('right_table')} ON {component_data.get('join_condition')}")
-            elif component_type == 'FILTER':
-                filters.append(component_data.get('filter_condition'))
-            elif component_type == 'AGGREGATE':
-                aggregates.append(f"{component_data.get('expression')} AS {component_data.get('alias')}")
-            elif component_type == 'GROUP_BY':
-                group_bys.append(component_data.get('group_expression'))
-            elif component_type == 'ORDER_BY':
-                order_bys.append(component_data.get('order_expression'))
-            elif component_type == 'LIMIT':
-                limits.append(str(component_data.get('limit_count')))
-        
-        # Build SQL query
-        sql_parts = []
-        
+            parsed = self._parse_template(component['template'])
+            if parsed.bucket is not None:
+                buckets[parsed.bucket].append(parsed.fragment)
+
+        # Build SQL query clause by clause into a single writer
+        out = []
+        w = out.append
+
         # SELECT clause
-        select_items = columns + aggregates if columns or aggregates else ['*']
-        sql_parts.append(f"SELECT {', '.join(select_items)}")
-        
+        w("SELECT ")
+        w(", ".join(chain(buckets['columns'], buckets['aggregates'])) or "*")
+
         # FROM clause
-        if tables:
-            sql_parts.append(f"FROM {tables[0]}")
-        
+        if buckets['tables']:
+            w("\nFROM ")
+            w(buckets['tables'][0])
+
         # JOIN clauses
-        for join in joins:
-            sql_parts.append(join)
-        
+        for join in buckets['joins']:
+            w("\n")
+            w(join)
+
         # WHERE clause
-        if filters:
-            sql_parts.append(f"WHERE {' AND '.join(filters)}")
-        
+        if buckets['filters']:
+            w("\nWHERE ")
+            w(" AND ".join(buckets['filters']))
+
         # GROUP BY clause
-        if group_bys:
-            sql_parts.append(f"GROUP BY {', '.join(group_bys)}")
-        
+        if buckets['group_bys']:
+            w("\nGROUP BY ")
+            w(", ".join(buckets['group_bys']))
+
         # ORDER BY clause
-        if order_bys:
-            sql_parts.append(f"ORDER BY {', '.join(order_bys)}")
-        
+        if buckets['order_bys']:
+            w("\nORDER BY ")
+            w(", ".join(buckets['order_bys']))
+
         # LIMIT clause
-        if limits:
-            sql_parts.append(f"LIMIT {limits[0]}")
-        
-        return '\n'.join(sql_parts)
+        if buckets['limits']:
+            w("\nLIMIT ")
+            w(buckets['limits'][0])
+
+        return "".join(out)
     
     def build_query_from_natural_language(self, nl_query: str, component_hints: List[str]) -> str:
         """
@@ -158,9 +245,33 @@ class DSLQueryBuilder:
         return sql_query
 
 
-def demo_dsl_query_building():
+def build_scenario_query(scenario: Dict[str, Any]) -> str:
+    """
+    Build one scenario's query against the real cache, using its own pooled session.
+    
+    Args:
+        scenario: Scenario with a 'description' and a list of 'components' hints
+        
+    Returns:
+        Generated SQL query string
+    """
+    from thinkforge import Text2SQLController, get_session
+
+    session = get_session()
+    try:
+        builder = DSLQueryBuilder(Text2SQLController(db_session=session))
+        return builder.build_query_from_natural_language(scenario['description'], scenario['components'])
+    finally:
+        session.close()
+
+
+def demo_dsl_query_building(execute: bool = False):
     """
     Demonstrate DSL query building with example scenarios.
+    
+    Args:
+        execute: Build each scenario against the configured cache database
+            (concurrently, one session per scenario) instead of only describing it
     """
     print("=== DSL Query Builder Demo ===\n")
     
@@ -209,6 +320,14 @@ def demo_dsl_query_building():
         print(f"   → This would search the cache for these DSL components")
         print(f"   → Then compose them into a complete SQL query")
     
+    if execute:
+        print("\n" + "=" * 50)
+        print("Building scenarios against the cache:")
+        with ThreadPoolExecutor(max_workers=len(scenarios)) as pool:
+            results = list(pool.map(build_scenario_query, scenarios))
+        for scenario, sql_query in zip(scenarios, results):
+            print(f"\n{scenario['description']}:\n{sql_query or '(no matching components)'}")
+    
     print("\n" + "=" * 50)
     print("Benefits of DSL Components:")
     print("• Reusable query building blocks")
@@ -219,4 +338,8 @@ def demo_dsl_query_building():
 
 
 if __name__ == "__main__":
-    demo_dsl_query_building() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="DSL Query Builder Demo")
+    parser.add_argument("--execute", action="store_true",
+                        help="Build the scenarios against the cache database configured via DATABASE_URL")
+    args = parser.parse_args()
+    demo_dsl_query_building(execute=args.execute) 
\ No newline at end of file
@@ -2,6 +2,9 @@
 
 import pytest
 from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Session
 import numpy as np
 import json
@@ -9,7 +12,7 @@ import json
 # Import from the library package
 from thinkforge.controller import Text2SQLController
 from thinkforge.similarity import Text2SQLSimilarity
-from thinkforge.models import Text2SQLCache, TemplateType, Status
+from thinkforge.models import Base, DB_SCHEMA, Text2SQLCache, TemplateType, Status
 
 # Sample data for mocking DB returns
 SAMPLE_CACHE_ENTRY_EXACT = Text2SQLCache(
@@ -67,6 +70,7 @@ def mock_db_session() -> MagicMock:
     mock_query.filter_by.return_value = mock_query  # Allow chaining filter_by
     mock_query.order_by.return_value = mock_query  # Allow chaining order_by
     mock_query.limit.return_value = mock_query  # Allow chaining limit
+    mock_query.options.return_value = mock_query  # Allow chaining loader options
     # Default return values for common query terminators
     mock_query.first.return_value = None
     mock_query.all.return_value = []
@@ -74,10 +78,34 @@ def mock_db_session() -> MagicMock:
     return session
 
 
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kw):
+    """Lets the legacy JSONB column be created on SQLite."""
+    return "JSON"
+
+
+@pytest.fixture
+def sqlite_session() -> Session:
+    """Provides a real Session on an in-memory SQLite database with the cache tables."""
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _attach_schema(dbapi_connection, connection_record):
+        # Tables are schema-qualified, so the schema is attached as a second database
+        dbapi_connection.execute(f"ATTACH DATABASE ':memory:' AS {DB_SCHEMA}")
+
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    yield session
+    session.close()
+    engine.dispose()
+
+
 @pytest.fixture
 def mock_similarity_util() -> MagicMock:
     """Provides a MagicMock simulating the Text2SQLSimilarity utility."""
     mock_util = MagicMock(spec=Text2SQLSimilarity)
+    mock_util.model = MagicMock()  # A loaded model (instance attribute, not in the spec)
     # Mock get_embedding to return a dummy array of the correct shape (e.g., 768 for mpnet)
     mock_util.get_embedding.return_value = MagicMock(spec=np.ndarray)
     mock_util.get_embedding.return_value.tolist.return_value = [
@@ -1,13 +1,20 @@
 import pytest
 from unittest.mock import MagicMock
+import datetime
 import json
+import os
 import numpy as np
 import requests
+from psycopg2 import sql as psycopg2_sql
+from sqlalchemy import ColumnDefault, select
+from sqlalchemy.orm import Session
 from unittest.mock import patch
 
 # Import the controller and model
-from thinkforge.controller import Text2SQLController
-from thinkforge.models import Text2SQLCache, TemplateType
+from thinkforge.controller import Text2SQLController, _cached_substitute
+from thinkforge.entity_substitution import Text2SQLEntitySubstitution, compile_substitution
+from thinkforge.models import Status, Text2SQLCache, Text2SQLCacheDTO, TemplateType, hash_nl_query
+from thinkforge.similarity import Text2SQLSimilarity
 
 # Fixtures are automatically used from conftest.py
 
@@ -18,6 +25,192 @@ def test_controller_init_failure():
         Text2SQLController(db_session=None)
 
 
+def test_controller_rejects_unknown_embedding_dtype():
+    """Test constructor fails for an unsupported embedding matrix dtype."""
+    with pytest.raises(ValueError):
+        Text2SQLController(db_session=MagicMock(), embedding_dtype="float8")
+
+
+def test_controllers_share_model_but_not_candidates():
+    """Test controllers for the same model reuse the loaded model but keep separate candidate slabs."""
+    model = MagicMock()
+    with patch.object(Text2SQLSimilarity, "_model_cache", {"shared-model": model}):
+        first = Text2SQLController(db_session=MagicMock(), similarity_model_name="shared-model")
+        second = Text2SQLController(db_session=MagicMock(), similarity_model_name="shared-model")
+
+    assert first.similarity_util is not second.similarity_util
+    assert first.similarity_util.model is model
+    assert second.similarity_util.model is model
+
+    first.similarity_util.add_candidates(np.ones((3, 4), dtype=np.float32))
+    assert first.similarity_util.get_candidate_matrix().shape == (3, 4)
+    assert second.similarity_util.get_candidate_matrix().shape == (0, 0)
+
+
+def test_cache_entry_embedding_conversion_is_memoised():
+    """Test the JSON embedding is converted once and re-read after the list changes."""
+    from sqlalchemy.orm.attributes import flag_modified
+
+    entry = Text2SQLCache(nl_query="q", template="t", vector_embedding=[3.0, 4.0])
+
+    first = entry.embedding
+    assert entry.embedding is first
+    assert not first.flags.writeable
+
+    entry.vector_embedding = [1.0, 0.0]
+    assert entry.embedding is not first
+    assert entry.embedding.tolist() == [1.0, 0.0]
+
+    entry.vector_embedding[1] = 2.0
+    flag_modified(entry, "vector_embedding")
+    assert entry.embedding.tolist() == [1.0, 2.0]
+
+
+def test_bulk_copy_from_dicts_streams_rows_with_copy():
+    """Test large PostgreSQL batches are written with COPY in CSV format."""
+    session = MagicMock()
+    connection = session.connection.return_value
+    connection.dialect.name = "postgresql"
+    cursor = connection.connection.cursor.return_value
+    copied = {}
+    cursor.copy_expert.side_effect = lambda sql, buf: copied.update(sql=sql, data=buf.read())
+
+    rows = [{"nl_query": f"Query {i}", "template": 'SELECT "x"', "tags": {"t": ["1"]}} for i in range(100)]
+    assert Text2SQLCache.bulk_copy_from_dicts(session, rows) == 100
+
+    session.execute.assert_not_called()
+    statement = copied["sql"]
+    assert isinstance(statement, psycopg2_sql.Composed)
+    table, column_list = [part for part in statement.seq if not isinstance(part, psycopg2_sql.SQL)]
+    assert table == psycopg2_sql.Identifier("public", "text2sql_cache")
+    assert [ident.string for ident in column_list.seq[:3:2]] == ["nl_query", "nl_query_hash"]
+    lines = copied["data"].splitlines()
+    assert len(lines) == 100
+    assert lines[0].startswith('"Query 0"\t"')
+    assert '"SELECT ""x"""' in lines[0]
+    assert '"{""t"": [""1""]}"' in lines[0]
+
+
+def test_bulk_copy_from_dicts_evaluates_callable_defaults():
+    """Test callable column defaults are called, not assumed to be timestamps."""
+    session = MagicMock()
+    session.connection.return_value.dialect.name = "sqlite"
+
+    with patch.object(
+        Text2SQLCache.__table__.c.catalog_type, "default",
+        ColumnDefault(lambda: "default-catalog"),
+    ):
+        Text2SQLCache.bulk_copy_from_dicts(session, [{"nl_query": "q", "template": "t"}])
+
+    row = session.execute.call_args[0][1][0]
+    assert row["catalog_type"] == "default-catalog"
+    assert isinstance(row["created_at"], datetime.datetime)
+    assert row["status"] == Status.ACTIVE
+
+
+def test_cache_entry_dto_round_trip():
+    """Test dictionaries read into a DTO give the same rows and instances as before."""
+    dto = Text2SQLCacheDTO.from_dict(
+        {"nl_query": "Show  Users", "sql_query": "SELECT 1", "cache_type": "template", "vector_embedding": [3.0, 4.0]}
+    )
+    assert dto.template == "SELECT 1"
+    assert dto.is_template is True
+
+    row = dto.to_row()
+    assert "id" not in row
+    assert row["nl_query_hash"] == hash_nl_query("show users")
+    assert np.frombuffer(row["embedding_blob"], dtype=np.float32).tolist() == pytest.approx([0.6, 0.8])
+
+    entry = Text2SQLCache.from_dict({"nl_query": "Show  Users", "sql_query": "SELECT 1", "vector_embedding": [3.0, 4.0]})
+    assert isinstance(entry, Text2SQLCache)
+    assert entry.embedding_blob == row["embedding_blob"]
+    assert entry.nl_query_hash == row["nl_query_hash"]
+
+
+def test_topk_similar_scores_all_rows_in_one_pass():
+    """Test ranking blob and legacy JSON embeddings together, best first."""
+    session = MagicMock()
+    query = session.query.return_value
+    query.filter_by.return_value = query
+    query.filter.return_value = query
+    query.all.return_value = [
+        (1, np.array([1.0, 0.0], dtype=np.float32).tobytes(), None),
+        (2, None, [0.0, 2.0]),
+        (3, np.array([0.6, 0.8], dtype=np.float32).tobytes(), None),
+    ]
+
+    hits = Text2SQLCache.topk_similar(session, np.array([0.0, 1.0]), k=2, status="active")
+
+    query.filter_by.assert_called_once_with(status="active")
+    assert [entry_id for entry_id, _ in hits] == [2, 3]
+    assert hits[0][1] == pytest.approx(1.0)
+    assert hits[1][1] == pytest.approx(0.8)
+
+
+def test_entity_replacements_json_is_memoised():
+    """Test the replacements JSON is encoded once per value, in substitution order."""
+    from sqlalchemy.orm.attributes import flag_modified
+
+    replacements = {"year": {"placeholder": ":year"}, "region": {"placeholder": ":region"}}
+    entry = Text2SQLCache(nl_query="q", template="t", entity_replacements=replacements)
+
+    first = entry.entity_replacements_json
+    assert first == json.dumps(replacements)
+    assert entry.entity_replacements_json is first
+
+    entry.entity_replacements = {"region": {"placeholder": ":region"}}
+    assert entry.entity_replacements_json == '{"region": {"placeholder": ":region"}}'
+
+    entry.entity_replacements["region"]["placeholder"] = ":area"
+    flag_modified(entry, "entity_replacements")
+    assert entry.entity_replacements_json == '{"region": {"placeholder": ":area"}}'
+
+
+def test_tags_set_pairs_names_with_whole_string_values():
+    """Test a string tag value is one value, and non-string values are skipped."""
+    entry = Text2SQLCache(
+        nl_query="q",
+        template="t",
+        tags={"region": "east", "metric": ["revenue", {"unit": "usd"}, ["nested"]], "owner": None},
+    )
+
+    assert entry.tags_set == frozenset({
+        ("region", None), ("region", "east"),
+        ("metric", None), ("metric", "revenue"),
+        ("owner", None),
+    })
+
+
+def test_memos_are_dropped_when_a_source_column_changes():
+    """Test memos are rebuilt after reassignment or flag_modified, not only on a new object."""
+    from sqlalchemy.orm.attributes import flag_modified
+
+    entry = Text2SQLCache(nl_query="q", template="t", tags={"region": ["east"]})
+    assert ("region", "east") in entry.tags_set
+
+    entry.tags["region"].append("west")
+    flag_modified(entry, "tags")
+    assert ("region", "west") in entry.tags_set
+
+    entry.tags = {"team": ["sales"]}
+    assert entry.tags_set == frozenset({("team", None), ("team", "sales")})
+
+
+def test_get_embedding_is_memoised(
+    text2sql_controller: Text2SQLController,
+    mock_similarity_util: MagicMock,
+):
+    """Test repeated texts reuse the cached embedding instead of re-encoding."""
+    mock_similarity_util.get_embedding.return_value = np.array([[0.1, 0.2, 0.3]])
+
+    first = text2sql_controller._get_embedding("Show sales")
+    first[0] = 99.0  # callers get a copy, not the cached array
+    second = text2sql_controller._get_embedding("Show sales")
+
+    assert mock_similarity_util.get_embedding.call_count == 1
+    np.testing.assert_allclose(second, [0.1, 0.2, 0.3])
+
+
 def test_add_query_success(
     text2sql_controller: Text2SQLController,
     mock_db_session: MagicMock,
@@ -74,6 +267,60 @@ def test_add_query_success(
     assert added_object.is_template is False
 
 
+def test_add_queries_embeds_in_one_batch(
+    text2sql_controller: Text2SQLController,
+    mock_db_session: MagicMock,
+    mock_similarity_util: MagicMock,
+):
+    """Test adding several queries with one embedding call and one commit."""
+    entries = [
+        {"nl_query": "Show total revenue by region", "template": "SELECT 1"},
+        {"nl_query": "List users", "template": "SELECT 2", "entity_replacements": {"x": {}}},
+    ]
+    # Texts are encoded shortest first
+    mock_similarity_util.get_embedding.return_value = np.array([[0.0, 1.0], [1.0, 0.0]])
+
+    results = text2sql_controller.add_queries(entries)
+
+    assert [r["nl_query"] for r in results] == [e["nl_query"] for e in entries]
+    mock_similarity_util.get_embedding.assert_called_once_with(
+        ["List users", "Show total revenue by region"], batch_size=2
+    )
+    mock_db_session.commit.assert_called_once()
+    added = mock_db_session.add_all.call_args_list[0][0][0]
+    assert added[0].embedding.tolist() == [1.0, 0.0]
+    assert added[1].embedding.tolist() == [0.0, 1.0]
+    assert added[0].vector_embedding is None
+    assert added[1].is_template is True
+
+
+def test_embed_missing_entries(
+    text2sql_controller: Text2SQLController,
+    mock_db_session: MagicMock,
+    mock_similarity_util: MagicMock,
+):
+    """Test storing embeddings only for entries that have none persisted."""
+    unembedded = Text2SQLCache(id=1, nl_query="List users", template="SELECT 1")
+    legacy = Text2SQLCache(id=2, nl_query="List orders", template="SELECT 2", vector_embedding=[0.0, 1.0])
+
+    mock_query = mock_db_session.query.return_value
+    mock_query.filter.return_value = mock_query
+    mock_query.order_by.return_value = mock_query
+    mock_query.limit.return_value = mock_query
+    mock_query.all.side_effect = [[unembedded, legacy], []]
+    mock_similarity_util.get_embedding.return_value = np.array([[1.0, 0.0]])
+
+    assert text2sql_controller.embed_missing_entries() == 2
+
+    # Only the entry without any embedding goes through the model
+    mock_similarity_util.get_embedding.assert_called_once_with(["List users"], batch_size=1)
+    assert np.frombuffer(unembedded.embedding_blob, dtype=np.float32).tolist() == [1.0, 0.0]
+    assert np.frombuffer(legacy.embedding_blob, dtype=np.float32).tolist() == [0.0, 1.0]
+    # The legacy JSON copy is dropped once the blob is written
+    assert legacy.vector_embedding is None
+    mock_db_session.commit.assert_called_once()
+
+
 def test_add_query_template(
     text2sql_controller: Text2SQLController,
     mock_db_session: MagicMock,
@@ -176,7 +423,7 @@ def test_search_query_exact_match(
     assert results[0]["match_type"] == "exact"
 
     # Verify query building
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_any_call(Text2SQLCache)
 
     # With search_method="exact", the controller should:
     # 1. First build a base query with is_valid filter
@@ -237,7 +484,7 @@ def test_search_query_string_similarity(
     )
 
     # Verify query building
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_any_call(Text2SQLCache.id, Text2SQLCache.nl_query)
     # Should have filtered for valid entries only - when using string similarity
     # we don't use filter(Text2SQLCache.nl_query == nl_query) as that's only for exact matching
     mock_query.filter.assert_any_call(Text2SQLCache.is_valid)
@@ -298,10 +545,159 @@ def test_search_query_vector_similarity(
 
     # Verify query building - for vector search, we only filter on is_valid
     # We don't use filter(Text2SQLCache.nl_query == nl_query) for vector search
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_any_call(Text2SQLCache.id)
     mock_query.filter.assert_any_call(Text2SQLCache.is_valid)
 
 
+def test_search_query_batch(
+    text2sql_controller: Text2SQLController,
+    mock_db_session: MagicMock,
+    mock_similarity_util: MagicMock,
+):
+    """Test scoring several queries against one candidate fetch."""
+    revenue = MagicMock(spec=Text2SQLCache)
+    revenue.id = 1
+    revenue.to_dict.return_value = {"id": 1, "nl_query": "revenue"}
+    users = MagicMock(spec=Text2SQLCache)
+    users.id = 2
+    users.to_dict.return_value = {"id": 2, "nl_query": "users"}
+
+    mock_query = mock_db_session.query.return_value
+    mock_query.filter.return_value = mock_query
+    # Filtered candidate ids, then the winning rows
+    mock_query.all.side_effect = [
+        [(1,), (2,), (3,)],
+        [revenue, users],
+    ]
+    # Embedding matrix load: (id, embedding_blob, JSONB embedding for rows without a blob)
+    mock_db_session.execute.return_value = [
+        (1, np.array([1.0, 0.0], dtype=np.float32).tobytes(), None),
+        (2, None, [0.0, 1.0]),
+        (3, None, None),
+    ]
+    # Distinct queries are encoded once, shortest first
+    mock_similarity_util.get_embedding.return_value = np.array(
+        [[-1.0, 0.0], [0.1, 0.9], [0.9, 0.1]]
+    )
+
+    results = text2sql_controller.search_query_batch(
+        ["show revenue", "list users", "unrelated", "show revenue"], similarity_threshold=0.8
+    )
+
+    assert [[m["id"] for m in r] for r in results] == [[1], [2], [], [1]]
+    assert results[0][0]["similarity"] > 0.8
+    mock_similarity_util.get_embedding.assert_called_once_with(
+        ["unrelated", "list users", "show revenue"], batch_size=3
+    )
+    assert mock_query.all.call_count == 2
+    mock_db_session.execute.assert_called_once()
+
+
+@pytest.mark.parametrize("embedding_dtype", ["float32", "float16", "int8"])
+def test_search_query_vector_uses_embedding_matrix(
+    text2sql_controller: Text2SQLController,
+    mock_db_session: MagicMock,
+    mock_similarity_util: MagicMock,
+    embedding_dtype: str,
+):
+    """Test vector search scoring against the cached embedding matrix."""
+    text2sql_controller._emb_dtype = np.dtype(embedding_dtype)
+    match = MagicMock(spec=Text2SQLCache)
+    match.id = 2
+    match.to_dict.return_value = {"id": 2, "nl_query": "Show me revenue stats"}
+
+    mock_query = mock_db_session.query.return_value
+    mock_query.filter.return_value = mock_query
+    mock_query.all.side_effect = [
+        [],  # no nl_query_hash match
+        [(1,), (2,)],  # filtered candidate ids
+        [match],  # winning rows
+        [],
+        [(2,)],  # second search: ids only, matrix already loaded
+        [match],
+    ]
+    mock_db_session.execute.return_value = [
+        (1, None, [0.0, 1.0]),
+        (2, np.array([3.0, 4.0], dtype=np.float32).tobytes(), None),
+        (3, None, [0.6, 0.8]),
+    ]
+    mock_similarity_util.get_embedding.return_value = np.array([[0.6, 0.8]])
+
+    results = text2sql_controller.search_query(
+        "What are the revenue numbers?", search_method="vector", similarity_threshold=0.9
+    )
+
+    assert [r["id"] for r in results] == [2]
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-3)
+    assert text2sql_controller._emb_matrix.dtype == np.dtype(embedding_dtype)
+
+    # Deleting a cached row keeps the matrix aligned without reloading it
+    text2sql_controller._drop_cached_embedding(1)
+    results = text2sql_controller.search_query(
+        "What are the revenue numbers?", search_method="vector", similarity_threshold=0.9
+    )
+    assert [r["id"] for r in results] == [2]
+    assert mock_query.all.call_count == 6
+    mock_db_session.execute.assert_called_once()
+
+
+def test_search_query_vector_uses_hnsw_index(
+    text2sql_controller: Text2SQLController,
+    mock_db_session: MagicMock,
+    mock_similarity_util: MagicMock,
+):
+    """Test vector search generating candidates from the HNSW index."""
+    pytest.importorskip("faiss")
+    text2sql_controller._ann_min_rows = 1
+    match = MagicMock(spec=Text2SQLCache)
+    match.id = 2
+    match.to_dict.return_value = {"id": 2, "nl_query": "Show me revenue stats"}
+
+    mock_query = mock_db_session.query.return_value
+    mock_query.filter.return_value = mock_query
+    mock_query.all.side_effect = [
+        [],  # no nl_query_hash match
+        [(1,), (2,)],  # filtered candidate ids
+        [match],  # winning rows
+    ]
+    mock_db_session.execute.return_value = [
+        (1, None, [0.0, 1.0]),
+        (2, None, [3.0, 4.0]),
+        (3, None, [0.6, 0.8]),
+    ]
+    mock_similarity_util.get_embedding.return_value = np.array([[0.6, 0.8]])
+
+    results = text2sql_controller.search_query(
+        "What are the revenue numbers?", search_method="vector", similarity_threshold=0.9
+    )
+
+    # The index is built in the background; the first search scans the matrix
+    assert text2sql_controller._index_ready.wait(5)
+    assert len(text2sql_controller._ann_index) == 3
+    # Row 3 is an equally close neighbour but is excluded by the filters
+    assert [r["id"] for r in results] == [2]
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-3)
+
+    text2sql_controller._drop_cached_embedding(2)
+    assert len(text2sql_controller._ann_index) == 2
+
+
+def test_search_query_returns_hash_match_without_embedding(
+    text2sql_controller: Text2SQLController,
+    mock_db_session: MagicMock,
+    mock_similarity_util: MagicMock,
+):
+    """Test hash matches that fill the limit are returned without embedding the query."""
+    cached = Text2SQLCache(id=7, nl_query="Show total revenue", template="SELECT 1")
+    mock_db_session.query.return_value.all.return_value = [cached]
+
+    results = text2sql_controller.search_query("  show TOTAL revenue", search_method="vector", limit=1)
+
+    assert [r["id"] for r in results] == [7]
+    assert results[0]["similarity"] == 1.0
+    mock_similarity_util.get_embedding.assert_not_called()
+
+
 def test_search_query_auto_strategy(
     text2sql_controller: Text2SQLController,
     mock_db_session: MagicMock,
@@ -362,7 +758,7 @@ def test_search_query_auto_strategy(
     assert len(results) > 0
 
     # Verify query building
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_any_call(Text2SQLCache)
 
     # With auto mode, the controller should:
     # 1. First build a base query with is_valid filter
@@ -394,16 +790,15 @@ def test_get_query_by_id_found(
     mock_cache_entry.to_dict.return_value = expected_result
 
     # Configure the mock query to return our entry
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_cache_entry
+    mock_db_session.get.return_value = mock_cache_entry
 
     # Call the method
     result = text2sql_controller.get_query_by_id(query_id)
 
     # Assertions
     assert result == expected_result
-    mock_db_session.query.assert_called_with(Text2SQLCache)
-    mock_query.filter.assert_called_with(Text2SQLCache.id == query_id)
+    mock_db_session.query.assert_not_called()
+    mock_db_session.get.assert_called_with(Text2SQLCache, query_id)
 
 
 def test_get_query_by_id_not_found(
@@ -412,16 +807,15 @@ def test_get_query_by_id_not_found(
     """Test retrieving a query by ID when it doesn't exist."""
     # Setup mock query result (not found)
     query_id = 999
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = None
+    mock_db_session.get.return_value = None
 
     # Call the method
     result = text2sql_controller.get_query_by_id(query_id)
 
     # Assertions
     assert result is None
-    mock_db_session.query.assert_called_with(Text2SQLCache)
-    mock_query.filter.assert_called_with(Text2SQLCache.id == query_id)
+    mock_db_session.query.assert_not_called()
+    mock_db_session.get.assert_called_with(Text2SQLCache, query_id)
 
 
 def test_update_query_success(
@@ -453,8 +847,7 @@ def test_update_query_success(
         # Note: vector_embedding is not included in the to_dict() result
     }
 
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_cache_entry
+    mock_db_session.get.return_value = mock_cache_entry
     mock_similarity_util.get_embedding.return_value = embedding_array
 
     # Call the method
@@ -480,6 +873,24 @@ def test_update_query_success(
     mock_similarity_util.get_embedding.assert_called_once_with(updates["nl_query"])
 
 
+def test_update_query_keeps_embedding_for_whitespace_and_case_edits(
+    text2sql_controller: Text2SQLController,
+    mock_db_session: MagicMock,
+    mock_similarity_util: MagicMock,
+):
+    """Test an nl_query edit that only changes case/whitespace is not re-embedded."""
+    cache_entry = Text2SQLCache(id=5, nl_query="Show all users", template="SELECT * FROM users")
+    original_hash = cache_entry.nl_query_hash
+    mock_db_session.get.return_value = cache_entry
+
+    text2sql_controller.update_query(5, {"nl_query": "  show ALL   users "})
+
+    mock_similarity_util.get_embedding.assert_not_called()
+    assert cache_entry.nl_query == "  show ALL   users "
+    assert cache_entry.nl_query_hash == original_hash
+    mock_db_session.commit.assert_called_once()
+
+
 def test_invalidate_query_success(
     text2sql_controller: Text2SQLController, mock_db_session: MagicMock
 ):
@@ -493,8 +904,7 @@ def test_invalidate_query_success(
     mock_cache_entry.id = query_id
     mock_cache_entry.is_valid = True
 
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_cache_entry
+    mock_db_session.get.return_value = mock_cache_entry
 
     # Call the method
     result = text2sql_controller.invalidate_query(query_id, reason=invalidation_reason)
@@ -506,6 +916,93 @@ def test_invalidate_query_success(
     mock_db_session.commit.assert_called_once()
 
 
+def test_invalidate_query_persists_to_the_row(
+    sqlite_session, mock_similarity_util: MagicMock
+):
+    """Test invalidation is written to the row, not just the loaded object."""
+    entry = Text2SQLCache(
+        nl_query="Show revenue", template="SELECT 1", template_type=TemplateType.SQL
+    )
+    sqlite_session.add(entry)
+    sqlite_session.commit()
+    entry_id, updated_at = entry.id, entry.updated_at
+    assert entry.created_at is not None and updated_at is not None
+
+    with patch(
+        "thinkforge.controller.Text2SQLSimilarity", return_value=mock_similarity_util
+    ):
+        controller = Text2SQLController(db_session=sqlite_session)
+
+    assert controller.invalidate_query(entry_id, reason="Outdated schema") is True
+
+    sqlite_session.expunge_all()
+    status, new_updated_at = sqlite_session.execute(
+        select(Text2SQLCache.status, Text2SQLCache.updated_at).where(
+            Text2SQLCache.id == entry_id
+        )
+    ).one()
+    assert status == Status.ARCHIVE
+    assert new_updated_at >= updated_at
+
+
+def test_search_query_fills_remaining_slots_after_exact_hash_hit(
+    sqlite_session, mock_similarity_util: MagicMock
+):
+    """Test an exact hash hit ranks first and similar entries still fill the limit."""
+    exact = Text2SQLCache(nl_query="Show revenue by month", template="SELECT 1", template_type=TemplateType.SQL)
+    near = Text2SQLCache(nl_query="Show revenue per month", template="SELECT 2", template_type=TemplateType.SQL)
+    unrelated = Text2SQLCache(nl_query="List customers", template="SELECT 3", template_type=TemplateType.SQL)
+    sqlite_session.add_all([exact, near, unrelated])
+    sqlite_session.commit()
+    mock_similarity_util.compute_string_similarity.side_effect = (
+        lambda a, b: 0.9 if "revenue" in b else 0.1
+    )
+
+    with patch(
+        "thinkforge.controller.Text2SQLSimilarity", return_value=mock_similarity_util
+    ):
+        controller = Text2SQLController(db_session=sqlite_session)
+    controller.similarity_util = mock_similarity_util
+
+    results = controller.search_query(
+        "  show REVENUE by month ", search_method="string", similarity_threshold=0.5, limit=5
+    )
+
+    assert [(r["id"], r["similarity"]) for r in results] == [(exact.id, 1.0), (near.id, 0.9)]
+    # The exact hit is excluded from the scan rather than scored a second time
+    scored = [call.args[1] for call in mock_similarity_util.compute_string_similarity.call_args_list]
+    assert "Show revenue by month" not in scored
+
+    only_exact = controller.search_query(
+        "show revenue by month", search_method="string", similarity_threshold=0.5, limit=1
+    )
+    assert [r["id"] for r in only_exact] == [exact.id]
+
+
+def test_batch_insert_fills_timestamps(
+    sqlite_session, mock_similarity_util: MagicMock
+):
+    """Test batch-inserted entries carry their timestamps back to the caller."""
+    with patch(
+        "thinkforge.controller.Text2SQLSimilarity", return_value=mock_similarity_util
+    ):
+        controller = Text2SQLController(db_session=sqlite_session)
+
+    entries = controller.batch_insert([
+        {
+            "nl_query": "Show revenue",
+            "template": "SELECT 1",
+            "template_type": TemplateType.SQL,
+            "embedding_blob": np.zeros(4, dtype=np.float32).tobytes(),
+        }
+    ])
+
+    assert entries[0].created_at is not None
+    assert entries[0].updated_at is not None
+    stored = sqlite_session.execute(select(Text2SQLCache.created_at)).scalar_one()
+    assert stored == entries[0].created_at
+
+
 def test_invalidate_query_not_found(
     text2sql_controller: Text2SQLController, mock_db_session: MagicMock
 ):
@@ -514,8 +1011,7 @@ def test_invalidate_query_not_found(
     query_id = 999
 
     # Configure mocks - entry not found
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = None
+    mock_db_session.get.return_value = None
 
     # Call the method
     result = text2sql_controller.invalidate_query(query_id)
@@ -525,6 +1021,51 @@ def test_invalidate_query_not_found(
     mock_db_session.commit.assert_not_called()
 
 
+def test_change_status_same_status_is_a_no_op(
+    text2sql_controller: Text2SQLController, mock_db_session: MagicMock
+):
+    """Test setting the current status returns without loading the row or writing."""
+    mock_query = mock_db_session.query.return_value
+    mock_query.filter.return_value = mock_query
+    mock_query.scalar.return_value = "active"
+
+    assert text2sql_controller.change_status(1, "active") is True
+
+    mock_db_session.query.assert_called_once_with(Text2SQLCache.status)
+    mock_db_session.get.assert_not_called()
+    mock_db_session.execute.assert_not_called()
+    mock_db_session.commit.assert_not_called()
+
+
+def test_change_status_bulk(
+    text2sql_controller: Text2SQLController, mock_db_session: MagicMock
+):
+    """Test changing many statuses with batched statements and one commit."""
+    mock_query = mock_db_session.query.return_value
+    mock_query.filter.return_value = mock_query
+    mock_query.all.return_value = [(1, "pending"), (2, "active")]
+
+    result = text2sql_controller.change_status_bulk([
+        (1, "active", "reviewed", "admin"),
+        (2, "active", None, None),
+        (3, "archive", None, None),
+    ])
+
+    assert result == {1: True, 2: True, 3: False}
+    # One status UPDATE plus one audit INSERT for the single real change
+    assert mock_db_session.execute.call_count == 2
+    audit_rows = mock_db_session.execute.call_args_list[1][0][1]
+    assert audit_rows == [{
+        "cache_entry_id": 1,
+        "changed_field": "status",
+        "old_value": "pending",
+        "new_value": "active",
+        "change_reason": "reviewed",
+        "changed_by": "admin",
+    }]
+    mock_db_session.commit.assert_called_once()
+
+
 def test_delete_query_success(
     text2sql_controller: Text2SQLController, mock_db_session: MagicMock
 ):
@@ -536,8 +1077,7 @@ def test_delete_query_success(
     mock_cache_entry = MagicMock(spec=Text2SQLCache)
     mock_cache_entry.id = query_id
 
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_cache_entry
+    mock_db_session.get.return_value = mock_cache_entry
 
     # Call the method
     result = text2sql_controller.delete_query(query_id)
@@ -556,8 +1096,7 @@ def test_delete_query_not_found(
     query_id = 999
 
     # Configure mocks - entry not found
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = None
+    mock_db_session.get.return_value = None
 
     # Call the method
     result = text2sql_controller.delete_query(query_id)
@@ -604,7 +1143,7 @@ def test_get_query_by_template_type(
         assert result["template_type"] == template_type
 
     # Verify query building
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_called_once_with(Text2SQLCache)
     mock_query.filter.assert_called_with(Text2SQLCache.template_type == template_type)
     # Verify order_by was called (we don't check the exact ordering criteria)
     assert mock_query.order_by.called
@@ -646,7 +1185,7 @@ def test_get_query_by_tags_match_any(
 
     # We can't easily verify the exact filter condition because of SQLAlchemy's complex filter mechanisms
     # But we can verify query was called
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_called_once_with(Text2SQLCache)
 
 
 def test_get_query_by_tags_match_all(
@@ -678,7 +1217,7 @@ def test_get_query_by_tags_match_all(
     assert set(results[0]["tags"]) == set(tags)
 
     # Verify query was called
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_called_once_with(Text2SQLCache)
 
 
 def test_apply_entity_substitution(
@@ -705,8 +1244,8 @@ def test_apply_entity_substitution(
     }
 
     # Configure mocks
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_template_entry
+    mock_template_entry.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_template_entry
 
     # Call the method
     result = text2sql_controller.apply_entity_substitution(
@@ -720,8 +1259,8 @@ def test_apply_entity_substitution(
     assert "2023-01-01" in result["substituted_template"]
 
     # Verify query building
-    mock_db_session.query.assert_called_with(Text2SQLCache)
-    mock_query.filter.assert_called_with(Text2SQLCache.id == template_id)
+    mock_db_session.query.assert_not_called()
+    mock_db_session.get.assert_called_with(Text2SQLCache, template_id)
 
 
 def test_apply_entity_substitution_not_template(
@@ -737,8 +1276,8 @@ def test_apply_entity_substitution_not_template(
     mock_entry.is_template = False
 
     # Configure mocks
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_entry
+    mock_entry.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_entry
 
     # Call the method
     with pytest.raises(ValueError):
@@ -747,8 +1286,8 @@ def test_apply_entity_substitution_not_template(
         )
 
     # Verify query building
-    mock_db_session.query.assert_called_with(Text2SQLCache)
-    mock_query.filter.assert_called_with(Text2SQLCache.id == template_id)
+    mock_db_session.query.assert_not_called()
+    mock_db_session.get.assert_called_with(Text2SQLCache, template_id)
 
 
 def test_add_api_template(
@@ -899,8 +1438,8 @@ def test_apply_entity_substitution_api(
     mock_entry.usage_count = 0
 
     # Configure the mock session to return our template
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_entry
+    mock_entry.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_entry
 
     # New entity values to substitute
     new_values = {"city_placeholder": "New York", "api_key_placeholder": "abc123xyz"}
@@ -921,8 +1460,12 @@ def test_apply_entity_substitution_api(
     assert "abc123xyz" in result["substituted_template"]
     assert result["template_type"] == TemplateType.API
 
-    # Verify usage count was incremented
-    assert mock_entry.usage_count == 1
+    # Verify the usage count increment is buffered, then written with one atomic UPDATE
+    mock_db_session.execute.assert_not_called()
+    text2sql_controller.flush_usage()
+    statement = mock_db_session.execute.call_args[0][0]
+    assert str(statement).startswith("UPDATE")
+    assert "usage_count" in str(statement)
 
 
 def test_get_api_templates(
@@ -964,7 +1507,7 @@ def test_get_api_templates(
     assert results[1]["template_type"] == TemplateType.API
 
     # Verify the query was built correctly
-    mock_db_session.query.assert_called_with(Text2SQLCache)
+    mock_db_session.query.assert_called_once_with(Text2SQLCache)
     mock_query.filter.assert_any_call(
         Text2SQLCache.template_type == TemplateType.API, Text2SQLCache.is_valid
     )
@@ -1020,8 +1563,8 @@ def test_real_api_integration(
     mock_template.usage_count = 0
 
     # Configure mock to return this entry
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_template
+    mock_template.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_template
 
     # Step 2: Apply entity substitution
     new_values = {"param_value": "test123"}
@@ -1095,8 +1638,8 @@ def test_real_api_call_no_mocks(text2sql_controller: Text2SQLController, mock_db
     }
     
     # Configure mock session
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_entry
+    mock_entry.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_entry
     
     # 2. Apply entity substitution
     substitution_result = text2sql_controller.apply_entity_substitution(
@@ -1176,8 +1719,8 @@ def test_apply_entity_substitution_url(
     mock_entry.usage_count = 0
 
     # Configure the mock session to return our template
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_entry
+    mock_entry.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_entry
 
     # New entity values to substitute
     new_values = {"query_param": "shoes", "page_param": "2", "limit_param": "25"}
@@ -1198,8 +1741,12 @@ def test_apply_entity_substitution_url(
     assert result["substituted_template"] == expected_url
     assert result["template_type"] == TemplateType.URL
 
-    # Verify usage count was incremented
-    assert mock_entry.usage_count == 1
+    # Verify the usage count increment is buffered, then written with one atomic UPDATE
+    mock_db_session.execute.assert_not_called()
+    text2sql_controller.flush_usage()
+    statement = mock_db_session.execute.call_args[0][0]
+    assert str(statement).startswith("UPDATE")
+    assert "usage_count" in str(statement)
 
 
 def test_url_integration_with_formatting(
@@ -1242,8 +1789,8 @@ def test_url_integration_with_formatting(
     mock_template.usage_count = 0
 
     # Configure mock to return this entry
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_template
+    mock_template.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_template
 
     # Step 2: Apply entity substitution with values that need URL encoding
     new_values = {
@@ -1413,8 +1960,8 @@ def test_apply_entity_substitution_workflow(
     mock_entry.usage_count = 0
 
     # Configure the mock session to return our template
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_entry
+    mock_entry.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_entry
 
     # New entity values to substitute
     new_values = {
@@ -1455,6 +2002,104 @@ def test_apply_entity_substitution_workflow(
     assert mock_entry.usage_count == 1
 
 
+def test_execute_workflow_prefetches_steps_and_buffers_usage(
+    text2sql_controller: Text2SQLController, mock_db_session: MagicMock
+):
+    """Test workflow steps are loaded with one query and their usage written with one UPDATE."""
+    workflow = Text2SQLCache(
+        id=10,
+        nl_query="Run report",
+        template=json.dumps({"steps": [
+            {"cache_id": 1, "type": "sequential"},
+            {"cache_id": 2, "type": "parallel"},
+            {"cache_id": 3, "type": "parallel"},
+        ]}),
+        template_type=TemplateType.WORKFLOW,
+        status=Status.ACTIVE,
+    )
+    steps = [
+        Text2SQLCache(id=1, nl_query="a", template="SELECT 1", template_type=TemplateType.SQL, is_template=False),
+        Text2SQLCache(id=2, nl_query="b", template="SELECT 2", template_type=TemplateType.SQL, is_template=False),
+    ]
+    mock_db_session.get.return_value = workflow
+    mock_db_session.query.return_value.all.return_value = steps
+
+    results = text2sql_controller.execute_workflow(10)
+
+    assert [step["status"] for step in results["steps"]] == ["success", "success", "error"]
+    assert [step.get("result") for step in results["steps"]] == ["SELECT 1", "SELECT 2", None]
+    mock_db_session.query.return_value.all.assert_called_once()
+    mock_db_session.commit.assert_called_once()
+
+    mock_db_session.execute.assert_not_called()
+    text2sql_controller.flush_usage()
+    mock_db_session.execute.assert_called_once()
+    assert str(mock_db_session.execute.call_args[0][0]).startswith("UPDATE")
+
+
+def test_flush_usage_with_a_temporary_session(
+    text2sql_controller: Text2SQLController, mock_db_session: MagicMock
+):
+    """Test flushing through another session writes there and keeps the controller's own."""
+    other_session = MagicMock(spec=Session)
+    text2sql_controller._usage_flush_interval = 60
+    text2sql_controller._increment_usage_count(5)
+
+    assert text2sql_controller.flush_usage(session=other_session) == 1
+
+    assert str(other_session.execute.call_args[0][0]).startswith("UPDATE")
+    other_session.commit.assert_called_once()
+    mock_db_session.execute.assert_not_called()
+    mock_db_session.commit.assert_not_called()
+    assert text2sql_controller.session is mock_db_session
+
+
+def test_workflow_step_substitution_is_memoised(text2sql_controller: Text2SQLController):
+    """Test repeated steps with the same entry version and entity values substitute once."""
+    _cached_substitute.cache_clear()
+    entry = Text2SQLCache(
+        id=7,
+        nl_query="Sales for region",
+        template="SELECT * FROM sales WHERE region = :region",
+        template_type=TemplateType.SQL,
+        is_template=True,
+        entity_replacements={"region": {"placeholder": ":region", "type": "string"}},
+    )
+    step = {"cache_id": 7, "type": "sequential"}
+
+    substitute = MagicMock(return_value="SELECT * FROM sales WHERE region = 'EU'")
+    with patch("thinkforge.controller.compile_substitution", return_value=substitute):
+        for _ in range(2):
+            result = text2sql_controller._execute_workflow_step(step, {"region": "EU"}, {}, {7: entry})
+            assert result["result"] == "SELECT * FROM sales WHERE region = 'EU'"
+        assert substitute.call_count == 1
+
+        text2sql_controller._execute_workflow_step(step, {"region": "US"}, {}, {7: entry})
+        assert substitute.call_count == 2
+
+
+def test_compiled_substitution_matches_sequential_replacement():
+    """Test compiled templates give the same result as the apply_* methods, or defer to them."""
+    template = "SELECT * FROM sales WHERE region = :region AND year = :year AND region_code = :region_code"
+    replacements = {
+        "region": {"placeholder": ":region", "type": "string"},
+        "region_code": {"placeholder": ":region_code", "type": "string"},
+        "year": {"placeholder": ":year", "type": "integer"},
+    }
+    values = {"region": "O'Brien", "region_code": "EU", "year": "2024"}
+    compiled = compile_substitution(template, json.dumps(replacements), TemplateType.SQL)
+
+    expected, _ = Text2SQLEntitySubstitution.extract_and_replace_entities(
+        "", template, replacements, values, TemplateType.SQL
+    )
+    assert compiled(values) == expected
+    assert compile_substitution(template, json.dumps(replacements), TemplateType.SQL) is compiled
+
+    # Values a later replacement could rewrite, and missing values, use the generic path
+    assert compiled({**values, "region": ":year"}) is None
+    assert compiled({"region": "EU"}) is None
+
+
 def test_workflow_execution_simulation(
     text2sql_controller: Text2SQLController,
     mock_db_session: MagicMock,
@@ -1514,8 +2159,8 @@ def test_workflow_execution_simulation(
     mock_template.usage_count = 0
 
     # Configure mock to return this entry
-    mock_query = mock_db_session.query.return_value
-    mock_query.filter.return_value.first.return_value = mock_template
+    mock_template.status = Status.ACTIVE
+    mock_db_session.get.return_value = mock_template
 
     # Step 2: Apply entity substitution
     new_values = {
@@ -1697,3 +2342,303 @@ def test_execute_stagehand_workflow(text2sql_controller, mock_db_session):
             print("Browser closed")
     
     print("Stagehand workflow execution simulation completed")
+
+
+def test_batch_string_similarity_matches_pairwise_scores():
+    """Batch string scoring gives the same scores as comparing each pair."""
+    from thinkforge.similarity import Text2SQLSimilarity, _batch_string_similarity
+
+    util = object.__new__(Text2SQLSimilarity)  # string scoring needs no model
+    query = "show all customers in texas"
+    candidates = [
+        "show all customers in texas",
+        "list customers located in texas",
+        "total revenue by month",
+        "",
+        None,
+    ]
+
+    scores = _batch_string_similarity(query, candidates)
+
+    assert scores == [util.compute_string_similarity(query, c) for c in candidates]
+    assert scores[0] == pytest.approx(1.0)
+    assert scores[2] == scores[3] == scores[4] == 0.0
+
+
+def test_string_similarity_memoises_word_sets():
+    """Candidate word sets are tokenised once and reused across queries."""
+    from thinkforge.similarity import _batch_string_similarity, _word_set
+
+    _word_set.cache_clear()
+    candidates = ["list customers located in texas", "total revenue by month"]
+
+    _batch_string_similarity("customers in texas", candidates)
+    _batch_string_similarity("revenue by month", candidates)
+
+    info = _word_set.cache_info()
+    assert info.misses == 4  # two candidates plus two distinct queries
+    assert _word_set("Show  show ALL a") == frozenset({"show", "all"})
+
+
+def test_candidate_matrix_grows_and_scores_in_place():
+    """Candidates appended to the persistent slab are scored without restacking."""
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    with patch.object(Text2SQLSimilarity, "_load_model", return_value=MagicMock()):
+        util = Text2SQLSimilarity()
+    util.get_embedding = MagicMock(return_value=np.array([[1.0, 0.0]], dtype=np.float32))
+
+    assert util.add_candidates(np.array([[1.0, 0.0], [0.0, 1.0]])) == 0
+    assert util.add_candidates(np.ones((1500, 2))) == 2
+    matrix = util.get_candidate_matrix()
+    assert matrix.shape == (1502, 2) and matrix.dtype == np.float32
+    assert util._cand_mat.shape[0] == 2048  # doubled once from the initial capacity
+
+    results = util.find_most_similar(
+        "q", [], method="vector", threshold=0.9, limit=1, candidate_matrix=matrix
+    )
+
+    assert results == [(0, pytest.approx(1.0))]
+    with pytest.raises(ValueError):
+        util.add_candidates(np.ones((1, 3)))
+
+
+def test_concurrent_single_embeddings_are_coalesced():
+    """Single-text embedding calls inside the micro-batch window share one encode call."""
+    import threading
+    from thinkforge import similarity
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    model = MagicMock()
+    model.device.type = "cpu"
+    model.encode.side_effect = lambda texts, **kwargs: np.array(
+        [[float(len(t)), 0.0] for t in texts], dtype=np.float32
+    )
+    with patch.object(Text2SQLSimilarity, "_load_model", return_value=model):
+        util = Text2SQLSimilarity()
+
+    texts = ["a", "bb", "ccc", "dddd"]
+    results = {}
+    with patch.object(similarity, "_MICROBATCH_WAIT_MS", 500.0):
+        threads = [
+            threading.Thread(target=lambda t=t: results.__setitem__(t, util.get_embedding([t])))
+            for t in texts
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert model.encode.call_count == 1
+    assert sorted(model.encode.call_args[0][0]) == texts
+    for t in texts:
+        assert results[t].shape == (1, 2) and results[t][0, 0] == len(t)
+
+
+def test_quantized_onnx_model_is_exported_once(tmp_path):
+    """The int8 ONNX export is written on first load and reused afterwards."""
+    from thinkforge import similarity
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    def fake_export(model, config, export_dir):
+        path = tmp_path / "org__model" / "onnx" / f"model_qint8_{config}.onnx"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+    with patch.object(similarity, "_ONNX_EXPORT_DIR", str(tmp_path)), \
+            patch.object(similarity, "SentenceTransformer") as st, \
+            patch("sentence_transformers.export_dynamic_quantized_onnx_model", side_effect=fake_export) as export:
+        Text2SQLSimilarity._create_quantized_onnx_model("org/model", "avx512_vnni")
+        Text2SQLSimilarity._create_quantized_onnx_model("org/model", "avx512_vnni")
+
+    assert export.call_count == 1
+    st.assert_called_with(
+        str(tmp_path / "org__model"),
+        backend="onnx",
+        model_kwargs={"file_name": "onnx/model_qint8_avx512_vnni.onnx"},
+    )
+
+
+def test_torch_compile_failure_at_warm_up_restores_the_eager_model():
+    """A compile that only fails on the first encode leaves the eager transformer in place."""
+    from thinkforge import similarity
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    model = MagicMock()
+    model.device.type = "cpu"
+    eager = model[0].auto_model
+    model.encode.side_effect = RuntimeError("inductor backend failed")
+
+    with patch.dict(os.environ, {"NLC_EMBEDDING_BACKEND": "torch"}), \
+            patch.object(similarity, "_TORCH_COMPILE_MODE", "reduce-overhead"), \
+            patch.object(similarity, "SentenceTransformer", return_value=model), \
+            patch.object(similarity.torch, "compile", return_value=MagicMock()) as compile_:
+        assert Text2SQLSimilarity._create_model("org/model") is model
+
+    compile_.assert_called_once()
+    model.encode.assert_called_once()
+    assert model[0].auto_model is eager
+
+
+def test_cosine_similarities_unnormalised_float32_matches_reference():
+    """Unnormalised float32 scoring divides by the true row and query norms."""
+    from thinkforge.similarity import cosine_similarities
+
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((50, 16)).astype(np.float32) * 3
+    matrix[7] = 0.0
+    query = rng.standard_normal(16).astype(np.float32)
+
+    scores = cosine_similarities(query, matrix)
+
+    expected = matrix @ query / np.maximum(
+        np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12
+    )
+    np.testing.assert_allclose(scores, expected, rtol=1e-5, atol=1e-6)
+    assert scores[7] == 0.0
+
+
+def test_similarity_extract_entities_returns_whole_numbers():
+    """Numbers come back whole, not as their first character or decimal part."""
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    entities = Text2SQLSimilarity.extract_entities("Orders in Paris above 12.5 on 3/14/2024")
+
+    assert "12.5" in entities["numbers"]
+    assert entities["dates"] == ["3/14/2024"]
+    assert entities["named_entities"] == ["Paris"]
+
+
+def test_float16_candidate_matrix_scores_like_float32():
+    """A float16 candidate slab halves storage and scores within float16 precision."""
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    with patch.object(Text2SQLSimilarity, "_load_model", return_value=MagicMock()):
+        util = Text2SQLSimilarity(candidate_dtype="float16")
+        with pytest.raises(ValueError):
+            Text2SQLSimilarity(candidate_dtype="int4")
+    util.get_embedding = MagicMock(return_value=np.array([[0.6, 0.8]], dtype=np.float32))
+
+    util.add_candidates(np.array([[0.6, 0.8], [0.8, 0.6], [1.0, 0.0]]))
+    matrix = util.get_candidate_matrix()
+    assert matrix.dtype == np.float16
+
+    results = util.find_most_similar(
+        "q", ["a", "b", "c"], method="vector", threshold=0.5, candidate_matrix=matrix
+    )
+
+    assert [i for i, _ in results] == [0, 1, 2]
+    assert [score for _, score in results] == pytest.approx([1.0, 0.96, 0.6], abs=1e-3)
+
+
+def test_find_most_similar_cheap_prefilter_scores_only_overlapping_candidates():
+    """The opt-in prefilter embeds only the best word-overlap candidates and keeps indices."""
+    from thinkforge import similarity
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    with patch.object(Text2SQLSimilarity, "_load_model", return_value=MagicMock()):
+        util = Text2SQLSimilarity()
+    util.get_embedding = MagicMock(
+        side_effect=lambda texts, **kwargs: np.tile(np.array([1.0, 0.0], dtype=np.float32), (len(texts), 1))
+    )
+    candidates = [
+        "weather in paris",
+        "sales by region",
+        "monthly sales by region",
+        "employee headcount",
+    ]
+
+    with patch.object(similarity, "_PREFILTER_CANDIDATES", 2):
+        results = util.find_most_similar(
+            "sales by region", candidates, method="vector", threshold=0.5, cheap_prefilter=True
+        )
+
+    assert util.get_embedding.call_args_list[1][0][0] == ["sales by region", "monthly sales by region"]
+    assert [i for i, _ in results] == [1, 2]
+
+
+def test_compute_vector_similarities_small_batch_matches_matrix_path():
+    """The pair-by-pair path for a few candidates scores like the stacked matrix path."""
+    from thinkforge.similarity import Text2SQLSimilarity
+
+    with patch.object(Text2SQLSimilarity, "_load_model", return_value=MagicMock()):
+        util = Text2SQLSimilarity()
+    rng = np.random.default_rng(1)
+    query = rng.standard_normal(8)
+    candidates = [rng.standard_normal(8) for _ in range(3)] + [np.zeros(8)]
+
+    small = util.compute_vector_similarities(query, candidates)
+    large = util.compute_vector_similarities(query, candidates * 2)
+
+    assert small == pytest.approx(large[:4], abs=1e-6)
+    assert small[3] == 0.0
+
+
+def test_hnsw_index_compacts_tombstones():
+    """Removing past the tombstone ratio rebuilds the graph from the live vectors."""
+    from thinkforge.vector_index import FAISS_AVAILABLE, HNSWVectorIndex
+
+    if not FAISS_AVAILABLE:
+        pytest.skip("faiss not installed")
+    rng = np.random.default_rng(5)
+    vectors = rng.standard_normal((400, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = HNSWVectorIndex(16)
+    index.add(range(1000, 1400), vectors)
+
+    index.remove(range(1000, 1200))
+
+    assert index.dead_count == 0
+    assert index.index.ntotal == len(index) == 200
+    hits = index.search(vectors[250], 1)
+    assert hits[0][0] == 1250
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_find_most_similar_uses_hnsw_over_candidate_slab():
+    """Inexact searches over the candidate slab take neighbours from an HNSW index."""
+    from thinkforge import similarity
+    from thinkforge.similarity import Text2SQLSimilarity
+    from thinkforge.vector_index import FAISS_AVAILABLE
+
+    if not FAISS_AVAILABLE:
+        pytest.skip("faiss not installed")
+    rng = np.random.default_rng(3)
+    rows = rng.standard_normal((200, 16)).astype(np.float32)
+    query = rows[17] + 0.01 * rng.standard_normal(16).astype(np.float32)
+    query /= np.linalg.norm(query)
+    with patch.object(Text2SQLSimilarity, "_load_model", return_value=MagicMock()):
+        util = Text2SQLSimilarity()
+    util.get_embedding = MagicMock(return_value=query.reshape(1, -1))
+    util.add_candidates(rows)
+
+    with patch.object(similarity, "_ANN_MIN_ROWS", 100):
+        approx = util.find_most_similar(
+            "q", [], threshold=0.0, limit=3, candidate_matrix=util.get_candidate_matrix(), exact=False
+        )
+    exact = util.find_most_similar(
+        "q", [], threshold=0.0, limit=3, candidate_matrix=util.get_candidate_matrix()
+    )
+
+    assert util._cand_index is not None and len(util._cand_index) == 200
+    assert approx[0][0] == 17
+    assert approx == pytest.approx(exact)
+
+
+def test_batch_string_similarity_splits_large_batches_across_workers():
+    """Without RapidFuzz, large string batches are scored in chunks on the process pool."""
+    from concurrent.futures import ThreadPoolExecutor
+    from thinkforge import similarity
+    from thinkforge.similarity import _batch_string_similarity, _string_similarity
+
+    candidates = [f"show orders for customer {i}" for i in range(600)]
+    with ThreadPoolExecutor(max_workers=2) as pool, \
+            patch.object(similarity, "process", None), \
+            patch.object(similarity, "_STRING_WORKERS", 2), \
+            patch.object(similarity, "_STRING_PARALLEL_MIN", 500), \
+            patch.object(similarity, "_get_string_pool", return_value=pool), \
+            patch.object(pool, "map", wraps=pool.map) as pool_map:
+        scores = _batch_string_similarity("orders for customer 7", candidates)
+
+    assert len(pool_map.call_args[0][2]) == 3  # 256 + 256 + 88
+    assert scores == [_string_similarity("orders for customer 7", c) for c in candidates]
@@ -9,9 +9,10 @@ import logging
 from logging import NullHandler
 
 from .controller import Text2SQLController
-from .models import TemplateType, Text2SQLCache, Base
+from .models import TemplateType, Text2SQLCache, Text2SQLCacheDTO, Base
 from .entity_substitution import Text2SQLEntitySubstitution
 from .similarity import Text2SQLSimilarity
+from .db import get_engine, get_session
 
 # Configure basic logging for the library
 # Applications using the library should configure their own handlers
@@ -23,8 +24,11 @@ __all__ = [
     "Text2SQLController",
     "TemplateType",
     "Text2SQLCache",
+    "Text2SQLCacheDTO",
     "Text2SQLEntitySubstitution",
     "Text2SQLSimilarity",
     "Base",
+    "get_engine",
+    "get_session",
     "__version__",
 ]
@@ -0,0 +1,96 @@
+"""
+Optional Numba-compiled scoring kernels.
+
+Numba is an optional dependency. When it is installed, `dot_rows` scores a
+float16 or int8 matrix against a query in one pass, accumulating in float32
+without materialising an upcast copy of the matrix (NumPy has no BLAS path
+for either dtype). For float32 rows that are not unit length it fuses the dot
+product and the row norm into the same pass, where NumPy reads the matrix
+twice. Callers fall back to NumPy when it returns None.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    njit = prange = None
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_many_f16(query, bits, lut, out, normalized):
+        """Score float16 rows given as raw uint16 bits, decoded through `lut`."""
+        query_norm = np.float32(1.0)
+        if not normalized:
+            total = np.float32(0.0)
+            for k in range(query.shape[0]):
+                total += query[k] * query[k]
+            query_norm = max(np.sqrt(total), np.float32(1e-12))
+        for i in prange(bits.shape[0]):
+            dot = np.float32(0.0)
+            row_norm = np.float32(0.0)
+            for k in range(bits.shape[1]):
+                value = lut[bits[i, k]]
+                dot += query[k] * value
+                row_norm += value * value
+            if normalized:
+                out[i] = dot
+            else:
+                out[i] = dot / (max(np.sqrt(row_norm), np.float32(1e-12)) * query_norm)
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_many_rows(query, matrix, out, normalized):
+        """Score int8 or float32 rows, widening each value to float32 in registers."""
+        query_norm = np.float32(1.0)
+        if not normalized:
+            total = np.float32(0.0)
+            for k in range(query.shape[0]):
+                total += query[k] * query[k]
+            query_norm = max(np.sqrt(total), np.float32(1e-12))
+        for i in prange(matrix.shape[0]):
+            dot = np.float32(0.0)
+            row_norm = np.float32(0.0)
+            for k in range(matrix.shape[1]):
+                value = np.float32(matrix[i, k])
+                dot += query[k] * value
+                row_norm += value * value
+            if normalized:
+                out[i] = dot
+            else:
+                out[i] = dot / (max(np.sqrt(row_norm), np.float32(1e-12)) * query_norm)
+
+    # float32 value of every float16 bit pattern (256 KiB, stays in cache)
+    _FLOAT16_LUT = np.arange(1 << 16, dtype=np.uint32).astype(np.uint16).view(np.float16).astype(np.float32)
+
+
+def dot_rows(query: np.ndarray, matrix: np.ndarray, normalized: bool) -> Optional[np.ndarray]:
+    """Cosine similarity of a query against every row of a float16, int8 or float32 matrix.
+
+    Numba has no float16 arithmetic on the CPU, so float16 rows are read as raw
+    bits and decoded through a lookup table inside the loop. For int8 rows,
+    `normalized` means the scores are raw dot products still to be multiplied
+    by the per-row scales.
+
+    Args:
+        query: 1D query vector.
+        matrix: C-contiguous 2D float16, int8 or float32 array with one candidate vector per row.
+        normalized: Whether the query and the rows are already unit length.
+
+    Returns:
+        1D float32 array of scores, or None if Numba is unavailable or the
+        matrix has another dtype.
+    """
+    if not NUMBA_AVAILABLE or matrix.dtype not in (np.float16, np.int8, np.float32):
+        return None
+    query = np.ascontiguousarray(query, dtype=np.float32)
+    out = np.empty(matrix.shape[0], dtype=np.float32)
+    if matrix.dtype != np.float16:
+        _cosine_many_rows(query, np.ascontiguousarray(matrix), out, normalized)
+    else:
+        _cosine_many_f16(query, matrix.view(np.uint16), _FLOAT16_LUT, out, normalized)
+    return out
@@ -1,18 +1,27 @@
 import logging
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import numpy as np
-from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, JSON, Float, Boolean, DateTime, Text
+import orjson
+from sqlalchemy.orm import Session, defer, load_only
+from sqlalchemy import Column, Integer, String, JSON, Float, Boolean, DateTime, Text, func
+from sqlalchemy import and_, case, delete, insert, or_, cast, literal, select, true, update
+from sqlalchemy.dialects.postgresql import JSONB, array as postgresql_array
 from sqlalchemy.exc import SQLAlchemyError
+import functools
 import json
-import datetime
-from scipy.spatial.distance import cosine
+import hashlib
+import heapq
 import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Local imports within the library
-from .models import Text2SQLCache, TemplateType, Status, CacheAuditLog, UsageLog
-from .similarity import Text2SQLSimilarity
-from .entity_substitution import Text2SQLEntitySubstitution
+from .models import Text2SQLCache, TemplateType, Status, CacheAuditLog, UsageLog, hash_nl_query, normalize_nl_query
+from .similarity import Text2SQLSimilarity, cosine_similarities
+from .vector_index import FAISS_AVAILABLE, HNSWVectorIndex
+from .entity_substitution import Text2SQLEntitySubstitution, compile_substitution
 
 # Set up logger first
 logger = logging.getLogger(__name__)
@@ -31,6 +40,64 @@ except ImportError as e:
     LLMService = None
 
 
+# Runs model calls for cache writes so they overlap with the writer's database round-trips
+_EMBEDDING_THREADS = int(os.environ.get("NLC_EMBEDDING_THREADS", "2"))
+_embedding_pool: Optional[ThreadPoolExecutor] = None
+_embedding_pool_lock = threading.Lock()
+
+
+def _get_embedding_pool() -> ThreadPoolExecutor:
+    """Return the shared embedding thread pool, creating it on first use."""
+    global _embedding_pool
+    if _embedding_pool is None:
+        with _embedding_pool_lock:
+            if _embedding_pool is None:
+                _embedding_pool = ThreadPoolExecutor(
+                    max_workers=_EMBEDDING_THREADS, thread_name_prefix="nlc-embedding"
+                )
+    return _embedding_pool
+
+
+# Upper bound on threads running a workflow's parallel steps at once
+_WORKFLOW_STEP_THREADS = int(os.environ.get("NLC_WORKFLOW_STEP_THREADS", "8"))
+
+
+@functools.lru_cache(maxsize=int(os.environ.get("NLC_SUBSTITUTION_CACHE_SIZE", "4096")))
+def _cached_substitute(
+    cache_id: int,
+    updated_at: Optional[str],
+    template: str,
+    entity_items: tuple,
+    replacements_json: str,
+    template_type: str,
+) -> str:
+    """Return `template` with `entity_items` substituted, memoised per entry version.
+
+    Workflow retries and chained workflows repeat the same entry with the same
+    entity values; the key includes updated_at and the template itself, so an
+    edited entry is never served a stale substitution. New entity values go
+    through the template's compiled substitution when it applies.
+    """
+    entity_values = dict(entity_items)
+    compiled = compile_substitution(template, replacements_json, template_type)
+    if compiled is not None:
+        substituted_template = compiled(entity_values)
+        if substituted_template is not None:
+            return substituted_template
+    substituted_template, _ = Text2SQLEntitySubstitution.extract_and_replace_entities(
+        nl_query="",
+        template=template,
+        entity_replacements=json.loads(replacements_json),
+        new_entity_values=entity_values,
+        template_type=template_type,
+    )
+    return substituted_template
+
+
+# Supported precisions for the in-memory embedding matrix
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+
 class Text2SQLController:
     """Controller for managing Text2SQL cache operations."""
 
@@ -38,6 +105,8 @@ class Text2SQLController:
         self,
         db_session: Session,
         similarity_model_name: str = "sentence-transformers/all-mpnet-base-v2",
+        embedding_dtype: Optional[str] = None,
+        warm_start: Optional[bool] = None,
     ):
         """
         Initialize the Text2SQL controller.
@@ -45,25 +114,78 @@ class Text2SQLController:
         Args:
             db_session: An active SQLAlchemy Session object for database interactions.
             similarity_model_name: Name of the sentence transformer model to use for embeddings.
+            embedding_dtype: Precision of the in-memory embedding matrix used for vector
+                search ('float32', 'float16', or 'int8' with a per-row scale). Defaults to
+                the NLC_EMBEDDING_DTYPE environment variable, or 'float32'.
+            warm_start: Load the embedding matrix (and build the HNSW index) in a
+                background thread right away, so the first vector search does not
+                pay for it. Defaults to the NLC_WARM_START environment variable.
 
         Raises:
-            ValueError: If db_session is None.
+            ValueError: If db_session is None or embedding_dtype is not supported.
         """
         if db_session is None:
             raise ValueError(
                 "db_session cannot be None. Please provide an active SQLAlchemy session."
             )
+        embedding_dtype = embedding_dtype or os.environ.get("NLC_EMBEDDING_DTYPE", "float32")
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(
+                f"Unsupported embedding_dtype '{embedding_dtype}'. Use one of: {', '.join(EMBEDDING_DTYPES)}"
+            )
 
         self.session = db_session
+        # The sentence transformer itself is shared per model name (Text2SQLSimilarity._model_cache);
+        # the util's candidate matrix and index stay private to this controller
         self.similarity_util = Text2SQLSimilarity(model_name=similarity_model_name)
+        # In-memory matrix of L2-normalised embeddings, loaded lazily on first vector search
+        self._emb_matrix: Optional[np.ndarray] = None
+        self._emb_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        # Per-row dequantisation scales for int8 matrices (1.0 for float dtypes)
+        self._emb_scales: np.ndarray = np.empty(0, dtype=np.float32)
+        self._emb_pos: Dict[int, int] = {}
+        self._emb_count = 0
+        self._emb_dtype = np.dtype(embedding_dtype)
+        # Optional HNSW index (faiss) used for candidate generation on large caches
+        self._ann_index: Optional[HNSWVectorIndex] = None
+        self._ann_min_rows = int(os.environ.get("NLC_ANN_MIN_ROWS", "10000"))
+        self._ann_index_path = os.environ.get("NLC_ANN_INDEX_PATH")
+        # The matrix and index are shared with background warm-up/index-build threads
+        self._emb_lock = threading.RLock()
+        self._emb_generation = 0
+        self._ann_building = False
+        self._ann_dirty: set = set()
+        self._index_ready = threading.Event()
+        # LRU of blake2b(text) -> embedding, so repeated queries skip the model
+        self._embedding_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        # Lookups reorder the LRU, and both happen on the embedding pool threads
+        self._embedding_cache_lock = threading.Lock()
+        self._embedding_cache_size = int(os.environ.get("NLC_EMBEDDING_CACHE_SIZE", "4096"))
+        # Buffered usage_count increments, written in one UPDATE every few seconds
+        # (NLC_USAGE_FLUSH_INTERVAL=0 writes every increment immediately)
+        self._usage_deltas: Dict[int, int] = defaultdict(int)
+        self._usage_lock = threading.Lock()
+        self._usage_last_flush = time.monotonic()
+        self._usage_flush_interval = float(os.environ.get("NLC_USAGE_FLUSH_INTERVAL", "5"))
+        self._usage_flush_size = int(os.environ.get("NLC_USAGE_FLUSH_SIZE", "1000"))
         logger.info(
             f"Text2SQLController initialized with model: {similarity_model_name}"
         )
 
+        if warm_start is None:
+            warm_start = os.environ.get("NLC_WARM_START", "false").lower() == "true"
+        if warm_start:
+            threading.Thread(
+                target=self._warm_vector_index, name="nlc-warm-index", daemon=True
+            ).start()
+
     def _get_embedding(self, text: str) -> Optional[np.ndarray]:
         """
         Get vector embedding for a text string using the similarity utility.
 
+        Results are memoised in an LRU keyed by a hash of the text; callers get
+        a copy so they can modify the array freely.
+
         Args:
             text: Text to embed.
 
@@ -73,17 +195,115 @@ class Text2SQLController:
         Raises:
             Exception: If embedding generation fails unexpectedly (logged).
         """
+        key = self._embedding_key(text)
+        cached = self._lookup_embedding(key)
+        if cached is not None:
+            return cached.copy()
         try:
             embedding = self.similarity_util.get_embedding([text])
             if embedding is None or len(embedding) == 0:
                 logger.warning(f"Could not generate embedding for text: {text[:50]}...")
                 return None
             # Ensure it's a 1D array if a single string was passed
-            return embedding[0] if embedding.ndim > 1 else embedding
+            embedding = embedding[0] if embedding.ndim > 1 else embedding
+            self._remember_embedding(key, np.array(embedding))
+            return embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return None
 
+    @staticmethod
+    def _embedding_key(text: str) -> bytes:
+        """Return the embedding cache key for a text."""
+        return hashlib.blake2b(str(text).encode("utf-8"), digest_size=16).digest()
+
+    def _lookup_embedding(self, key: bytes) -> Optional[np.ndarray]:
+        """Return a cached embedding, marking it most recently used, or None."""
+        with self._embedding_cache_lock:
+            cached = self._embedding_cache.get(key)
+            if cached is not None:
+                self._embedding_cache.move_to_end(key)
+            return cached
+
+    def _remember_embedding(self, key: bytes, embedding: np.ndarray) -> None:
+        """Store an embedding in the LRU, evicting the least recently used entry when full."""
+        if self._embedding_cache_size <= 0:
+            return
+        with self._embedding_cache_lock:
+            self._embedding_cache[key] = embedding
+            self._embedding_cache.move_to_end(key)
+            while len(self._embedding_cache) > self._embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+
+    def _get_embeddings(self, texts: List[str], batch_size: int = 64) -> List[Optional[np.ndarray]]:
+        """
+        Get embeddings for several texts, encoding all cache misses in one model call.
+
+        Misses are de-duplicated and sorted by length so each mini-batch pads
+        to similar sequence lengths.
+
+        Args:
+            texts: Texts to embed.
+            batch_size: Number of texts encoded per model forward pass.
+
+        Returns:
+            One embedding (or None if embedding failed) per input text.
+        """
+        keys = [self._embedding_key(t) for t in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        misses: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            cached = self._lookup_embedding(key)
+            if cached is not None:
+                found[key] = cached
+            else:
+                misses[key] = text
+
+        if misses:
+            order = sorted(misses, key=lambda k: len(str(misses[k])))
+            try:
+                embeddings = self.similarity_util.get_embedding(
+                    [misses[k] for k in order], batch_size=min(batch_size, len(order))
+                )
+            except Exception as e:
+                logger.error(f"Error generating embeddings: {e}")
+                embeddings = None
+            if embeddings is None or len(embeddings) != len(order):
+                logger.warning(f"Could not generate embeddings for {len(order)} texts")
+            else:
+                for key, embedding in zip(order, embeddings):
+                    found[key] = np.array(embedding)
+                    self._remember_embedding(key, found[key])
+
+        return [found[key].copy() if key in found else None for key in keys]
+
+    def embed_many(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Embed several texts with one batched model call.
+
+        Goes through `_get_embeddings`, so repeated and recently seen texts skip
+        the model and the rest are encoded length-sorted in one call.
+
+        Args:
+            texts: Texts to embed.
+
+        Returns:
+            A 2D float32 array of unit-length embeddings (one row per text), or
+            None if embedding fails.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        embeddings = self._get_embeddings(texts, batch_size=64)
+        if any(embedding is None for embedding in embeddings):
+            logger.warning(f"Could not generate embeddings for {len(texts)} texts")
+            return None
+        try:
+            matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        except ValueError as e:
+            logger.error(f"Error generating embeddings: {e}")
+            return None
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
     def _compute_string_similarity(self, s1: str, s2: str) -> float:
         """
         Compute string similarity using the similarity utility.
@@ -145,8 +365,8 @@ class Text2SQLController:
             raise ValueError("nl_query and template are required")
 
         try:
-            # Create and get embedding
-            embedding_array = self._get_embedding(nl_query)
+            # Embed on the pool while the entry is built and a connection is checked out
+            embedding_future = _get_embedding_pool().submit(self._get_embedding, nl_query)
 
             # If is_template is not specified, determine it from entity_replacements
             if is_template is None:
@@ -166,24 +386,26 @@ class Text2SQLController:
                 catalog_name=catalog_name,
                 status=status,
             )
-            # Use the property setter to handle numpy array -> list conversion
-            cache_entry.embedding = embedding_array
-
             # Store in database using the provided session
             self.session.add(cache_entry)
-            self.session.flush()  # Assign ID before commit/return
-            self.session.commit()
+            # Checks out the connection (pool pre-ping round-trip) while the model runs
+            self.session.connection()
 
-            # Log the creation in audit log
-            audit_log = CacheAuditLog(
-                cache_entry_id=cache_entry.id,
-                changed_field="creation",
-                old_value=None,
-                new_value=None,
-                change_reason="New cache entry created"
-            )
-            self.session.add(audit_log)
+            # Use the property setter to handle numpy array -> list conversion
+            embedding_array = embedding_future.result()
+            cache_entry.embedding = embedding_array
+            self.session.flush()  # Assign ID for the audit log
+
+            # Log the creation in audit log, in the same transaction
+            self._insert_audit_logs([{
+                "cache_entry_id": cache_entry.id,
+                "changed_field": "creation",
+                "old_value": None,
+                "new_value": None,
+                "change_reason": "New cache entry created",
+            }])
             self.session.commit()
+            self._cache_embeddings([(cache_entry.id, embedding_array)])
 
             # Convert to dictionary before returning
             result = cache_entry.to_dict()
@@ -201,6 +423,155 @@ class Text2SQLController:
             self.session.rollback()
             raise ValueError(f"Error creating cache entry: {str(e)}")
 
+    def _insert_audit_logs(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Insert audit log rows with one Core INSERT in the current transaction.
+
+        Audit rows are write-once, so they skip ORM identity tracking and the
+        unit of work; the caller commits them together with the change they record.
+
+        Args:
+            rows: CacheAuditLog column values, one dictionary per row.
+        """
+        if rows:
+            self.session.execute(insert(CacheAuditLog), rows)
+
+    def add_queries(self, entries: List[Dict[str, Any]], batch_size: int = 64) -> List[Dict[str, Any]]:
+        """
+        Add several queries to the cache with one batched embedding call and one commit.
+
+        Args:
+            entries: Dictionaries with the keyword arguments accepted by `add_query`
+                (nl_query and template are required).
+            batch_size: Number of queries encoded per model forward pass.
+
+        Returns:
+            Dictionary representations of the created cache entries, in input order.
+
+        Raises:
+            SQLAlchemyError: If a database error occurs.
+            ValueError: If required fields are missing or invalid.
+        """
+        if not entries:
+            return []
+        for entry in entries:
+            if not entry.get("nl_query") or not entry.get("template"):
+                raise ValueError("nl_query and template are required")
+
+        try:
+            # Embed on the pool while the entries are built and a connection is checked out
+            embeddings_future = _get_embedding_pool().submit(
+                self._get_embeddings, [entry["nl_query"] for entry in entries], batch_size
+            )
+
+            cache_entries = []
+            for entry in entries:
+                fields = {"template_type": TemplateType.SQL, "status": Status.ACTIVE, **entry}
+                # If is_template is not specified, determine it from entity_replacements
+                if fields.get("is_template") is None:
+                    fields["is_template"] = bool(fields.get("entity_replacements"))
+                cache_entries.append(Text2SQLCache(**fields))
+            self.session.connection()
+
+            embeddings = embeddings_future.result()
+            for cache_entry, embedding_array in zip(cache_entries, embeddings):
+                cache_entry.embedding = embedding_array
+            self.session.add_all(cache_entries)
+            self.session.flush()  # Assign IDs for the audit log
+            self._insert_audit_logs([
+                {
+                    "cache_entry_id": cache_entry.id,
+                    "changed_field": "creation",
+                    "old_value": None,
+                    "new_value": None,
+                    "change_reason": "New cache entry created",
+                }
+                for cache_entry in cache_entries
+            ])
+            self.session.commit()
+            self._cache_embeddings([
+                (cache_entry.id, embedding_array)
+                for cache_entry, embedding_array in zip(cache_entries, embeddings)
+            ])
+
+            results = [cache_entry.to_dict() for cache_entry in cache_entries]
+            logger.info(f"Added {len(results)} new cache entries")
+            return results
+
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Database error adding queries to cache: {str(e)}", exc_info=True
+            )
+            self.session.rollback()
+            raise
+        except Exception as e:
+            logger.error(f"Failed to add queries to cache: {str(e)}", exc_info=True)
+            self.session.rollback()
+            raise ValueError(f"Error creating cache entries: {str(e)}")
+
+    def embed_missing_entries(self, batch_size: int = 64) -> int:
+        """Store embeddings for cache entries that have none persisted.
+
+        Entries written without an embedding (e.g. by other tools) are invisible
+        to vector search. They are embedded once, one model call per batch, and
+        written back; entries that only have the legacy JSON embedding get the
+        binary copy instead of being re-embedded (and the JSON copy is dropped).
+        With USE_PG_VECTOR, entries missing pg_vector are filled from their blob.
+
+        Args:
+            batch_size: Number of entries loaded and encoded per batch.
+
+        Returns:
+            Number of entries updated.
+
+        Raises:
+            SQLAlchemyError: If a database error occurs.
+        """
+        from thinkforge.models import USE_PG_VECTOR
+        missing_embedding = Text2SQLCache.embedding_blob.is_(None)
+        if USE_PG_VECTOR:
+            missing_embedding = or_(missing_embedding, Text2SQLCache.pg_vector.is_(None))
+
+        updated = 0
+        last_id = 0
+        try:
+            while True:
+                entries = (
+                    self.session.query(Text2SQLCache)
+                    .filter(missing_embedding, Text2SQLCache.id > last_id)
+                    .order_by(Text2SQLCache.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not entries:
+                    break
+                last_id = entries[-1].id
+
+                embeddings = [entry.embedding for entry in entries]
+                missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+                if missing:
+                    fresh = self._get_embeddings([entries[i].nl_query or "" for i in missing], batch_size)
+                    for i, embedding in zip(missing, fresh):
+                        embeddings[i] = embedding
+
+                rows = [
+                    (entry, embedding)
+                    for entry, embedding in zip(entries, embeddings)
+                    if embedding is not None
+                ]
+                for entry, embedding in rows:
+                    entry.embedding = embedding
+                self.session.commit()
+                self._cache_embeddings([(entry.id, embedding) for entry, embedding in rows])
+                updated += len(rows)
+        except SQLAlchemyError as e:
+            logger.error(f"Database error embedding missing entries: {str(e)}", exc_info=True)
+            self.session.rollback()
+            raise
+
+        logger.info(f"Stored embeddings for {updated} cache entries")
+        return updated
+
     def search_query(
         self,
         nl_query: str,
@@ -232,148 +603,760 @@ class Text2SQLController:
         if not nl_query:
             return []
 
-        # Build the base query with filters applied at the database level
-        query = self.session.query(Text2SQLCache)
-        if status:
-            query = query.filter(Text2SQLCache.status == status)
-        if template_type:
-            query = query.filter(Text2SQLCache.template_type == template_type)
-        if catalog_type:
-            query = query.filter(Text2SQLCache.catalog_type == catalog_type)
-        if catalog_subtype:
-            query = query.filter(Text2SQLCache.catalog_subtype == catalog_subtype)
-        if catalog_name:
-            query = query.filter(Text2SQLCache.catalog_name == catalog_name)
-
-        # Fetch the filtered candidates
-        candidates = [c.to_dict() for c in query.all()]
-        if not candidates:
-            return []
-        
-        # Get embeddings for vector similarity if needed
-        candidate_embeddings_list = []
-        embedding_field_name = 'embedding'  # Default field name
-        # Check if the field might be named differently
-        if candidates and 'vector_embedding' in candidates[0]:
-            embedding_field_name = 'vector_embedding'
-        for c in candidates:
-            emb = c.get(embedding_field_name)
-            if emb is not None and len(emb) > 0:
-                candidate_embeddings_list.append(np.array(emb))
-            else:
-                candidate_embeddings_list.append(None)
-        logger.info(f"Using stored embeddings for {len(candidate_embeddings_list)} candidates")
+        filters = dict(
+            template_type=template_type,
+            catalog_type=catalog_type,
+            catalog_subtype=catalog_subtype,
+            catalog_name=catalog_name,
+            status=status,
+        )
 
         # Determine search method if auto
         if search_method == "auto":
-            if len(candidates) > 100:
-                search_method = "vector"
-            else:
-                search_method = "string"
+            candidate_count = self._apply_search_filters(
+                self.session.query(func.count(Text2SQLCache.id)), **filters
+            ).scalar()
+            search_method = "vector" if candidate_count > 100 else "string"
         logger.info(f"Method: {search_method}, Threshold: {similarity_threshold}")
 
-        # Perform search based on method
+        # Repeats of a cached query (up to case and whitespace) are found through the
+        # hash index; they rank first and the search only fills the remaining slots
+        exact_hits = []
+        if search_method in ("vector", "string"):
+            exact_hits = self._search_query_hash(nl_query, limit, filters)
+            if exact_hits:
+                logger.info(f"Found {len(exact_hits)} normalised exact matches by nl_query_hash")
+                if len(exact_hits) >= limit:
+                    return exact_hits
+                filters["exclude_ids"] = [hit["id"] for hit in exact_hits]
+                limit -= len(exact_hits)
+
+        return exact_hits + self._search_similar(
+            nl_query, search_method, similarity_threshold, limit, filters
+        )
+
+    def _search_similar(
+        self,
+        nl_query: str,
+        search_method: str,
+        similarity_threshold: float,
+        limit: int,
+        filters: Dict[str, Any],
+    ) -> List[Dict[str, Any]]:
+        """Run one search method ('exact', 'string' or 'vector') for `search_query`.
+
+        Args:
+            nl_query: The natural language query to search for.
+            search_method: Resolved search method (not 'auto').
+            similarity_threshold: Minimum similarity score (0.0 to 1.0).
+            limit: Maximum number of results to return.
+            filters: Keyword filters for `_apply_search_filters`.
+
+        Returns:
+            List of matching cache entries with similarity scores.
+        """
+        if search_method == "vector":
+            query_emb = self._get_embedding(nl_query)
+            if query_emb is not None:
+                from thinkforge.models import USE_PG_VECTOR
+                if USE_PG_VECTOR:
+                    results = self._search_pg_vector(query_emb, similarity_threshold, limit, filters)
+                    logger.info(f"Found {len(results)} matches above threshold using pg_vector")
+                else:
+                    results = self._search_embedding_matrix(query_emb, similarity_threshold, limit, filters)
+                    logger.info(f"Found {len(results)} matches above threshold")
+                return results
+            logger.warning("Failed to get embedding for query, falling back to string search")
+            search_method = "string"
+
+        if search_method not in ("exact", "string"):
+            raise ValueError(f"Unknown search method: {search_method}")
+
         if search_method == "exact":
-            results = [
-                c for c in candidates if c.get("nl_query", "").lower() == nl_query.lower()
-            ]
+            entries = (
+                self._apply_search_filters(self.session.query(Text2SQLCache), **filters)
+                .filter(func.lower(Text2SQLCache.nl_query) == nl_query.lower())
+                .limit(limit)
+                .all()
+            )
+            results = [entry.to_dict() for entry in entries]
             for r in results:
-                r["similarity"] = 1.0 if r.get("nl_query", "").lower() == nl_query.lower() else 0.0
-        elif search_method == "string":
-            results = []
-            for c in candidates:
-                sim = self._compute_string_similarity(nl_query, c.get("nl_query", ""))
-                if sim >= similarity_threshold:
-                    c["similarity"] = sim
-                    results.append(c)
-        elif search_method == "vector":
-            from thinkforge.models import USE_PG_VECTOR
-            if USE_PG_VECTOR:
+                r["similarity"] = 1.0
+            return results
+
+        # String matching scores (id, nl_query) pairs; only the top-k winners are serialised
+        rows = self._apply_search_filters(
+            self.session.query(Text2SQLCache.id, Text2SQLCache.nl_query), **filters
+        ).all()
+        scored = []
+        for entry_id, candidate_query in rows:
+            sim = self._compute_string_similarity(nl_query, candidate_query or "")
+            if sim >= similarity_threshold:
+                scored.append((entry_id, sim))
+        top = heapq.nlargest(limit, scored, key=lambda pair: pair[1])
+        if not top:
+            return []
+
+        entries = {
+            entry.id: entry
+            for entry in self.session.query(Text2SQLCache)
+            .filter(Text2SQLCache.id.in_([entry_id for entry_id, _ in top]))
+            .all()
+        }
+        results = []
+        for entry_id, sim in top:
+            entry = entries.get(entry_id)
+            if entry is not None:
+                entry_dict = entry.to_dict()
+                entry_dict["similarity"] = sim
+                results.append(entry_dict)
+        return results
+
+    def _search_query_hash(
+        self, nl_query: str, limit: int, filters: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Look up entries whose normalised nl_query equals the query, via the nl_query_hash index.
+
+        Args:
+            nl_query: The natural language query to search for.
+            limit: Maximum number of matches.
+            filters: Keyword filters for `_apply_search_filters`.
+
+        Returns:
+            Matching cache entries with a similarity of 1.0.
+        """
+        query_hash = hash_nl_query(nl_query)
+        entries = (
+            self._apply_search_filters(self.session.query(Text2SQLCache), **filters)
+            .filter(Text2SQLCache.nl_query_hash == query_hash)
+            .limit(limit)
+            .all()
+        )
+        results = []
+        for entry in entries:
+            # Guard against hash collisions
+            if normalize_nl_query(entry.nl_query) == normalize_nl_query(nl_query):
+                entry_dict = entry.to_dict()
+                entry_dict["similarity"] = 1.0
+                results.append(entry_dict)
+        return results
+
+    def _search_pg_vector(
+        self,
+        query_emb: np.ndarray,
+        similarity_threshold: float,
+        limit: int,
+        filters: Dict[str, Any],
+    ) -> List[Dict[str, Any]]:
+        """Top-k cosine search evaluated by pgvector (HNSW index on `<=>`).
+
+        Args:
+            query_emb: The query embedding.
+            similarity_threshold: Minimum cosine similarity to keep a match.
+            limit: Maximum number of matches.
+            filters: Keyword filters for `_apply_search_filters`.
+
+        Returns:
+            Matching cache entries with similarity scores, best first.
+        """
+        distance = Text2SQLCache.pg_vector.cosine_distance(query_emb)
+        vector_query = self._apply_search_filters(
+            self.session.query(Text2SQLCache, (1 - distance).label("similarity")), **filters
+        )
+        vector_query = (
+            vector_query.filter(distance <= 1 - similarity_threshold)
+            .order_by(distance)
+            .limit(limit)
+        )
+        results = []
+        for entry, sim in vector_query.all():
+            entry_dict = entry.to_dict()
+            entry_dict["similarity"] = float(sim)
+            results.append(entry_dict)
+        return results
+
+    def _search_embedding_matrix(
+        self,
+        query_emb: np.ndarray,
+        similarity_threshold: float,
+        limit: int,
+        filters: Dict[str, Any],
+    ) -> List[Dict[str, Any]]:
+        """Top-k cosine search against the in-memory embedding matrix.
+
+        The filters are resolved in SQL to candidate ids only; all cached
+        embeddings are scored with a single matrix-vector product, and only the
+        winning rows are loaded and serialised.
+
+        Args:
+            query_emb: The query embedding.
+            similarity_threshold: Minimum cosine similarity to keep a match.
+            limit: Maximum number of matches.
+            filters: Keyword filters for `_apply_search_filters`.
+
+        Returns:
+            Matching cache entries with similarity scores, best first.
+        """
+        candidate_ids = np.fromiter(
+            (row_id for (row_id,) in self._apply_search_filters(
+                self.session.query(Text2SQLCache.id), **filters
+            ).all()),
+            dtype=np.int64,
+        )
+        if candidate_ids.size == 0:
+            return []
+
+        with self._emb_lock:
+            self._ensure_embedding_matrix(candidate_ids)
+            count = self._emb_count
+            if count == 0:
+                return []
+
+            query_vec = np.asarray(query_emb, dtype=np.float32).ravel()
+            if query_vec.shape[0] != self._emb_matrix.shape[1]:
+                logger.warning(
+                    f"Query embedding dimension {query_vec.shape[0]} does not match cached "
+                    f"dimension {self._emb_matrix.shape[1]}"
+                )
+                return []
+            query_vec = query_vec / max(float(np.linalg.norm(query_vec)), 1e-12)
+
+            # Exact scan until the background HNSW build has attached an index
+            hits = None
+            if self._ann_index is not None:
+                hits = self._search_ann_index(query_vec, candidate_ids, similarity_threshold, limit)
+            if hits is None:
+                scores = self._score_matrix_rows(query_vec, slice(0, count))
+                rows = np.flatnonzero(np.isin(self._emb_ids[:count], candidate_ids))
+                if rows.size == 0:
+                    return []
+                row_scores = scores[rows]
+
+                k = min(max(limit, 1), rows.size)
+                top = np.argpartition(-row_scores, k - 1)[:k] if k < rows.size else np.arange(rows.size)
+                top = top[np.argsort(-row_scores[top])]
+                hits = [
+                    (int(self._emb_ids[rows[i]]), float(row_scores[i]))
+                    for i in top
+                    if row_scores[i] >= similarity_threshold
+                ]
+        if not hits:
+            return []
+
+        entries = {
+            entry.id: entry
+            for entry in self.session.query(Text2SQLCache)
+            .filter(Text2SQLCache.id.in_([entry_id for entry_id, _ in hits]))
+            .all()
+        }
+        results = []
+        for entry_id, score in hits:
+            if entry_id in entries:
+                entry_dict = entries[entry_id].to_dict()
+                entry_dict["similarity"] = score
+                results.append(entry_dict)
+        return results
+
+    def _search_ann_index(
+        self,
+        query_vec: np.ndarray,
+        candidate_ids: np.ndarray,
+        similarity_threshold: float,
+        limit: int,
+    ) -> Optional[List[tuple]]:
+        """Generate candidates from the HNSW index and rescore them exactly.
+
+        Args:
+            query_vec: Unit-length query embedding.
+            candidate_ids: Ids allowed by the search filters.
+            similarity_threshold: Minimum cosine similarity to keep a match.
+            limit: Maximum number of matches.
+
+        Returns:
+            (entry_id, similarity) pairs best first, or None when the filters
+            rejected too many neighbours and an exact scan is needed instead.
+        """
+        fetch = max(limit, 1) * 4
+        neighbours = self._ann_index.search(query_vec, fetch)
+        neighbour_ids = np.fromiter((entry_id for entry_id, _ in neighbours), dtype=np.int64)
+        allowed = neighbour_ids[np.isin(neighbour_ids, candidate_ids)]
+        if allowed.size < limit and len(neighbours) == fetch:
+            return None
+
+        # Exact scores from the matrix, so results match the brute-force path
+        rows = np.fromiter((self._emb_pos[entry_id] for entry_id in allowed.tolist()), dtype=np.int64)
+        scores = self._score_matrix_rows(query_vec, rows)
+        order = np.argsort(-scores)[:limit]
+        return [
+            (int(allowed[i]), float(scores[i]))
+            for i in order
+            if scores[i] >= similarity_threshold
+        ]
+
+    def _score_matrix_rows(self, query_vec: np.ndarray, rows) -> np.ndarray:
+        """Cosine similarity of a unit-length query against rows of the matrix.
+
+        Args:
+            query_vec: Unit-length query embedding.
+            rows: Slice or index array selecting matrix rows.
+        """
+        scores = cosine_similarities(query_vec, self._emb_matrix[rows], normalized=True)
+        if self._emb_dtype == np.int8:
+            scores = scores * self._emb_scales[rows]
+        return scores
+
+    def _matrix_rows(self, rows) -> np.ndarray:
+        """Dequantised float32 copy of rows of the matrix.
+
+        Args:
+            rows: Slice or index array selecting matrix rows.
+        """
+        vectors = self._emb_matrix[rows].astype(np.float32)
+        if self._emb_dtype == np.int8:
+            vectors *= self._emb_scales[rows, None]
+        return vectors
+
+    def _maybe_build_ann_index(self) -> bool:
+        """Start building an HNSW index once the matrix is large enough and faiss is installed.
+
+        The index is built in a background thread from a snapshot of the matrix;
+        searches keep using the exact scan until it is attached. Must be called
+        with `_emb_lock` held.
+
+        Returns:
+            True if a build was started.
+        """
+        if (
+            self._ann_index is not None
+            or self._ann_building
+            or not FAISS_AVAILABLE
+            or self._emb_count < self._ann_min_rows
+        ):
+            return False
+        count = self._emb_count
+        self._ann_building = True
+        self._ann_dirty = set()
+        threading.Thread(
+            target=self._build_ann_index,
+            args=(self._emb_ids[:count].copy(), self._matrix_rows(slice(0, count)), self._emb_generation),
+            name="nlc-ann-build",
+            daemon=True,
+        ).start()
+        return True
+
+    def _build_ann_index(self, ids: np.ndarray, vectors: np.ndarray, generation: int) -> None:
+        """Build the HNSW index for a matrix snapshot and attach it.
+
+        The index is loaded from NLC_ANN_INDEX_PATH when present (and reconciled
+        with the snapshot), otherwise built and saved there. Rows that changed
+        while it was being built are replayed before it is attached.
+
+        Args:
+            ids: Entry ids of the snapshot rows.
+            vectors: Unit-length float32 embeddings, one row per id.
+            generation: Matrix generation the snapshot was taken from.
+        """
+        try:
+            index = None
+            if self._ann_index_path and os.path.exists(self._ann_index_path):
                 try:
-                    from pgvector.sqlalchemy import Vector
-                    query_emb = self._get_embedding(nl_query)
-                    if query_emb is None:
-                        logger.warning("Failed to get embedding for query, falling back to string search")
-                        results = []
-                        for c in candidates:
-                            sim = self._compute_string_similarity(nl_query, c.get("nl_query", ""))
-                            if sim >= similarity_threshold:
-                                c["similarity"] = sim
-                                results.append(c)
+                    index = HNSWVectorIndex.load(self._ann_index_path)
+                    if index.dim != vectors.shape[1]:
+                        index = None
                     else:
-                        results = []
-                        # Use pg_vector for similarity search
-                        vector_query = self.session.query(Text2SQLCache).filter(
-                            Text2SQLCache.status == status if status else Text2SQLCache.status == Status.ACTIVE
-                        )
-                        if catalog_type:
-                            vector_query = vector_query.filter(Text2SQLCache.catalog_type == catalog_type)
-                        if catalog_subtype:
-                            vector_query = vector_query.filter(Text2SQLCache.catalog_subtype == catalog_subtype)
-                        if catalog_name:
-                            vector_query = vector_query.filter(Text2SQLCache.catalog_name == catalog_name)
-                        if template_type:
-                            vector_query = vector_query.filter(Text2SQLCache.template_type == template_type)
-                        # Perform vector similarity search using pg_vector
-                        vector_query = vector_query.order_by(Text2SQLCache.pg_vector.cosine_distance(query_emb)).limit(limit * 2)
-                        pg_results = vector_query.all()
-                        for res in pg_results:
-                            res_dict = res.to_dict()
-                            # Calculate similarity for display purposes
-                            sim = self.similarity_util.compute_cosine_similarity(query_emb, res.embedding) if res.embedding is not None else 0.0
-                            if sim >= similarity_threshold:
-                                res_dict["similarity"] = float(sim)
-                                results.append(res_dict)
-                        logger.info(f"Found {len(results)} matches above threshold using pg_vector")
-                except ImportError:
-                    logger.warning("pg_vector not available, falling back to standard vector search")
-                    query_emb = self._get_embedding(nl_query)
-                    if query_emb is None:
-                        logger.warning("Failed to get embedding for query, falling back to string search")
-                        results = []
-                        for c in candidates:
-                            sim = self._compute_string_similarity(nl_query, c.get("nl_query", ""))
-                            if sim >= similarity_threshold:
-                                c["similarity"] = sim
-                                results.append(c)
+                        # Reconcile with rows changed since the index was saved
+                        stale = set(index._id_labels) - set(ids.tolist())
+                        index.remove(stale)
+                        missing = np.flatnonzero(~np.isin(ids, list(index._id_labels)))
+                        index.add(ids[missing], vectors[missing])
+                except Exception as e:
+                    logger.warning(f"Could not load vector index from {self._ann_index_path}: {e}")
+                    index = None
+            if index is None:
+                index = HNSWVectorIndex(vectors.shape[1])
+                index.add(ids, vectors)
+                if self._ann_index_path:
+                    try:
+                        index.save(self._ann_index_path)
+                    except Exception as e:
+                        logger.warning(f"Could not save vector index to {self._ann_index_path}: {e}")
+
+            with self._emb_lock:
+                if generation != self._emb_generation:
+                    return
+                for entry_id in self._ann_dirty:
+                    row = self._emb_pos.get(entry_id)
+                    if row is None:
+                        index.remove([entry_id])
                     else:
-                        results = []
-                        valid_indices = [i for i, emb in enumerate(candidate_embeddings_list) if emb is not None]
-                        valid_embs = [candidate_embeddings_list[i] for i in valid_indices]
-                        if valid_embs:
-                            similarities = self.similarity_util.compute_vector_similarities(query_emb, valid_embs)
-                            for idx, sim in zip(valid_indices, similarities):
-                                if sim >= similarity_threshold:
-                                    candidates[idx]["similarity"] = float(sim)
-                                    results.append(candidates[idx])
-                        logger.info(f"Found {len(results)} matches above threshold")
-            else:
-                query_emb = self._get_embedding(nl_query)
-                if query_emb is None:
-                    logger.warning("Failed to get embedding for query, falling back to string search")
-                    results = []
-                    for c in candidates:
-                        sim = self._compute_string_similarity(nl_query, c.get("nl_query", ""))
-                        if sim >= similarity_threshold:
-                            c["similarity"] = sim
-                            results.append(c)
+                        index.add([entry_id], self._matrix_rows(slice(row, row + 1)))
+                self._ann_dirty = set()
+                self._ann_index = index
+            logger.info(f"Vector search uses an HNSW index over {len(index)} embeddings")
+        except Exception as e:
+            logger.warning(f"Could not build vector index: {e}")
+        finally:
+            with self._emb_lock:
+                if generation == self._emb_generation:
+                    self._ann_building = False
+            self._index_ready.set()
+
+    def _warm_vector_index(self) -> None:
+        """Load the embedding matrix with a dedicated session and start the HNSW build."""
+        from thinkforge.models import USE_PG_VECTOR
+        if USE_PG_VECTOR:
+            # pgvector searches in the database; there is nothing to warm
+            self._index_ready.set()
+            return
+        session = Session(bind=self.session.get_bind())
+        try:
+            self._ensure_embedding_matrix(session=session)
+        except Exception as e:
+            logger.warning(f"Background vector index warm-up failed: {e}")
+            self._index_ready.set()
+        finally:
+            session.close()
+
+    def save_vector_index(self) -> bool:
+        """Persist the HNSW index to NLC_ANN_INDEX_PATH.
+
+        Returns:
+            True if an index was saved, False if there is no index or no path.
+        """
+        if self._ann_index is None or not self._ann_index_path:
+            return False
+        self._ann_index.save(self._ann_index_path)
+        return True
+
+    def _ensure_embedding_matrix(
+        self, candidate_ids: Optional[np.ndarray] = None, session: Optional[Session] = None
+    ) -> None:
+        """Load the embedding matrix on first use and add any candidates it is missing.
+
+        Rows written through this controller are kept in sync as they change;
+        candidate ids that are not cached yet (e.g. inserted by another process)
+        are loaded from the database in one query.
+
+        Args:
+            candidate_ids: Ids that are about to be scored.
+            session: Session to read with; defaults to the controller's session.
+        """
+        with self._emb_lock:
+            if self._emb_matrix is None:
+                rows = self._iter_embedding_rows(session=session)
+                self._emb_matrix = np.empty((0, 0), dtype=self._emb_dtype)
+                self._emb_ids = np.empty(0, dtype=np.int64)
+                self._emb_scales = np.empty(0, dtype=np.float32)
+                self._emb_pos = {}
+                self._emb_count = 0
+                self._cache_embeddings(rows)
+                logger.info(f"Loaded {self._emb_count} embeddings into the in-memory matrix")
+                if not self._maybe_build_ann_index():
+                    self._index_ready.set()
+            elif candidate_ids is not None and candidate_ids.size:
+                missing = np.setdiff1d(candidate_ids, self._emb_ids[:self._emb_count])
+                if missing.size:
+                    self._cache_embeddings(self._iter_embedding_rows(missing.tolist(), session=session))
+
+    def _iter_embedding_rows(self, ids: Optional[List[int]] = None, session: Optional[Session] = None):
+        """Stream (id, embedding) pairs from the database without building ORM objects.
+
+        Rows are fetched in chunks of 1024. embedding_blob is decoded with
+        np.frombuffer; the JSONB list is only transferred for rows that have not
+        been backfilled with a blob yet.
+
+        Args:
+            ids: Restrict the rows to these entry ids; all rows when None.
+            session: Session to read with; defaults to the controller's session.
+
+        Yields:
+            (entry_id, embedding) pairs, where embedding may be None.
+        """
+        stmt = select(
+            Text2SQLCache.id,
+            Text2SQLCache.embedding_blob,
+            case((Text2SQLCache.embedding_blob.is_(None), Text2SQLCache.vector_embedding)),
+        ).execution_options(yield_per=1024)
+        if ids is not None:
+            stmt = stmt.where(Text2SQLCache.id.in_(ids))
+        for entry_id, blob, embedding in (session or self.session).execute(stmt):
+            yield entry_id, (np.frombuffer(blob, dtype=np.float32) if blob else embedding)
+
+    def _cache_embeddings(self, rows: List[tuple]) -> None:
+        """Insert or replace (id, embedding) rows in the in-memory matrix.
+
+        Embeddings are normalised in float32 and stored in a contiguous buffer of
+        the configured dtype that grows geometrically. Rows without an embedding, or whose dimension does
+        not match the matrix, are skipped (and dropped if previously cached).
+
+        Args:
+            rows: Iterable of (entry_id, embedding) pairs.
+        """
+        with self._emb_lock:
+            if self._emb_matrix is None:
+                return
+            for entry_id, emb in rows:
+                if emb is None or len(emb) == 0:
+                    self._drop_cached_embedding(entry_id)
+                    continue
+                vec = np.asarray(emb, dtype=np.float32).ravel()
+                if self._emb_count == 0 and self._emb_matrix.shape[1] != vec.shape[0]:
+                    self._emb_matrix = np.empty((64, vec.shape[0]), dtype=self._emb_dtype)
+                    self._emb_ids = np.empty(64, dtype=np.int64)
+                    self._emb_scales = np.empty(64, dtype=np.float32)
+                if vec.shape[0] != self._emb_matrix.shape[1]:
+                    logger.warning(f"Skipping embedding for ID {entry_id} with dimension {vec.shape[0]}")
+                    self._drop_cached_embedding(entry_id)
+                    continue
+                vec = vec / max(float(np.linalg.norm(vec)), 1e-12)
+
+                row = self._emb_pos.get(entry_id)
+                if row is None:
+                    if self._emb_count == self._emb_matrix.shape[0]:
+                        capacity = max(64, self._emb_count * 2)
+                        matrix = np.empty((capacity, self._emb_matrix.shape[1]), dtype=self._emb_dtype)
+                        matrix[:self._emb_count] = self._emb_matrix[:self._emb_count]
+                        ids = np.empty(capacity, dtype=np.int64)
+                        ids[:self._emb_count] = self._emb_ids[:self._emb_count]
+                        scales = np.empty(capacity, dtype=np.float32)
+                        scales[:self._emb_count] = self._emb_scales[:self._emb_count]
+                        self._emb_matrix, self._emb_ids, self._emb_scales = matrix, ids, scales
+                    row = self._emb_count
+                    self._emb_count += 1
+                    self._emb_ids[row] = entry_id
+                    self._emb_pos[entry_id] = row
+                if self._emb_dtype == np.int8:
+                    # Symmetric per-row quantisation: row ~= int8 values * scale
+                    scale = max(float(np.abs(vec).max()), 1e-12) / 127.0
+                    self._emb_matrix[row] = np.round(vec / scale)
+                    self._emb_scales[row] = scale
                 else:
-                    results = []
-                    valid_indices = [i for i, emb in enumerate(candidate_embeddings_list) if emb is not None]
-                    valid_embs = [candidate_embeddings_list[i] for i in valid_indices]
-                    if valid_embs:
-                        similarities = self.similarity_util.compute_vector_similarities(query_emb, valid_embs)
-                        for idx, sim in zip(valid_indices, similarities):
-                            if sim >= similarity_threshold:
-                                candidates[idx]["similarity"] = float(sim)
-                                results.append(candidates[idx])
-                    logger.info(f"Found {len(results)} matches above threshold")
+                    self._emb_matrix[row] = vec
+                    self._emb_scales[row] = 1.0
+                if self._ann_index is not None:
+                    self._ann_index.add([entry_id], vec.reshape(1, -1))
+                elif self._ann_building:
+                    self._ann_dirty.add(int(entry_id))
+
+    def _drop_cached_embedding(self, entry_id: int) -> None:
+        """Remove an entry from the in-memory matrix by moving the last row into its slot."""
+        with self._emb_lock:
+            if self._emb_matrix is None:
+                return
+            if self._ann_index is not None:
+                self._ann_index.remove([entry_id])
+            elif self._ann_building:
+                self._ann_dirty.add(int(entry_id))
+            row = self._emb_pos.pop(entry_id, None)
+            if row is None:
+                return
+            last = self._emb_count - 1
+            if row != last:
+                self._emb_matrix[row] = self._emb_matrix[last]
+                self._emb_scales[row] = self._emb_scales[last]
+                moved_id = int(self._emb_ids[last])
+                self._emb_ids[row] = moved_id
+                self._emb_pos[moved_id] = row
+            self._emb_count = last
+
+    def search_query_batch(
+        self,
+        nl_queries: List[str],
+        template_type: Optional[str] = None,
+        similarity_threshold: float = 0.8,
+        per_query_limit: int = 1,
+        catalog_type: Optional[str] = None,
+        catalog_subtype: Optional[str] = None,
+        catalog_name: Optional[str] = None,
+        status: Optional[str] = Status.ACTIVE,
+    ) -> List[List[Dict[str, Any]]]:
+        """Search for several queries at once using vector similarity.
+
+        All queries share one `embed_many` call and one filtered id query, and
+        are scored against the in-memory embedding matrix (or pgvector) with a
+        single matrix product. Only the rows that end up in some query's top
+        results are loaded and serialised.
+
+        Args:
+            nl_queries: The natural language queries to search for.
+            template_type: Optional template type to filter by.
+            similarity_threshold: Minimum similarity score (0.0 to 1.0).
+            per_query_limit: Maximum number of results to return per query.
+            catalog_type: Optional catalog type to filter by.
+            catalog_subtype: Optional catalog subtype to filter by.
+            catalog_name: Optional catalog name to filter by.
+            status: Optional status to filter by. Defaults to ACTIVE.
+
+        Returns:
+            One list of matching cache entries (with similarity scores) per input
+            query, in the same order as `nl_queries`.
+        """
+        if not nl_queries:
+            return []
+
+        filters = dict(
+            template_type=template_type,
+            catalog_type=catalog_type,
+            catalog_subtype=catalog_subtype,
+            catalog_name=catalog_name,
+            status=status,
+        )
+
+        def string_search_each():
+            logger.warning("Failed to embed query batch, falling back to per-query string search")
+            return [
+                self.search_query(
+                    nl_query=q,
+                    search_method="string",
+                    similarity_threshold=similarity_threshold,
+                    limit=per_query_limit,
+                    **filters,
+                )
+                for q in nl_queries
+            ]
+
+        from thinkforge.models import USE_PG_VECTOR
+        if USE_PG_VECTOR:
+            query_matrix = self.embed_many(nl_queries)
+            if query_matrix is None:
+                return string_search_each()
+            hits = self._search_batch_pg_vector(
+                query_matrix, similarity_threshold, per_query_limit, filters
+            )
         else:
-            raise ValueError(f"Unknown search method: {search_method}")
+            candidate_ids = np.fromiter(
+                (row_id for (row_id,) in self._apply_search_filters(
+                    self.session.query(Text2SQLCache.id), **filters
+                ).all()),
+                dtype=np.int64,
+            )
+            if candidate_ids.size == 0:
+                return [[] for _ in nl_queries]
+            with self._emb_lock:
+                self._ensure_embedding_matrix(candidate_ids)
+                rows = np.flatnonzero(np.isin(self._emb_ids[:self._emb_count], candidate_ids))
+                # Fancy indexing copies, so the rows stay valid once the lock is released
+                cand_ids = self._emb_ids[rows]
+                cand_matrix = self._matrix_rows(rows)
+            if rows.size == 0:
+                return [[] for _ in nl_queries]
+
+            query_matrix = self.embed_many(nl_queries)
+            if query_matrix is None:
+                return string_search_each()
+
+            # Cosine similarity for every (query, candidate) pair in one matmul
+            scores = query_matrix @ cand_matrix.T
+
+            # Top-k per query without sorting every candidate
+            k = min(max(per_query_limit, 1), scores.shape[1])
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+
+            hits = []
+            for row_scores, idxs in zip(scores, top):
+                idxs = idxs[np.argsort(-row_scores[idxs])]
+                hits.append([
+                    (int(cand_ids[i]), float(row_scores[i]))
+                    for i in idxs
+                    if row_scores[i] >= similarity_threshold
+                ])
+
+        # Load and serialise only the winning rows
+        winner_ids = {entry_id for query_hits in hits for entry_id, _ in query_hits}
+        winners = {}
+        if winner_ids:
+            for entry in self.session.query(Text2SQLCache).filter(Text2SQLCache.id.in_(winner_ids)).all():
+                winners[entry.id] = entry.to_dict()
+
+        results = []
+        for query_hits in hits:
+            matches = []
+            for entry_id, score in query_hits:
+                if entry_id in winners:
+                    match = dict(winners[entry_id])
+                    match["similarity"] = score
+                    matches.append(match)
+            results.append(matches)
+        return results
+
+    def _search_batch_pg_vector(
+        self,
+        query_matrix: np.ndarray,
+        similarity_threshold: float,
+        per_query_limit: int,
+        filters: Dict[str, Any],
+    ) -> List[List[tuple]]:
+        """Run a top-k cosine search for every query row in one pgvector statement.
 
-        # Sort by similarity if available, otherwise by ID
-        results.sort(key=lambda x: x.get("similarity", 0.0), reverse=True)
-        return results[:limit]
+        The query embeddings are sent as a single vector[] parameter, unnested with
+        their ordinality and joined LATERAL to an index-backed `<=>` top-k probe.
+
+        Args:
+            query_matrix: 2D array with one query embedding per row.
+            similarity_threshold: Minimum cosine similarity to keep a match.
+            per_query_limit: Maximum number of matches per query.
+            filters: Keyword filters for `_apply_search_filters`.
+
+        Returns:
+            Per query, a list of (entry_id, similarity) sorted by similarity.
+        """
+        from pgvector.sqlalchemy import Vector
+        from sqlalchemy.dialects.postgresql import ARRAY
+
+        vector_type = Vector(query_matrix.shape[1])
+        queries = (
+            func.unnest(cast(literal(list(query_matrix), ARRAY(vector_type)), ARRAY(vector_type)))
+            .table_valued("emb", with_ordinality="ord")
+            .render_derived(name="q")
+        )
+        distance = Text2SQLCache.pg_vector.cosine_distance(queries.c.emb)
+        top_k = (
+            self._apply_search_filters(
+                select(Text2SQLCache.id, (1 - distance).label("similarity")), **filters
+            )
+            .filter(distance <= 1 - similarity_threshold)
+            .order_by(distance)
+            .limit(per_query_limit)
+            .lateral("top_k")
+        )
+        stmt = (
+            select(queries.c.ord, top_k.c.id, top_k.c.similarity)
+            .select_from(queries.join(top_k, true()))
+            .order_by(queries.c.ord, top_k.c.similarity.desc())
+        )
+
+        hits = [[] for _ in range(len(query_matrix))]
+        for ordinality, entry_id, similarity in self.session.execute(stmt):
+            hits[ordinality - 1].append((entry_id, float(similarity)))
+        return hits
+
+    @staticmethod
+    def _apply_search_filters(
+        query,
+        template_type: Optional[str] = None,
+        catalog_type: Optional[str] = None,
+        catalog_subtype: Optional[str] = None,
+        catalog_name: Optional[str] = None,
+        status: Optional[str] = None,
+        exclude_ids: Optional[List[int]] = None,
+    ):
+        """Apply the optional search filters shared by the search methods to a query."""
+        if exclude_ids:
+            query = query.filter(Text2SQLCache.id.notin_(exclude_ids))
+        if status:
+            query = query.filter(Text2SQLCache.status == status)
+        if template_type:
+            query = query.filter(Text2SQLCache.template_type == template_type)
+        if catalog_type:
+            query = query.filter(Text2SQLCache.catalog_type == catalog_type)
+        if catalog_subtype:
+            query = query.filter(Text2SQLCache.catalog_subtype == catalog_subtype)
+        if catalog_name:
+            query = query.filter(Text2SQLCache.catalog_name == catalog_name)
+        return query
 
     def get_query_by_id(self, query_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -389,16 +1372,11 @@ class Text2SQLController:
             SQLAlchemyError: If a database error occurs (session rolled back).
         """
         try:
-            query = (
-                self.session.query(Text2SQLCache)
-                .filter(Text2SQLCache.id == query_id)
-                .first()
-            )
+            query = self.session.get(Text2SQLCache, query_id)
 
             if query:
                 result = query.to_dict()
-                # Increment usage count
-                query.usage_count = (query.usage_count or 0) + 1
+                self._increment_usage_count(query_id)
                 self.session.commit()
                 return result
             else:
@@ -411,6 +1389,101 @@ class Text2SQLController:
             self.session.rollback()
             raise
 
+    def _increment_usage_count(self, entry_id: int) -> None:
+        """Record a use of an entry, buffering the usage_count increment.
+
+        Increments are accumulated in memory and written by `_flush_usage_deltas`
+        once NLC_USAGE_FLUSH_INTERVAL seconds have passed or NLC_USAGE_FLUSH_SIZE
+        entries are pending, so cache hits do not each cost an UPDATE. Any write
+        happens in the current transaction; callers commit.
+
+        Args:
+            entry_id: ID of the cache entry that was used.
+        """
+        self._add_usage_deltas({entry_id: 1})
+
+    def _add_usage_deltas(self, deltas: Dict[int, int]) -> None:
+        """Buffer several usage_count increments at once (see `_increment_usage_count`).
+
+        Args:
+            deltas: Number of uses to add, by cache entry id.
+        """
+        with self._usage_lock:
+            for entry_id, delta in deltas.items():
+                self._usage_deltas[entry_id] += delta
+            due = (
+                self._usage_flush_interval <= 0
+                or len(self._usage_deltas) >= self._usage_flush_size
+                or time.monotonic() - self._usage_last_flush >= self._usage_flush_interval
+            )
+        if due:
+            self._flush_usage_deltas()
+
+    def _flush_usage_deltas(self, session: Optional[Session] = None) -> int:
+        """Write the buffered usage_count increments with a single UPDATE.
+
+        The increments are evaluated by the database (usage_count + CASE id ...),
+        so concurrent writers cannot overwrite each other's counts.
+
+        Args:
+            session: Session to write with. Defaults to the controller's session.
+
+        Returns:
+            Number of entries updated.
+        """
+        session = session if session is not None else self.session
+        with self._usage_lock:
+            deltas, self._usage_deltas = self._usage_deltas, defaultdict(int)
+            self._usage_last_flush = time.monotonic()
+        if not deltas:
+            return 0
+        try:
+            session.execute(
+                update(Text2SQLCache)
+                .where(Text2SQLCache.id.in_(list(deltas)))
+                .values(
+                    usage_count=func.coalesce(Text2SQLCache.usage_count, 0)
+                    + case(deltas, value=Text2SQLCache.id, else_=0)
+                )
+                .execution_options(synchronize_session=False)
+            )
+        except Exception:
+            # Keep the increments for the next flush
+            with self._usage_lock:
+                for entry_id, delta in deltas.items():
+                    self._usage_deltas[entry_id] += delta
+            raise
+        return len(deltas)
+
+    def flush_usage(self, session: Optional[Session] = None) -> int:
+        """Write and commit all buffered usage_count increments.
+
+        Increments are otherwise only written by a later use once the flush
+        interval has passed, so an idle process holds them until this is
+        called. Call it periodically and on shutdown so they are not lost.
+
+        Args:
+            session: Session to write and commit with, e.g. a short-lived one
+                from a background task. Defaults to the controller's session,
+                which is left bound either way.
+
+        Returns:
+            Number of entries updated.
+
+        Raises:
+            SQLAlchemyError: If a database error occurs.
+        """
+        session = session if session is not None else self.session
+        try:
+            flushed = self._flush_usage_deltas(session)
+            if flushed:
+                session.commit()
+            return flushed
+        except SQLAlchemyError as e:
+            logger.error(f"Database error flushing usage counts: {str(e)}", exc_info=True)
+            session.rollback()
+            raise
+
     def update_query(
         self, query_id: int, updates: Dict[str, Any], change_reason: Optional[str] = None, changed_by: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
@@ -430,7 +1503,7 @@ class Text2SQLController:
             SQLAlchemyError: If a database error occurs.
         """
         try:
-            cache_entry = self.session.query(Text2SQLCache).filter(Text2SQLCache.id == query_id).first()
+            cache_entry = self.session.get(Text2SQLCache, query_id)
             if not cache_entry:
                 logger.warning(f"Cache entry {query_id} not found for update")
                 return None
@@ -439,12 +1512,14 @@ class Text2SQLController:
             changes = []
 
             # Handle embedding update if nl_query is updated
+            embedding_array = None
             if "nl_query" in updates:
                 new_nl_query = updates["nl_query"]
                 if new_nl_query and new_nl_query != cache_entry.nl_query:
-                    embedding_array = self._get_embedding(new_nl_query)
+                    # Whitespace- and case-only edits keep the stored embedding
+                    if normalize_nl_query(new_nl_query) != normalize_nl_query(cache_entry.nl_query):
+                        embedding_array = self._get_embedding(new_nl_query)
                     if embedding_array is not None:
-                        old_embedding = cache_entry.embedding
                         cache_entry.embedding = embedding_array
                         # Don't add embedding changes to the audit log as they're too large and cause serialization issues
                     changes.append(("nl_query", cache_entry.nl_query, new_nl_query))
@@ -457,35 +1532,34 @@ class Text2SQLController:
                         setattr(cache_entry, field, new_value)
                         changes.append((field, old_value, new_value))
 
-            # Update the updated_at timestamp
-            cache_entry.updated_at = datetime.datetime.utcnow()
+            # Log changes to audit log if there are any
+            audit_logs = []
+            for field, old_val, new_val in changes:
+                # Skip embedding field to prevent serialization issues
+                if field == "embedding":
+                    continue
 
-            # Commit the changes
+                # Convert numpy arrays to lists if encountered
+                if isinstance(old_val, np.ndarray):
+                    old_val = "numpy_array_data"  # Just store a placeholder instead of actual data
+                if isinstance(new_val, np.ndarray):
+                    new_val = "numpy_array_data"  # Just store a placeholder instead of actual data
+
+                audit_logs.append({
+                    "cache_entry_id": cache_entry.id,
+                    "changed_field": field,
+                    "old_value": old_val,
+                    "new_value": new_val,
+                    "change_reason": change_reason,
+                    "changed_by": changed_by,
+                })
+            self._insert_audit_logs(audit_logs)
+
+            # Commit the changes and their audit log together; updated_at is
+            # stamped by the column's onupdate when a column actually changed
             self.session.commit()
-
-            # Log changes to audit log if there are any
-            if changes:
-                for field, old_val, new_val in changes:
-                    # Skip embedding field to prevent serialization issues
-                    if field == "embedding":
-                        continue
-                        
-                    # Convert numpy arrays to lists if encountered
-                    if isinstance(old_val, np.ndarray):
-                        old_val = "numpy_array_data"  # Just store a placeholder instead of actual data
-                    if isinstance(new_val, np.ndarray):
-                        new_val = "numpy_array_data"  # Just store a placeholder instead of actual data
-                        
-                    audit_log = CacheAuditLog(
-                        cache_entry_id=cache_entry.id,
-                        changed_field=field,
-                        old_value=old_val,
-                        new_value=new_val,
-                        change_reason=change_reason,
-                        changed_by=changed_by
-                    )
-                    self.session.add(audit_log)
-                self.session.commit()
+            if embedding_array is not None:
+                self._cache_embeddings([(cache_entry.id, embedding_array)])
 
             logger.info(f"Updated cache entry with ID {query_id}")
             return cache_entry.to_dict()
@@ -514,18 +1588,16 @@ class Text2SQLController:
             SQLAlchemyError: If a database error occurs (session rolled back).
         """
         try:
-            query = (
-                self.session.query(Text2SQLCache)
-                .filter(Text2SQLCache.id == query_id)
-                .first()
-            )
+            query = self.session.get(Text2SQLCache, query_id)
 
             if not query:
                 return False
 
             query.is_valid = False
             query.invalidation_reason = reason
-            query.updated_at = int(datetime.datetime.utcnow().timestamp())
+            # is_valid and invalidation_reason are not mapped columns; status is
+            # what persists the invalidation (updated_at follows via onupdate)
+            query.status = Status.ARCHIVE
 
             self.session.commit()
             logger.info(f"Invalidated cache entry with ID {query_id}")
@@ -552,17 +1624,14 @@ class Text2SQLController:
             SQLAlchemyError: If a database error occurs (session rolled back).
         """
         try:
-            query = (
-                self.session.query(Text2SQLCache)
-                .filter(Text2SQLCache.id == query_id)
-                .first()
-            )
+            query = self.session.get(Text2SQLCache, query_id)
 
             if not query:
                 return False
 
             self.session.delete(query)
             self.session.commit()
+            self._drop_cached_embedding(query_id)
             logger.info(f"Deleted cache entry with ID {query_id}")
             return True
 
@@ -643,11 +1712,6 @@ class Text2SQLController:
                     Text2SQLCache.template_type == template_type
                 )
 
-            # Fetch all potential candidates first
-            candidate_entries = base_query.all()
-
-            results = []
-            
             # Parse the search tags into name-value pairs
             parsed_search_tags = []
             for tag in tags:
@@ -658,32 +1722,30 @@ class Text2SQLController:
                     # If no colon, search for this as a key name
                     parsed_search_tags.append((tag, None))
 
+            # Let the database evaluate the tag match where it can, so only
+            # matching rows are transferred and hydrated
+            tag_filter = self._tag_filter(parsed_search_tags, match_all)
+            if tag_filter is not None:
+                return [entry.to_dict() for entry in base_query.filter(tag_filter).all()]
+
+            # Fetch all potential candidates first
+            candidate_entries = base_query.all()
+
+            results = []
+            search_tags_set = frozenset(parsed_search_tags)
+
             for entry in candidate_entries:
-                entry_tags = entry.tags or {}  # entry.tags should be a dict
-                
-                if not isinstance(entry_tags, dict):
+                if entry.tags is not None and not isinstance(entry.tags, dict):
                     logger.warning(
                         f"Tags field for entry ID {entry.id} is not a dict: {type(entry.tags)}. Skipping tag match."
                     )
                     continue
-                
-                # Check if the entry matches the required tags
-                matches = []
-                
-                for tag_name, tag_value in parsed_search_tags:
-                    if tag_value is None:
-                        # Just look for the tag name as a key
-                        tag_match = tag_name in entry_tags
-                    else:
-                        # Look for the value in the list for this tag name
-                        tag_match = tag_name in entry_tags and tag_value in entry_tags.get(tag_name, [])
-                    
-                    matches.append(tag_match)
-                
+
                 # Determine if this entry should be included based on match_all
-                if match_all and all(matches):
+                entry_tags_set = entry.tags_set
+                if match_all and search_tags_set.issubset(entry_tags_set):
                     results.append(entry.to_dict())
-                elif not match_all and any(matches):
+                elif not match_all and not search_tags_set.isdisjoint(entry_tags_set):
                     results.append(entry.to_dict())
 
             return results
@@ -692,6 +1754,57 @@ class Text2SQLController:
             logger.error(f"Failed to get queries by tags: {str(e)}", exc_info=True)
             raise
 
+    def _tag_filter(self, parsed_search_tags: List[tuple], match_all: bool):
+        """
+        Build a SQL expression matching entries by tags, for dialects that support it.
+
+        PostgreSQL uses JSONB containment / key-existence operators (served by the
+        GIN index on tags); SQLite uses json_each / json_type.
+
+        Args:
+            parsed_search_tags: (tag_name, tag_value) pairs; tag_value is None to
+                match on the tag name alone.
+            match_all: If True, all tags must match; if False, any tag may match.
+
+        Returns:
+            A SQLAlchemy boolean expression, or None if the dialect is not supported
+            and tags must be matched in Python.
+        """
+        try:
+            dialect = self.session.get_bind().dialect.name
+        except Exception:
+            return None
+
+        conditions = []
+        if dialect == "postgresql":
+            tags_col = cast(Text2SQLCache.tags, JSONB)
+            # Name-only tags collapse into one ?& / ?| operator
+            names = [tag_name for tag_name, tag_value in parsed_search_tags if tag_value is None]
+            if names:
+                names_array = postgresql_array(names, type_=String)
+                conditions.append(tags_col.has_all(names_array) if match_all else tags_col.has_any(names_array))
+            for tag_name, tag_value in parsed_search_tags:
+                if tag_value is not None:
+                    # Tag values are stored as lists or, for single values, plain strings
+                    conditions.append(or_(
+                        tags_col.contains({tag_name: [tag_value]}),
+                        tags_col.contains({tag_name: tag_value}),
+                    ))
+        elif dialect == "sqlite":
+            for tag_name, tag_value in parsed_search_tags:
+                path = '$."{}"'.format(tag_name.replace('"', '""'))
+                if tag_value is None:
+                    conditions.append(func.json_type(Text2SQLCache.tags, path).isnot(None))
+                else:
+                    values = func.json_each(Text2SQLCache.tags, path).table_valued("value")
+                    conditions.append(
+                        select(literal(1)).select_from(values).where(values.c.value == tag_value).exists()
+                    )
+        else:
+            return None
+
+        return and_(*conditions) if match_all else or_(*conditions)
+
     # apply_entity_substitution might be better placed in the entity_substitution module
     # or called from there, passing the controller or session if needed for DB updates.
     # Keeping it here based on original structure for now.
@@ -717,11 +1830,9 @@ class Text2SQLController:
             Exception: If entity substitution processing fails.
         """
         try:
-            cache_entry = (
-                self.session.query(Text2SQLCache)
-                .filter(Text2SQLCache.id == template_id, Text2SQLCache.status == Status.ACTIVE)
-                .first()
-            )
+            cache_entry = self.session.get(Text2SQLCache, template_id)
+            if cache_entry is not None and cache_entry.status != Status.ACTIVE:
+                cache_entry = None
 
             if not cache_entry:
                 raise ValueError(
@@ -748,8 +1859,7 @@ class Text2SQLController:
                 )
             )
 
-            # Increment usage count
-            cache_entry.usage_count = (cache_entry.usage_count or 0) + 1
+            self._increment_usage_count(template_id)
             self.session.commit()
 
             result = {
@@ -771,11 +1881,40 @@ class Text2SQLController:
             self.session.rollback()
             raise
 
-    def delete_all_cache_entries(self) -> bool:
-        """Deletes all entries from the cache table."""
+    def delete_all_cache_entries(self, include_usage_logs: bool = False) -> bool:
+        """Deletes all entries from the cache table.
+
+        Args:
+            include_usage_logs: Also discard the usage log. On PostgreSQL this lets
+                the reset run as a single TRUNCATE ... RESTART IDENTITY instead of
+                a logged row-by-row DELETE; PostgreSQL cannot truncate the cache
+                table while usage_log rows reference it.
+        """
         try:
-            self.session.query(Text2SQLCache).delete()
+            dialect = self.session.get_bind().dialect
+            if include_usage_logs and dialect.name == "postgresql":
+                from sqlalchemy import text
+
+                tables = ", ".join(
+                    dialect.identifier_preparer.format_table(table)
+                    for table in (Text2SQLCache.__table__, CacheAuditLog.__table__, UsageLog.__table__)
+                )
+                self.session.execute(text(f"TRUNCATE TABLE {tables} RESTART IDENTITY"))
+            else:
+                if include_usage_logs:
+                    self.session.execute(delete(UsageLog.__table__))
+                # Core DELETE: no ORM session synchronisation over loaded entries
+                self.session.execute(delete(Text2SQLCache.__table__))
             self.session.commit()
+            with self._emb_lock:
+                self._emb_matrix = None
+                self._ann_index = None
+                # Discard any index build still running over the old rows
+                self._emb_generation += 1
+                self._ann_building = False
+            # Ids may be reused after RESTART IDENTITY; drop increments for the old rows
+            with self._usage_lock:
+                self._usage_deltas = defaultdict(int)
             logger.info("Deleted all cache entries")
             return True
         except Exception as e:
@@ -784,59 +1923,133 @@ class Text2SQLController:
             raise
 
     def batch_insert(self, entries: List[Dict[str, Any]]) -> List[Text2SQLCache]:
-        """Batch insert multiple cache entries."""
+        """Batch insert multiple cache entries.
+
+        Entries without an embedding are embedded with one batched model call.
+        Rows are written with a single Core executemany INSERT, bypassing the
+        ORM unit of work (psycopg2 sends it as multi-row VALUES pages).
+
+        Returns:
+            The entries as detached Text2SQLCache objects. Their ids are filled in
+            when the dialect can return them from an executemany INSERT.
+        """
         if not entries:
             return []
         new_entries = [Text2SQLCache(**entry) for entry in entries]
-        self.session.add_all(new_entries)
-        self.session.commit()
+        for e in new_entries:
+            # Embeddings passed as a JSON list are stored as a normalised blob
+            if e.embedding_blob is None and e.vector_embedding is not None:
+                e.embedding = e.embedding
+        missing = [e for e in new_entries if e.embedding_blob is None and e.nl_query]
+        if missing:
+            # Embed on the pool while a connection is checked out
+            embeddings_future = _get_embedding_pool().submit(
+                self._get_embeddings, [e.nl_query for e in missing]
+            )
+            self.session.connection()
+            for e, embedding_array in zip(missing, embeddings_future.result()):
+                e.embedding = embedding_array
+
+        table = Text2SQLCache.__table__
+        columns = [c for c in table.columns if c.key != "id" and hasattr(Text2SQLCache, c.key)]
+        rows = []
+        for entry in new_entries:
+            row = {}
+            for column in columns:
+                value = getattr(entry, column.key)
+                # Every row binds every column, so Python-side defaults are applied
+                # here and copied onto the returned entry
+                if value is None and column.default is not None:
+                    value = column.default.arg(None) if column.default.is_callable else column.default.arg
+                    setattr(entry, column.key, value)
+                row[column.key] = value
+            rows.append(row)
+
+        try:
+            if getattr(self.session.get_bind().dialect, "insert_executemany_returning", False):
+                result = self.session.execute(insert(table).returning(table.c.id), rows)
+                for entry, entry_id in zip(new_entries, result.scalars().all()):
+                    entry.id = entry_id
+            else:
+                self.session.execute(insert(table), rows)
+            self.session.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"Database error during batch insert: {str(e)}", exc_info=True)
+            self.session.rollback()
+            raise
+
+        # Rows without a returned id are picked up lazily by the next vector search
+        self._cache_embeddings([(e.id, e.embedding) for e in new_entries if e.id is not None])
         return new_entries
 
     def _get_similar_queries_vector_search(
         self,
         nl_query: str,
         limit: int = 5,
+        similarity_threshold: float = 0.8,
     ) -> List[Dict[str, Any]]:
-        embedding = self._get_embedding(nl_query)
-        query_vector = np.array(embedding).astype(np.float32)
-
-        # Perform KNN search
-        # Ensure the index is trained if necessary
-        if not self.vector_index.is_trained:
-            # This check might be redundant if index is added incrementally
-            # Or handle training explicitly if needed before search
-            logger.warning("Vector index is not trained. Search might fail or be slow.")
+        """Unfiltered top-k vector search over all cached entries.
 
-        # Perform search
-        distances, indices = self.vector_index.search(query_vector.reshape(1, -1), k=limit * 2) # Search more initially
+        Uses pgvector when enabled, otherwise the HNSW index when one is
+        attached and the exact matrix scan until then.
 
-        # Filter results by threshold and map indices back to IDs
-        filtered_results = []
-        for distance, index in zip(distances[0], indices[0]):
-            if distance <= self.similarity_threshold:
-                query = self.session.query(Text2SQLCache).get(index)
-                if query:
-                    filtered_results.append(query.to_dict())
+        Args:
+            nl_query: The natural language query to search for.
+            limit: Maximum number of results to return.
+            similarity_threshold: Minimum cosine similarity to keep a match.
 
-        # Log search results for debugging
-        logger.info(f"Vector search results: distances={distances[0].tolist()}, indices={indices[0].tolist()}")
-        logger.info(f"Applying threshold filter: {self.similarity_threshold}")
+        Returns:
+            Matching cache entries with similarity scores, best first.
+        """
+        embedding = self._get_embedding(nl_query)
+        if embedding is None:
+            return []
+        from thinkforge.models import USE_PG_VECTOR
+        if USE_PG_VECTOR:
+            return self._search_pg_vector(embedding, similarity_threshold, limit, {})
+        return self._search_embedding_matrix(embedding, similarity_threshold, limit, {})
 
-        return filtered_results
+    def get_all_queries(
+        self,
+        status: Optional[str] = None,
+        template_type: Optional[str] = None,
+        catalog_type: Optional[str] = None,
+        catalog_subtype: Optional[str] = None,
+        catalog_name: Optional[str] = None,
+        include_embedding: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Get all cache entries, optionally filtered in SQL.
 
-    def get_all_queries(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get all cache entries, optionally filtered by status.
+        Rows are streamed from the cursor in chunks and serialised as they
+        arrive, so only one chunk of ORM objects is alive at a time. Unless
+        requested, the embedding columns are not even selected.
 
         Args:
             status: Optional status to filter by.
+            template_type: Optional template type to filter by.
+            catalog_type: Optional catalog type to filter by.
+            catalog_subtype: Optional catalog subtype to filter by.
+            catalog_name: Optional catalog name to filter by.
+            include_embedding: Include each entry's embedding (see Text2SQLCache.to_dict).
 
         Returns:
             List of cache entry dictionaries.
         """
-        query = self.session.query(Text2SQLCache)
-        if status:
-            query = query.filter(Text2SQLCache.status == status)
-        return [entry.to_dict() for entry in query.all()]
+        query = self._apply_search_filters(
+            self.session.query(Text2SQLCache),
+            template_type=template_type,
+            catalog_type=catalog_type,
+            catalog_subtype=catalog_subtype,
+            catalog_name=catalog_name,
+            status=status,
+        )
+        if not include_embedding:
+            query = query.options(*(
+                defer(getattr(Text2SQLCache, key))
+                for key in ("vector_embedding", "embedding_blob", "pg_vector")
+                if hasattr(Text2SQLCache, key)
+            ))
+        return [entry.to_dict(include_embedding) for entry in query.yield_per(1000)]
 
     def get_cache_count(self) -> int:
         """Get the total number of cache entries.
@@ -910,11 +2123,9 @@ class Text2SQLController:
 
         try:
             # Fetch the workflow cache entry
-            workflow_entry = (
-                self.session.query(Text2SQLCache)
-                .filter(Text2SQLCache.id == workflow_id, Text2SQLCache.status == Status.ACTIVE)
-                .first()
-            )
+            workflow_entry = self.session.get(Text2SQLCache, workflow_id)
+            if workflow_entry is not None and workflow_entry.status != Status.ACTIVE:
+                workflow_entry = None
 
             if not workflow_entry:
                 raise ValueError(f"Workflow with ID {workflow_id} not found or is invalid")
@@ -924,11 +2135,12 @@ class Text2SQLController:
 
             # Parse the JSON template
             try:
-                workflow_data = json.loads(workflow_entry.template)
-                if not isinstance(workflow_data, dict) or 'steps' not in workflow_data:
-                    raise ValueError("Invalid workflow JSON structure: 'steps' key not found")
-            except json.JSONDecodeError as e:
+                workflow_data = orjson.loads(workflow_entry.template)
+            except ValueError as e:
+                # orjson.JSONDecodeError subclasses ValueError
                 raise ValueError(f"Invalid JSON in workflow template: {str(e)}")
+            if not isinstance(workflow_data, dict) or 'steps' not in workflow_data:
+                raise ValueError("Invalid workflow JSON structure: 'steps' key not found")
 
             # Initialize results
             results = {"workflow_id": workflow_id, "steps": []}
@@ -943,20 +2155,45 @@ class Text2SQLController:
             sequential_steps = [step for step in steps if step.get('type') == 'sequential']
             parallel_steps = [step for step in steps if step.get('type') == 'parallel']
 
+            # Load every referenced entry in one round trip instead of one query per step
+            entry_map = self._prefetch_step_entries(
+                [step.get('cache_id') for step in sequential_steps + parallel_steps]
+            )
+
             # Execute sequential steps
             for step in sequential_steps:
-                step_result = self._execute_workflow_step(step, entity_values, step_results)
+                step_result = self._execute_workflow_step(step, entity_values, step_results, entry_map)
                 step_results[step.get('cache_id')] = step_result
                 results['steps'].append(step_result)
 
-            # Execute parallel steps (simplified as sequential for now, could use threading/async in future)
-            for step in parallel_steps:
-                step_result = self._execute_workflow_step(step, entity_values, step_results)
+            # Execute parallel steps concurrently; they read only the prefetched entries
+            if len(parallel_steps) > 1:
+                previous_results = dict(step_results)
+                with ThreadPoolExecutor(
+                    max_workers=min(len(parallel_steps), _WORKFLOW_STEP_THREADS),
+                    thread_name_prefix="nlc-workflow-step",
+                ) as executor:
+                    parallel_results = list(executor.map(
+                        lambda step: self._execute_workflow_step(step, entity_values, previous_results, entry_map),
+                        parallel_steps,
+                    ))
+            else:
+                parallel_results = [
+                    self._execute_workflow_step(step, entity_values, step_results, entry_map)
+                    for step in parallel_steps
+                ]
+            for step, step_result in zip(parallel_steps, parallel_results):
                 step_results[step.get('cache_id')] = step_result
                 results['steps'].append(step_result)
 
-            # Increment usage count for workflow
-            workflow_entry.usage_count = (workflow_entry.usage_count or 0) + 1
+            # Buffer the usage increments of the workflow and its successful steps together;
+            # when a flush is due they are written by one UPDATE and this single commit
+            usage_deltas = defaultdict(int)
+            usage_deltas[workflow_id] += 1
+            for step_result in results['steps']:
+                if step_result.get("status") == "success":
+                    usage_deltas[step_result["cache_id"]] += 1
+            self._add_usage_deltas(usage_deltas)
             self.session.commit()
 
             return results
@@ -969,19 +2206,56 @@ class Text2SQLController:
             logger.error(f"Error executing workflow: {str(e)}", exc_info=True)
             raise ValueError(f"Failed to execute workflow: {str(e)}")
 
+    def _prefetch_step_entries(self, step_ids: List[Any]) -> Dict[int, Text2SQLCache]:
+        """
+        Load the active cache entries referenced by workflow steps with a single IN query.
+
+        Only the columns `_execute_workflow_step` reads are selected, so the
+        embedding columns are never transferred. Steps run in worker threads
+        and must not trigger a lazy load: keep this list in step with what
+        they read.
+
+        Args:
+            step_ids: The steps' cache_id values; non-integer ids are ignored.
+
+        Returns:
+            Mapping of cache id to entry. Missing and inactive entries are absent.
+        """
+        ids = {step_id for step_id in step_ids if isinstance(step_id, int)}
+        if not ids:
+            return {}
+        entries = (
+            self.session.query(Text2SQLCache)
+            .options(load_only(
+                Text2SQLCache.template,
+                Text2SQLCache.template_type,
+                Text2SQLCache.is_template,
+                Text2SQLCache.entity_replacements,
+                Text2SQLCache.updated_at,
+            ))
+            .filter(Text2SQLCache.id.in_(ids), Text2SQLCache.status == Status.ACTIVE)
+            .all()
+        )
+        return {entry.id: entry for entry in entries}
+
     def _execute_workflow_step(
         self, 
         step: Dict[str, Any], 
         entity_values: Optional[Dict[str, Any]], 
-        previous_results: Dict[int, Any]
+        previous_results: Dict[int, Any],
+        entry_map: Dict[int, Text2SQLCache],
     ) -> Dict[str, Any]:
         """
-        Execute a single step in a workflow by fetching the referenced cache entry and processing it.
+        Execute a single step in a workflow by processing its prefetched cache entry.
+
+        The step only reads its entry and touches no session, so parallel steps
+        can run in worker threads.
 
         Args:
             step: Dictionary containing step details (cache_id, type, description).
             entity_values: Optional entity values for substitution.
             previous_results: Results from previous steps for potential data passing.
+            entry_map: Active cache entries by id, from `_prefetch_step_entries`.
 
         Returns:
             Dictionary with the result of the step execution.
@@ -991,37 +2265,43 @@ class Text2SQLController:
             return {"step": step, "status": "error", "message": "Invalid cache_id in step"}
 
         try:
-            # Fetch the cache entry for this step
-            cache_entry = (
-                self.session.query(Text2SQLCache)
-                .filter(Text2SQLCache.id == cache_id, Text2SQLCache.status == Status.ACTIVE)
-                .first()
-            )
-
+            cache_entry = entry_map.get(cache_id)
             if not cache_entry:
                 return {"step": step, "status": "error", "message": f"Cache entry with ID {cache_id} not found or invalid"}
 
-            # Increment usage count for the step's cache entry
-            cache_entry.usage_count = (cache_entry.usage_count or 0) + 1
-
             # Handle entity substitution if needed
             substituted_template = cache_entry.template
             if cache_entry.is_template and entity_values:
                 if cache_entry.entity_replacements:
-                    from .entity_substitution import Text2SQLEntitySubstitution
-                    substituted_template, mapping = Text2SQLEntitySubstitution.extract_and_replace_entities(
-                        nl_query="",
-                        template=cache_entry.template,
-                        entity_replacements=cache_entry.entity_replacements,
-                        new_entity_values=entity_values,
-                        template_type=cache_entry.template_type
-                    )
+                    entity_items = tuple(sorted(entity_values.items()))
+                    try:
+                        hash(entity_items)
+                    except TypeError:
+                        # Unhashable entity values (e.g. lists) skip the memo
+                        entity_items = None
+                    if entity_items is not None:
+                        substituted_template = _cached_substitute(
+                            cache_id,
+                            cache_entry.updated_at.isoformat() if cache_entry.updated_at else None,
+                            cache_entry.template,
+                            entity_items,
+                            cache_entry.entity_replacements_json,
+                            cache_entry.template_type,
+                        )
+                    else:
+                        substituted_template, _ = Text2SQLEntitySubstitution.extract_and_replace_entities(
+                            nl_query="",
+                            template=cache_entry.template,
+                            entity_replacements=cache_entry.entity_replacements,
+                            new_entity_values=entity_values,
+                            template_type=cache_entry.template_type
+                        )
                 else:
                     return {"step": step, "status": "error", "message": "Entity substitution needed but no replacements defined"}
 
             # Simplified execution: return the substituted template as result
             # In a full implementation, this could execute SQL, call APIs, etc.
-            result = {
+            return {
                 "step": step,
                 "status": "success",
                 "cache_id": cache_id,
@@ -1029,11 +2309,6 @@ class Text2SQLController:
                 "result": substituted_template
             }
 
-            # Commit usage count update
-            self.session.commit()
-
-            return result
-
         except Exception as e:
             logger.error(f"Error executing step for cache_id {cache_id}: {str(e)}", exc_info=True)
             return {"step": step, "status": "error", "message": str(e)}
@@ -1055,30 +2330,36 @@ class Text2SQLController:
             SQLAlchemyError: If a database error occurs (session rolled back).
         """
         try:
-            query = (
-                self.session.query(Text2SQLCache)
-                .filter(Text2SQLCache.id == query_id)
-                .first()
-            )
-
-            if not query:
+            # Check the status alone first: idempotent retries return without
+            # writing or flushing unrelated pending changes
+            with self.session.no_autoflush:
+                old_status = (
+                    self.session.query(Text2SQLCache.status)
+                    .filter(Text2SQLCache.id == query_id)
+                    .scalar()
+                )
+            if old_status is None:
                 return False
 
-            old_status = query.status
             if old_status != new_status:
-                query.status = new_status
-                query.updated_at = datetime.datetime.utcnow()
+                # Core UPDATE: the row is never loaded, and updated_at is set
+                # through the column's onupdate
+                self.session.execute(
+                    update(Text2SQLCache)
+                    .where(Text2SQLCache.id == query_id)
+                    .values(status=new_status)
+                    .execution_options(synchronize_session=False)
+                )
 
                 # Log the status change in audit log
-                audit_log = CacheAuditLog(
-                    cache_entry_id=query_id,
-                    changed_field="status",
-                    old_value=old_status,
-                    new_value=new_status,
-                    change_reason=reason,
-                    changed_by=changed_by
-                )
-                self.session.add(audit_log)
+                self._insert_audit_logs([{
+                    "cache_entry_id": query_id,
+                    "changed_field": "status",
+                    "old_value": old_status,
+                    "new_value": new_status,
+                    "change_reason": reason,
+                    "changed_by": changed_by,
+                }])
 
                 self.session.commit()
                 logger.info(f"Changed status of cache entry with ID {query_id} to {new_status}")
@@ -1091,6 +2372,78 @@ class Text2SQLController:
             self.session.rollback()
             raise
 
+    def change_status_bulk(
+        self,
+        updates: List[Tuple[int, str, Optional[str], Optional[str]]],
+        batch_size: int = 1000,
+    ) -> Dict[int, bool]:
+        """
+        Change the status of many cache entries with one commit.
+
+        Each batch costs one SELECT ... IN for the current statuses, one UPDATE
+        setting every status through a CASE on id, and one INSERT for the audit
+        rows, instead of a lookup, update, audit insert and commit per entry.
+
+        Args:
+            updates: (query_id, new_status, reason, changed_by) tuples. If an ID
+                appears more than once, the last tuple wins.
+            batch_size: Maximum number of entries per statement batch.
+
+        Returns:
+            Mapping of each requested ID to True if the entry exists, else False.
+
+        Raises:
+            SQLAlchemyError: If a database error occurs (session rolled back).
+        """
+        by_id = {query_id: (new_status, reason, changed_by) for query_id, new_status, reason, changed_by in updates}
+        found: Dict[int, bool] = dict.fromkeys(by_id, False)
+        ids = list(by_id)
+        changed = 0
+        try:
+            for start in range(0, len(ids), batch_size):
+                chunk = ids[start:start + batch_size]
+                current = dict(
+                    self.session.query(Text2SQLCache.id, Text2SQLCache.status)
+                    .filter(Text2SQLCache.id.in_(chunk))
+                    .all()
+                )
+                new_statuses = {}
+                audit_rows = []
+                for query_id, old_status in current.items():
+                    found[query_id] = True
+                    new_status, reason, changed_by = by_id[query_id]
+                    if old_status == new_status:
+                        continue
+                    new_statuses[query_id] = new_status
+                    audit_rows.append({
+                        "cache_entry_id": query_id,
+                        "changed_field": "status",
+                        "old_value": old_status,
+                        "new_value": new_status,
+                        "change_reason": reason,
+                        "changed_by": changed_by,
+                    })
+                if not new_statuses:
+                    continue
+                self.session.execute(
+                    update(Text2SQLCache)
+                    .where(Text2SQLCache.id.in_(list(new_statuses)))
+                    .values(status=case(new_statuses, value=Text2SQLCache.id))
+                    .execution_options(synchronize_session=False)
+                )
+                self._insert_audit_logs(audit_rows)
+                changed += len(new_statuses)
+
+            if changed:
+                self.session.commit()
+                logger.info(f"Changed status of {changed} cache entries")
+            return found
+
+        except Exception as e:
+            logger.error(f"Failed to change status of {len(ids)} queries: {str(e)}", exc_info=True)
+            self.session.rollback()
+            raise
+
     def process_completion(
         self,
         query: str,
@@ -1303,7 +2656,6 @@ class Text2SQLController:
                 cache_entry_id=template_id,
                 prompt=query,
                 response=updated_query if updated_query else final_result,
-                timestamp=datetime.datetime.utcnow(),
                 success_status=cache_hit,
                 similarity_score=similarity_score if cache_hit else 0.0,
                 error_message=None,
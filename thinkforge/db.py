@@ -0,0 +1,105 @@
+"""
+Shared database engine and session factory.
+
+A single SQLAlchemy engine (and therefore a single connection pool) is created
+lazily on first use and reused by every caller in the process, so sessions
+borrow persistent connections instead of opening a new one per request.
+The engine is disposed at interpreter exit.
+
+Pool sizing is controlled through environment variables:
+    NLC_POOL_MAX: Number of persistent pooled connections
+        (default: 2 x CPU count, at least 5).
+    NLC_POOL_OVERFLOW: Extra connections opened under bursts (default: 10).
+    NLC_POOL_TIMEOUT: Seconds to wait for a free connection (default: 30).
+"""
+
+import atexit
+import logging
+import os
+import threading
+import urllib.parse
+from typing import Optional
+
+import orjson
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_lock = threading.Lock()
+
+
+def _orjson_dumps(value) -> str:
+    """Serialize a JSON column value with orjson, accepting NumPy arrays and scalars."""
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def get_database_url() -> str:
+    """Return the database URL from DATABASE_URL or the POSTGRES_* variables."""
+    if os.environ.get("DATABASE_URL"):
+        return os.environ["DATABASE_URL"]
+    user = os.environ.get("POSTGRES_USER", "user")
+    password = urllib.parse.quote_plus(os.environ.get("POSTGRES_PASSWORD", "password"))
+    host = os.environ.get("POSTGRES_HOST", "localhost")
+    port = os.environ.get("POSTGRES_PORT", "5432")
+    name = os.environ.get("POSTGRES_DB", "mcp_cache_db")
+    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}"
+
+
+def get_engine(database_url: Optional[str] = None) -> Engine:
+    """Return the process-wide engine, creating it on first call.
+
+    Args:
+        database_url: URL to connect to when the engine is first created.
+            Defaults to `get_database_url()`. Ignored once the engine exists.
+
+    Returns:
+        The shared SQLAlchemy Engine.
+    """
+    global _engine, _session_factory
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                url = make_url(database_url or get_database_url())
+                engine_kwargs = {}
+                # SQLite uses its own single-connection pools, which take no sizing
+                if url.get_backend_name() != "sqlite":
+                    engine_kwargs = {
+                        # Never below SQLAlchemy's own 5 + 10 on small hosts
+                        "pool_size": int(os.environ.get("NLC_POOL_MAX", max((os.cpu_count() or 1) * 2, 5))),
+                        "max_overflow": int(os.environ.get("NLC_POOL_OVERFLOW", "10")),
+                        "pool_timeout": float(os.environ.get("NLC_POOL_TIMEOUT", "30")),
+                        "pool_pre_ping": True,
+                    }
+                # JSON/JSONB columns (embeddings, tags, entity_replacements) encode and decode with orjson
+                engine_kwargs["json_serializer"] = _orjson_dumps
+                engine_kwargs["json_deserializer"] = orjson.loads
+                _engine = create_engine(url, **engine_kwargs)
+                _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+                logger.info(f"Created shared database engine for {url.get_backend_name()}")
+    return _engine
+
+
+def get_session() -> Session:
+    """Return a new Session bound to the shared engine. The caller must close it."""
+    get_engine()
+    return _session_factory()
+
+
+def dispose_engine() -> None:
+    """Close all pooled connections and forget the shared engine."""
+    global _engine, _session_factory
+    with _lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+            _session_factory = None
+
+
+atexit.register(dispose_engine)
@@ -6,11 +6,15 @@ Uses regex for placeholder detection (e.g., :entity_name).
 """
 
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Callable, Dict, Any, Optional, List, Tuple
+import functools
+import os
 import re
 import urllib.parse
 import datetime
 import json
+import copy
+import orjson
 from .models import TemplateType # Import TemplateType
 
 logger = logging.getLogger(__name__)
@@ -19,6 +23,175 @@ logger = logging.getLogger(__name__)
 PLACEHOLDER_REGEX = re.compile(r":([a-zA-Z_][a-zA-Z0-9_]*)")
 
 
+def _format_value(entity_type: str, value: Any, placeholder: str) -> str:
+    """Format an entity value for a generic template (see apply_substitution)."""
+    if entity_type == "integer":
+        return str(int(value))
+    elif entity_type == "number" or entity_type == "float":
+        return str(float(value))
+    elif entity_type == "boolean":
+        return str(bool(value))
+    elif entity_type == "date":
+        # Basic date formatting, assumes YYYY-MM-DD or datetime object
+        if isinstance(value, datetime.date):
+            return value.strftime("%Y-%m-%d")
+        # Attempt to parse if string
+        datetime.datetime.strptime(str(value), "%Y-%m-%d")
+        return str(value)
+    elif entity_type == "string":
+        # Basic sanitization for strings (e.g., escape quotes for SQL)
+        # This is highly context-dependent (SQL vs URL vs JSON)
+        # For now, just convert to string.
+        return str(value)
+        # Example SQL sanitization (use proper library like SQLAlchemy normally):
+        # formatted_value = str(value).replace("'", "''")
+    logger.warning(f"Unsupported entity type '{entity_type}' for '{placeholder}'. Treating as string.")
+    return str(value)
+
+
+def _format_sql_value(entity_type: str, value: Any, placeholder: str) -> str:
+    """Format an entity value for a SQL template (see apply_sql_substitution)."""
+    if entity_type == "string":
+        # Basic SQL string quoting (INSECURE!)
+        escaped_value = str(value).replace("'", "''")
+        return "'" + escaped_value + "'"
+    elif entity_type == "integer":
+        return str(int(value))
+    elif entity_type == "number" or entity_type == "float":
+        return str(float(value))
+    elif entity_type == "boolean":
+        # Adjust based on SQL dialect (e.g., TRUE/FALSE, 1/0)
+        return "TRUE" if bool(value) else "FALSE"
+    elif entity_type == "date":
+        if isinstance(value, datetime.date):
+            return "'" + value.strftime('%Y-%m-%d') + "'"
+        # Ensure value is a string before strptime
+        date_str = str(value)
+        datetime.datetime.strptime(date_str, "%Y-%m-%d")
+        return "'" + date_str + "'"
+    escaped_value = str(value).replace("'", "''")
+    return "'" + escaped_value + "'"
+
+
+def _format_url_value(entity_type: str, value: Any, placeholder: str) -> str:
+    """Format an entity value for a URL template (see apply_url_substitution)."""
+    # URL encode the value before substituting
+    return urllib.parse.quote_plus(str(value))
+
+
+def _format_api_value(entity_type: str, value: Any, placeholder: str) -> str:
+    """Format an entity value for an API template (see apply_api_substitution)."""
+    # For API templates, we might need JSON-aware substitution
+    if entity_type == "string":
+        # JSON string encoding for API payloads
+        return json.dumps(str(value))
+    elif entity_type in ["integer", "number", "float"]:
+        return str(value)
+    elif entity_type == "boolean":
+        return "true" if bool(value) else "false"
+    elif entity_type == "array":
+        if isinstance(value, list):
+            return json.dumps(value)
+        return json.dumps([value])
+    elif entity_type == "object":
+        if isinstance(value, dict):
+            return json.dumps(value)
+        return json.dumps({"value": value})
+    return json.dumps(str(value))
+
+
+@functools.lru_cache(maxsize=int(os.environ.get("NLC_COMPILED_TEMPLATE_CACHE_SIZE", "1024")))
+def compile_substitution(
+    template: str, replacements_json: str, template_type: str
+) -> Optional[Callable[[Dict[str, Any]], Optional[str]]]:
+    """Compile a template into a function that substitutes entity values in one join.
+
+    The apply_*_substitution methods scan the whole template once per
+    placeholder on every call. Here the template is split on its placeholders
+    once, in the same order those methods replace them, and the returned
+    function only formats the values and joins the pieces.
+
+    The function returns None when the result could differ from the sequential
+    replacement (a value is missing, fails to format, or contains placeholder
+    text a later replacement would rewrite); callers then use
+    extract_and_replace_entities. Templates are cached by content, so an edited
+    entry compiles afresh.
+
+    Args:
+        template: The template string with placeholders.
+        replacements_json: The entity_replacements as JSON, keys in replacement order.
+        template_type: The template type; DSL templates are not compiled.
+
+    Returns:
+        The compiled substitution function, or None if the template cannot be compiled.
+    """
+    if not template:
+        return None
+    if template_type == TemplateType.SQL:
+        formatter = _format_sql_value
+    elif template_type == TemplateType.URL:
+        formatter = _format_url_value
+    elif template_type == TemplateType.API:
+        formatter = _format_api_value
+    elif template_type == TemplateType.DSL:
+        return None
+    else:
+        formatter = _format_value
+
+    entity_replacements = json.loads(replacements_json)
+    if not entity_replacements:
+        return None
+    slots = [
+        (entity_key, info.get("type", "string"), info["placeholder"])
+        for entity_key, info in entity_replacements.items()
+        if info.get("placeholder")
+    ]
+    placeholders = [placeholder for _, _, placeholder in slots]
+
+    # Pieces are literal strings or slot indexes, split in replacement order
+    pieces: List[Any] = [template]
+    for index, placeholder in enumerate(placeholders):
+        split_pieces: List[Any] = []
+        for piece in pieces:
+            if not isinstance(piece, str):
+                split_pieces.append(piece)
+                continue
+            parts = piece.split(placeholder)
+            split_pieces.append(parts[0])
+            for part in parts[1:]:
+                split_pieces.extend((index, part))
+        pieces = split_pieces
+
+    # A literal ending in the start of a placeholder could combine with the
+    # value after it into a match the sequential replacement would rewrite
+    prefixes = {p[:i] for p in placeholders for i in range(1, len(p))}
+    for piece, following in zip(pieces, pieces[1:]):
+        if isinstance(piece, str) and not isinstance(following, str):
+            if any(piece.endswith(prefix) for prefix in prefixes):
+                return None
+    first_chars = {p[0] for p in placeholders}
+    slot_positions = [i for i, piece in enumerate(pieces) if not isinstance(piece, str)]
+
+    def substitute(entities: Dict[str, Any]) -> Optional[str]:
+        formatted = []
+        for entity_key, entity_type, placeholder in slots:
+            if entity_key not in entities:
+                return None
+            try:
+                value = formatter(entity_type, entities[entity_key], placeholder)
+            except (ValueError, TypeError):
+                return None
+            if any(char in value for char in first_chars):
+                return None
+            formatted.append(value)
+        out = list(pieces)
+        for position in slot_positions:
+            out[position] = formatted[pieces[position]]
+        return "".join(out)
+
+    return substitute
+
+
 class Text2SQLEntitySubstitution:
     """Provides methods for extracting and substituting entities in templates."""
 
@@ -125,30 +298,7 @@ class Text2SQLEntitySubstitution:
 
             # Basic type checking and formatting (can be expanded)
             try:
-                if entity_type == "integer":
-                    formatted_value = str(int(value))
-                elif entity_type == "number" or entity_type == "float":
-                    formatted_value = str(float(value))
-                elif entity_type == "boolean":
-                    formatted_value = str(bool(value))
-                elif entity_type == "date":
-                    # Basic date formatting, assumes YYYY-MM-DD or datetime object
-                    if isinstance(value, datetime.date):
-                        formatted_value = value.strftime("%Y-%m-%d")
-                    else:
-                        # Attempt to parse if string
-                        datetime.datetime.strptime(str(value), "%Y-%m-%d")
-                        formatted_value = str(value)
-                elif entity_type == "string":
-                    # Basic sanitization for strings (e.g., escape quotes for SQL)
-                    # This is highly context-dependent (SQL vs URL vs JSON)
-                    # For now, just convert to string.
-                    formatted_value = str(value)
-                    # Example SQL sanitization (use proper library like SQLAlchemy normally):
-                    # formatted_value = str(value).replace("'", "''")
-                else:
-                    logger.warning(f"Unsupported entity type '{entity_type}' for '{placeholder}'. Treating as string.")
-                    formatted_value = str(value)
+                formatted_value = _format_value(entity_type, value, placeholder)
             except (ValueError, TypeError) as e:
                 raise ValueError(
                     f"Failed to format entity '{entity_key}' with value '{value}' as type '{entity_type}' for placeholder '{placeholder}': {e}"
@@ -187,29 +337,7 @@ class Text2SQLEntitySubstitution:
             value = entities[entity_key]
 
             try:
-                if entity_type == "string":
-                    # Basic SQL string quoting (INSECURE!)
-                    escaped_value = str(value).replace("'", "''")
-                    formatted_value = "'" + escaped_value + "'"
-                elif entity_type == "integer":
-                    formatted_value = str(int(value))
-                elif entity_type == "number" or entity_type == "float":
-                    formatted_value = str(float(value))
-                elif entity_type == "boolean":
-                    # Adjust based on SQL dialect (e.g., TRUE/FALSE, 1/0)
-                    formatted_value = "TRUE" if bool(value) else "FALSE"
-                elif entity_type == "date":
-                    if isinstance(value, datetime.date):
-                        formatted_value = "'" + value.strftime('%Y-%m-%d') + "'"
-                    else:
-                        # Ensure value is a string before strptime
-                        date_str = str(value)
-                        datetime.datetime.strptime(date_str, "%Y-%m-%d")
-                        formatted_value = "'" + date_str + "'"
-                else:
-                    escaped_value = str(value).replace("'", "''")
-                    formatted_value = "'" + escaped_value + "'"
-
+                formatted_value = _format_sql_value(entity_type, value, placeholder)
                 substituted_template = substituted_template.replace(
                     placeholder, formatted_value
                 )
@@ -239,8 +367,7 @@ class Text2SQLEntitySubstitution:
             value = entities[entity_key]
 
             try:
-                # URL encode the value before substituting
-                formatted_value = urllib.parse.quote_plus(str(value))
+                formatted_value = _format_url_value(entity_type, value, placeholder)
                 substituted_template = substituted_template.replace(
                     placeholder, formatted_value
                 )
@@ -268,27 +395,7 @@ class Text2SQLEntitySubstitution:
             value = entities[entity_key]
 
             try:
-                # For API templates, we might need JSON-aware substitution
-                if entity_type == "string":
-                    # JSON string encoding for API payloads
-                    formatted_value = json.dumps(str(value))
-                elif entity_type in ["integer", "number", "float"]:
-                    formatted_value = str(value)
-                elif entity_type == "boolean":
-                    formatted_value = "true" if bool(value) else "false"
-                elif entity_type == "array":
-                    if isinstance(value, list):
-                        formatted_value = json.dumps(value)
-                    else:
-                        formatted_value = json.dumps([value])
-                elif entity_type == "object":
-                    if isinstance(value, dict):
-                        formatted_value = json.dumps(value)
-                    else:
-                        formatted_value = json.dumps({"value": value})
-                else:
-                    formatted_value = json.dumps(str(value))
-
+                formatted_value = _format_api_value(entity_type, value, placeholder)
                 substituted_template = substituted_template.replace(
                     placeholder, formatted_value
                 )
@@ -311,15 +418,18 @@ class Text2SQLEntitySubstitution:
             The substituted DSL component (JSON string).
         """
         try:
-            # Parse the DSL template as JSON
-            dsl_data = json.loads(template) if isinstance(template, str) else template
+            # Parse the DSL template as JSON; a freshly parsed object is already ours to modify
+            if isinstance(template, (str, bytes)):
+                dsl_data = orjson.loads(template)
+                substituted_data = dsl_data
+            else:
+                dsl_data = template
+                # Deep copy to avoid modifying the caller's object
+                substituted_data = copy.deepcopy(dsl_data)
             
             if not isinstance(dsl_data, dict) or 'component_type' not in dsl_data:
                 raise ValueError("DSL template must be a JSON object with 'component_type' field")
             
-            # Deep copy to avoid modifying the original
-            substituted_data = json.loads(json.dumps(dsl_data))
-            
             # Apply entity substitutions recursively through the DSL structure
             substituted_data = self._substitute_dsl_recursive(
                 substituted_data, entities, stored_entity_info
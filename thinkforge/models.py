@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Any, Tuple
 from enum import Enum
 from sqlalchemy import (
     Column,
@@ -9,18 +9,25 @@ from sqlalchemy import (
     Float,
     Boolean,
     DateTime,
+    LargeBinary,
     create_engine,
     ForeignKey,
+    event,
+    insert,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, validates
 import datetime
+import hashlib
+import io
 import numpy as np
 import json
 import logging
 import os
+import re
 from dotenv import load_dotenv
+from psycopg2 import sql
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +39,78 @@ logger = logging.getLogger(__name__)
 DB_SCHEMA = os.environ.get("DB_SCHEMA", "public")
 logger.info(f"Using database schema: {DB_SCHEMA}")
 
+
+def _utcnow() -> datetime.datetime:
+    """Current UTC time as a naive datetime, matching the DateTime (without time zone) columns."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_nl_query(text: Optional[str]) -> str:
+    """Normalise a natural language query for equality checks: trimmed, lower-cased, single-spaced."""
+    return _WHITESPACE_RE.sub(" ", str(text or "").strip().lower())
+
+
+def hash_nl_query(text: Optional[str]) -> str:
+    """Return the 32-character hex digest stored in Text2SQLCache.nl_query_hash."""
+    return hashlib.blake2b(normalize_nl_query(text).encode("utf-8"), digest_size=16).hexdigest()
+
+# Row count from which Text2SQLCache.bulk_copy_from_dicts streams rows with COPY
+# instead of a multi-row INSERT.
+COPY_THRESHOLD = int(os.environ.get("NLC_COPY_THRESHOLD", "100"))
+
+
+# Legacy input fields already reported, so bulk imports log each one once
+_legacy_fields_reported = set()
+
+
+def _report_legacy_field(field: str, message: str) -> None:
+    """Log `message` the first time a legacy input field is seen in this process."""
+    if field not in _legacy_fields_reported:
+        _legacy_fields_reported.add(field)
+        logger.warning(f"{message} (reported once per process)")
+
+
+# Spellings of the legacy cache_type value that mark a template entry
+_LEGACY_TEMPLATE_VALUES = frozenset({"template", "Template", "TEMPLATE"})
+
+
+def _is_legacy_template(cache_type: Any) -> bool:
+    """Return True if a legacy cache_type value means "template" (case-insensitive)."""
+    # The common spellings skip lower(); anything else takes the original comparison
+    if isinstance(cache_type, str) and cache_type in _LEGACY_TEMPLATE_VALUES:
+        return True
+    return str(cache_type).lower() == "template"
+
+
+def _normalise_embedding(value: Any) -> np.ndarray:
+    """Return `value` as a flat, L2-normalised float32 array (raises TypeError/ValueError)."""
+    vector = np.asarray(value, dtype=np.float32).ravel()
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def _copy_field(value: Any) -> str:
+    """Format one value for COPY ... (FORMAT csv): NULL is unquoted and empty, everything else is quoted."""
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, bytes):
+        value = "\\x" + value.hex()
+    elif isinstance(value, np.ndarray):
+        value = json.dumps(value.tolist())
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        value = "true" if value else "false"
+    elif isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
 # Use a generic Base, applications using the library will need to ensure
 # this Base is part of their metadata if they use declarative models elsewhere.
 # Alternatively, the application could provide its own Base.
@@ -125,6 +204,9 @@ class Text2SQLCache(Base):
     nl_query: str = Column(String, index=True, nullable=False)
     """The original natural language query."""
 
+    nl_query_hash: Optional[str] = Column(String(32), index=True)
+    """Hash of the normalised nl_query (see hash_nl_query), kept in sync when nl_query is set."""
+
     template: str = Column(Text, nullable=False)
     """The template (SQL, URL, API spec, etc.) corresponding to the NL query. For certain template types like 'workflow' or visualization-related types, this may contain JSON with additional metadata such as visualization_type and script."""
 
@@ -133,9 +215,13 @@ class Text2SQLCache(Base):
     )
     """Type of the template (sql, url, api, workflow). See TemplateType enum."""
 
-    # Embedding storage using JSONB
+    # Legacy embedding storage using JSONB
     vector_embedding: Optional[list] = Column(JSONB)
-    """JSONB list representation of the vector embedding for the nl_query."""
+    """Legacy JSONB list representation of the embedding. No longer written; read only for
+       rows that predate embedding_blob (Text2SQLController.embed_missing_entries migrates them)."""
+
+    embedding_blob: Optional[bytes] = Column(LargeBinary)
+    """Raw float32 bytes of the vector embedding, decoded with np.frombuffer without parsing."""
     
     # Conditional vector column for pg_vector extension if enabled
     if USE_PG_VECTOR:
@@ -152,7 +238,7 @@ class Text2SQLCache(Base):
     # Metadata fields
     reasoning_trace: Optional[str] = Column(Text)
     """Optional text explaining how the template was derived from the NL query."""
-    tags: Optional[Dict[str, List[str]]] = Column(JSON)
+    tags: Optional[Dict[str, List[str]]] = Column(JSON().with_variant(JSONB(), "postgresql"))
     """Optional name-value pairs for categorization or filtering. Keys are tag names, values are lists of strings."""
     catalog_type: Optional[str] = Column(String, index=True)
     """Optional catalog type for filtering cache entries."""
@@ -165,75 +251,159 @@ class Text2SQLCache(Base):
     status: str = Column(String, default=Status.ACTIVE, nullable=False, index=True)
     """Status of the cache entry (pending, active, archive). See Status enum."""
 
+    usage_count: int = Column(Integer, default=0, server_default="0", nullable=False)
+    """Number of times the entry has been retrieved or applied."""
+
     # Timestamps
     created_at: datetime.datetime = Column(
-        DateTime, default=datetime.datetime.utcnow, nullable=False
+        DateTime, default=_utcnow, nullable=False
     )
     updated_at: datetime.datetime = Column(
         DateTime,
-        default=datetime.datetime.utcnow,
-        onupdate=datetime.datetime.utcnow,
+        default=_utcnow,
+        onupdate=_utcnow,
         nullable=False,
     )
 
+    @validates("nl_query")
+    def _sync_nl_query_hash(self, key: str, value: Optional[str]) -> Optional[str]:
+        """Keep nl_query_hash in step with nl_query."""
+        self.nl_query_hash = hash_nl_query(value) if value is not None else None
+        return value
+
     # REINSTATE embedding property getter/setter for numpy conversion
     @property
     def embedding(self) -> Optional[np.ndarray]:
-        """Return the vector embedding as a NumPy array."""
+        """Return the vector embedding as a NumPy array.
+
+        The array is read-only (a view over embedding_blob, or a memoised
+        conversion of the stored list, see `_memoised`); copy it before
+        modifying it.
+        """
         if hasattr(self, 'pg_vector') and USE_PG_VECTOR and self.pg_vector is not None:
-            try:
-                return np.array(self.pg_vector, dtype=np.float32)
-            except (TypeError, ValueError):
-                logger.error(f"Could not convert pg_vector to numpy array for ID {self.id}", exc_info=True)
-                return None
+            source = self.pg_vector
+        elif self.embedding_blob:
+            return np.frombuffer(self.embedding_blob, dtype=np.float32)
         elif self.vector_embedding:
+            # Assuming it's stored as a list in JSONB
+            source = self.vector_embedding
+        else:
+            return None
+
+        def convert() -> Optional[np.ndarray]:
             try:
-                # Assuming it's stored as a list in JSONB
-                return np.array(self.vector_embedding, dtype=np.float32)
+                embedding = np.array(source, dtype=np.float32)
             except (TypeError, ValueError):
                 logger.error(f"Could not convert stored embedding to numpy array for ID {self.id}", exc_info=True)
                 return None
-        return None
+            embedding.setflags(write=False)
+            return embedding
+
+        return self._memoised("embedding", convert)
 
     @embedding.setter
     def embedding(self, value: Optional[np.ndarray]):
-        """Set the vector embedding from a NumPy array, storing as list or pg_vector."""
+        """Set the vector embedding from a NumPy array, storing it as float32 bytes (plus pg_vector).
+
+        The legacy JSONB list is cleared rather than written: every read goes through
+        embedding_blob, and serialising 768 floats to JSON on each write bought nothing.
+
+        Embeddings are L2-normalised before they are stored, so cosine similarity
+        against stored vectors is a plain dot product.
+        """
         if value is not None:
             try:
-                if hasattr(self, 'pg_vector') and USE_PG_VECTOR:
-                    self.pg_vector = value
-                else:
-                    self.vector_embedding = value.tolist()
-            except AttributeError:
-                logger.error(f"Failed to convert numpy array to list for storage for ID {self.id}", exc_info=True)
-                self.vector_embedding = None
+                value = _normalise_embedding(value)
+                self.embedding_blob = value.tobytes()
+            except (TypeError, ValueError):
+                logger.error(f"Failed to convert embedding to float32 bytes for ID {self.id}", exc_info=True)
+                self.embedding_blob = None
+            if hasattr(self, 'pg_vector') and USE_PG_VECTOR:
+                self.pg_vector = value
+            self.vector_embedding = None
         else:
             if hasattr(self, 'pg_vector') and USE_PG_VECTOR:
                 self.pg_vector = None
             self.vector_embedding = None
+            self.embedding_blob = None
+
+    def _memoised(self, name: str, build: Callable[[], Any]) -> Any:
+        """Return the value `build()` derives from this entry's columns, computing it once.
+
+        Memos live in the instance __dict__ and are dropped whenever one of
+        `_MEMO_SOURCE_COLUMNS` is assigned or flagged modified, and when the
+        instance is expired or refreshed. A JSON value changed in place must be
+        reassigned (or passed to flag_modified) to be seen here, as it must be
+        to be saved.
+        """
+        memo = self.__dict__.setdefault("_derived_memo", {})
+        if name not in memo:
+            memo[name] = build()
+        return memo[name]
+
+    @property
+    def tags_set(self) -> FrozenSet[Tuple[str, Optional[str]]]:
+        """Return the tags as a frozenset of (name, None) and (name, value) pairs.
 
-    def to_dict(self) -> Dict[str, Any]:
+        A tag's value may be a single string or a list of strings. Values that
+        are not strings can never equal a parsed "name:value" search tag, so
+        they are left out.
+        """
+        def build() -> FrozenSet[Tuple[str, Optional[str]]]:
+            tags = self.tags
+            pairs = set()
+            if isinstance(tags, dict):
+                for name, values in tags.items():
+                    if isinstance(values, str):
+                        values = [values]
+                    elif not isinstance(values, (list, tuple, set, frozenset, dict)):
+                        values = []
+                    pairs.add((name, None))
+                    pairs.update((name, value) for value in values if isinstance(value, str))
+            return frozenset(pairs)
+
+        return self._memoised("tags_set", build)
+
+    @property
+    def entity_replacements_json(self) -> str:
+        """Return entity_replacements as JSON, keys in their substitution order.
+
+        This is the key compile_substitution caches compiled templates under;
+        it is memoised (see `_memoised`) so repeated workflow steps do not
+        re-walk the dict.
+        """
+        return self._memoised("entity_replacements_json", lambda: json.dumps(self.entity_replacements))
+
+    # Columns serialised by to_dict, in output order
+    _DICT_FIELDS = (
+        "id", "nl_query", "template", "template_type", "is_template", "entity_replacements",
+        "reasoning_trace", "tags", "catalog_type", "catalog_subtype", "catalog_name", "status",
+        "created_at", "updated_at",
+    )
+
+    def to_dict(self, include_embedding: bool = False) -> Dict[str, Any]:
         """
         Convert the cache entry to a dictionary.
+
+        Loaded column values are read straight from the instance __dict__; only
+        unloaded ones go through the attribute descriptors (and may lazy-load).
+
+        Args:
+            include_embedding: Also include the stored embedding as a list of floats.
+                Off by default: a 768-float list dwarfs every other field and API
+                callers do not use it.
         """
+        loaded = self.__dict__
         result = {
-            "id": self.id,
-            "nl_query": self.nl_query,
-            "template": self.template,
-            "template_type": self.template_type,
-            "is_template": self.is_template,
-            "entity_replacements": self.entity_replacements,
-            "reasoning_trace": self.reasoning_trace,
-            "tags": self.tags,
-            "catalog_type": self.catalog_type,
-            "catalog_subtype": self.catalog_subtype,
-            "catalog_name": self.catalog_name,
-            "status": self.status,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            # Ensure embedding is included, regardless of field name in database
-            "embedding": self.vector_embedding if hasattr(self, 'vector_embedding') and not (hasattr(self, 'pg_vector') and USE_PG_VECTOR) else (self.pg_vector if hasattr(self, 'pg_vector') and USE_PG_VECTOR else None)
+            name: loaded[name] if name in loaded else getattr(self, name)
+            for name in self._DICT_FIELDS
         }
+        created_at, updated_at = result["created_at"], result["updated_at"]
+        result["created_at"] = created_at.isoformat() if created_at else None
+        result["updated_at"] = updated_at.isoformat() if updated_at else None
+        if include_embedding:
+            embedding = self.embedding
+            result["embedding"] = embedding.tolist() if embedding is not None else None
         return result
 
     def __repr__(self):
@@ -242,19 +412,190 @@ class Text2SQLCache(Base):
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Text2SQLCache":
         """Create a model instance from a dictionary"""
+        return Text2SQLCacheDTO.from_dict(data).to_orm()
+
+    @classmethod
+    def topk_similar(
+        cls, session, query_vec: np.ndarray, k: int = 5, **filter_kwargs: Any
+    ) -> List[Tuple[int, float]]:
+        """Rank stored embeddings by cosine similarity to a query vector in one pass.
+
+        For callers without a Text2SQLController (scripts, notebooks): one SELECT
+        fetches the ids and raw embedding bytes, the blobs are joined into a
+        contiguous (N, D) float32 matrix, and all rows are scored with a single
+        matrix-vector product instead of one `embedding` conversion and dot
+        product per row. The controller's cached matrix and ANN index serve the
+        request path.
+
+        Args:
+            session: SQLAlchemy session to query with.
+            query_vec: The query embedding.
+            k: Maximum number of matches.
+            **filter_kwargs: Column equality filters, as for Query.filter_by
+                (e.g. status="active").
+
+        Returns:
+            (entry_id, similarity) pairs, best first.
+        """
+        rows = [
+            row for row in session.query(cls.id, cls.embedding_blob, cls.vector_embedding)
+            .filter_by(**filter_kwargs)
+            .filter((cls.embedding_blob.isnot(None)) | (cls.vector_embedding.isnot(None)))
+            .all()
+            # A JSON null passes IS NOT NULL
+            if row[1] is not None or row[2]
+        ]
+        query = np.asarray(query_vec, dtype=np.float32).ravel()
+        if not rows or k <= 0:
+            return []
+
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        if all(row[1] is not None for row in rows):
+            matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32)
+        else:
+            # Rows not yet migrated off the legacy JSON list
+            matrix = np.concatenate([
+                np.frombuffer(row[1], dtype=np.float32) if row[1] is not None
+                else np.asarray(row[2], dtype=np.float32)
+                for row in rows
+            ])
+        if matrix.size != len(rows) * query.size:
+            logger.warning(f"Stored embeddings do not all match the query dimension {query.size}")
+            return []
+        matrix = matrix.reshape(len(rows), query.size)
+
+        norms = np.linalg.norm(matrix, axis=1) * max(float(np.linalg.norm(query)), 1e-12)
+        scores = (matrix @ query) / np.maximum(norms, 1e-12)
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    @classmethod
+    def bulk_copy_from_dicts(cls, session, rows: List[Dict[str, Any]]) -> int:
+        """Insert many entries from dictionaries without building them through the unit of work.
+
+        Each dictionary is read into a Text2SQLCacheDTO (legacy fields, embedding
+        normalisation, nl_query_hash as in from_dict) without building a mapped
+        instance. On PostgreSQL, batches of at least
+        COPY_THRESHOLD rows are streamed with COPY FROM STDIN; smaller batches and
+        other databases use one executemany INSERT. IDs are assigned by the
+        database and the caller commits.
+
+        Args:
+            session: SQLAlchemy session whose transaction receives the rows.
+            rows: Entry dictionaries in the from_dict format.
+
+        Returns:
+            Number of rows inserted.
+        """
+        if not rows:
+            return 0
+        # The legacy JSON embedding is no longer written (see the embedding setter)
+        columns = [c for c in cls.__table__.columns if c.key not in ("id", "vector_embedding")]
+        values = []
+        for data in rows:
+            dto_row = Text2SQLCacheDTO.from_dict(data).to_row()
+            row = {}
+            for column in columns:
+                value = dto_row.get(column.key)
+                if value is None and column.default is not None:
+                    value = column.default.arg(None) if column.default.is_callable else column.default.arg
+                row[column.key] = value
+            values.append(row)
+
+        connection = session.connection()
+        if len(values) < COPY_THRESHOLD or connection.dialect.name != "postgresql":
+            session.execute(insert(cls), values)
+            return len(values)
+
+        buffer = io.StringIO()
+        for row in values:
+            buffer.write("\t".join(_copy_field(row[column.key]) for column in columns))
+            buffer.write("\n")
+        buffer.seek(0)
+        # Schema and column names are quoted as identifiers, as the INSERT path does
+        statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, DELIMITER E'\\t')").format(
+            sql.Identifier(DB_SCHEMA, cls.__tablename__),
+            sql.SQL(", ").join(sql.Identifier(column.name) for column in columns),
+        )
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(statement, buffer)
+        finally:
+            cursor.close()
+        return len(values)
+
+
+
+# Columns that values memoised by Text2SQLCache._memoised are derived from
+_MEMO_SOURCE_COLUMNS = ("vector_embedding", "embedding_blob", "tags", "entity_replacements") + (
+    ("pg_vector",) if hasattr(Text2SQLCache, "pg_vector") else ()
+)
+
+
+def _clear_memos(target: Text2SQLCache, *args) -> None:
+    """Drop the values memoised by Text2SQLCache._memoised."""
+    target.__dict__.pop("_derived_memo", None)
+
+
+for _column in _MEMO_SOURCE_COLUMNS:
+    event.listen(getattr(Text2SQLCache, _column), "set", _clear_memos)
+    event.listen(getattr(Text2SQLCache, _column), "modified", _clear_memos)
+event.listen(Text2SQLCache, "expire", _clear_memos)
+event.listen(Text2SQLCache, "refresh", _clear_memos)
+
+
+class Text2SQLCacheDTO(NamedTuple):
+    """Plain row data for a cache entry that is not (yet) a mapped instance.
+
+    Imports and in-memory processing can hold large batches of these: a tuple
+    carries no instance __dict__ or SQLAlchemy instance state. They become
+    Text2SQLCache objects (to_orm) or Core INSERT/COPY rows (to_row) only when
+    persisted.
+    """
+    nl_query: Optional[str]
+    template: Optional[str]
+    template_type: str = TemplateType.SQL
+    is_template: bool = False
+    entity_replacements: Optional[Dict[str, Any]] = None
+    reasoning_trace: Optional[str] = None
+    tags: Optional[Dict[str, List[str]]] = None
+    catalog_type: Optional[str] = None
+    catalog_subtype: Optional[str] = None
+    catalog_name: Optional[str] = None
+    status: str = Status.ACTIVE
+    embedding: Optional[np.ndarray] = None
+    """L2-normalised float32 embedding, as the Text2SQLCache.embedding setter stores it."""
+    id: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Text2SQLCacheDTO":
+        """Read a cache entry dictionary, accepting the legacy sql_query and cache_type fields."""
         # Handle backward compatibility for sql_query field
         template = data.get("template")
         if template is None and "sql_query" in data:
             template = data.get("sql_query")
-            logger.info("Used legacy 'sql_query' field instead of 'template'")
+            _report_legacy_field("sql_query", "Used legacy 'sql_query' field instead of 'template'")
 
         # Handle backward compatibility for cache_type field
         is_template = data.get("is_template")
         if is_template is None and "cache_type" in data:
-            is_template = str(data.get("cache_type")).lower() == "template"
-            logger.info("Used legacy 'cache_type' field to determine 'is_template'")
+            is_template = _is_legacy_template(data.get("cache_type"))
+            _report_legacy_field("cache_type", "Used legacy 'cache_type' field to determine 'is_template'")
+
+        # Handle embedding directly if provided (expecting list or ndarray)
+        embedding = None
+        if "vector_embedding" in data and data["vector_embedding"] is not None:
+            try:
+                if isinstance(data["vector_embedding"], (list, np.ndarray)):
+                    embedding = _normalise_embedding(data["vector_embedding"])
+                else:
+                     logger.warning(f"Unexpected format for vector_embedding in from_dict: {type(data['vector_embedding'])}")
+            except Exception as e:
+                logger.error(f"Error processing vector_embedding in from_dict: {e}")
 
-        instance = cls(
+        return cls(
             id=data.get("id"),
             is_template=bool(is_template) if is_template is not None else False,
             template_type=data.get("template_type", TemplateType.SQL),
@@ -267,26 +608,29 @@ class Text2SQLCache(Base):
             catalog_subtype=data.get("catalog_subtype"),
             catalog_name=data.get("catalog_name"),
             status=data.get("status", Status.ACTIVE),
+            embedding=embedding,
         )
 
-        # Handle embedding directly if provided (expecting list or ndarray)
-        if "vector_embedding" in data and data["vector_embedding"] is not None:
-            try:
-                # We now store as list, so just assign if it's already a list
-                if isinstance(data["vector_embedding"], list):
-                    if USE_PG_VECTOR and hasattr(instance, 'pg_vector'):
-                        instance.pg_vector = data["vector_embedding"]
-                    else:
-                        instance.vector_embedding = data["vector_embedding"]
-                # If it's an ndarray, use the setter to convert to list
-                elif isinstance(data["vector_embedding"], np.ndarray):
-                    instance.embedding = data["vector_embedding"] # Use setter
-                else:
-                     logger.warning(f"Unexpected format for vector_embedding in from_dict: {type(data['vector_embedding'])}")
-            except Exception as e:
-                logger.error(f"Error processing vector_embedding in from_dict: {e}")
+    def to_orm(self) -> Text2SQLCache:
+        """Build the mapped Text2SQLCache instance for this row."""
+        values = self._asdict()
+        embedding = values.pop("embedding")
+        instance = Text2SQLCache(**values)
+        if embedding is not None:
+            instance.embedding = embedding
         return instance
 
+    def to_row(self) -> Dict[str, Any]:
+        """Column values for a Core INSERT or COPY, without the database-assigned id."""
+        row = self._asdict()
+        del row["id"]
+        embedding = row.pop("embedding")
+        row["nl_query_hash"] = hash_nl_query(self.nl_query) if self.nl_query is not None else None
+        row["embedding_blob"] = embedding.tobytes() if embedding is not None else None
+        if USE_PG_VECTOR:
+            row["pg_vector"] = embedding
+        return row
+
 
 # --- NEW Usage Log Model ---
 class UsageLog(Base):
@@ -301,7 +645,7 @@ class UsageLog(Base):
     """The ID of the cache entry that was used, if any."""
 
     timestamp: datetime.datetime = Column(
-        DateTime, default=datetime.datetime.utcnow, nullable=False
+        DateTime, default=_utcnow, nullable=False
     )
     """Timestamp when the cache entry was used."""
 
@@ -374,7 +718,7 @@ class CacheAuditLog(Base):
     """Optional identifier of the user or system component that made the change."""
 
     timestamp: datetime.datetime = Column(
-        DateTime, default=datetime.datetime.utcnow, nullable=False
+        DateTime, default=_utcnow, nullable=False
     )
     """Timestamp when the change occurred."""
 
@@ -2,41 +2,347 @@
 Utility classes and functions for computing text similarity.
 
 Provides:
-- String similarity using SequenceMatcher.
+- String similarity using RapidFuzz (SequenceMatcher fallback).
 - Vector similarity using Sentence Transformers.
 - Batch processing capabilities.
 """
 
 from typing import List, Optional, Dict, Any, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+import functools
+import multiprocessing
+import os
+import queue
+import threading
+import time
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from difflib import SequenceMatcher
 import re
 import logging
 
+from ._kernels import dot_rows
+from .vector_index import FAISS_AVAILABLE, HNSWVectorIndex
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = None
+    process = None
+
 logger = logging.getLogger(__name__)
 
+# Inference precision of torch-backend models: 'auto' runs float16 on CUDA and
+# float32 on CPU; 'bfloat16' also autocasts CPU inference (worth it with AVX-512 BF16/AMX)
+_MODEL_PRECISION = os.environ.get("NLC_MODEL_PRECISION", "auto").lower()
+
+# torch.compile mode for the torch-backend transformer ('' leaves it eager), e.g.
+# 'default' or 'reduce-overhead'; and intra-op CPU threads (0 keeps torch's default)
+_TORCH_COMPILE_MODE = os.environ.get("NLC_TORCH_COMPILE", "").lower()
+_TORCH_THREADS = int(os.environ.get("NLC_TORCH_THREADS", "0"))
+
+# Dynamic int8 quantisation of the ONNX backend ('' keeps the float model):
+# one of 'arm64', 'avx2', 'avx512', 'avx512_vnni'. Quantised exports are written
+# once under NLC_ONNX_EXPORT_DIR and reused by later processes.
+_ONNX_QUANTIZATION = os.environ.get("NLC_ONNX_QUANTIZATION", "").lower()
+_ONNX_EXPORT_DIR = os.environ.get(
+    "NLC_ONNX_EXPORT_DIR", os.path.join(os.path.expanduser("~"), ".cache", "thinkforge", "onnx")
+)
+
+# compute_vector_similarities scores this many candidates or fewer pair by pair
+_SMALL_BATCH_CANDIDATES = 4
+
+# Rows upcast at a time when scoring a float16 or int8 matrix without SimSIMD
+_UPCAST_CHUNK_ROWS = 4096
+
+# Matrices with more rows than this are scored in row blocks on a thread pool
+_SCORING_BLOCK_ROWS = int(os.environ.get("NLC_SCORING_BLOCK_ROWS", "100000"))
+_SCORING_THREADS = int(os.environ.get("NLC_SCORING_THREADS", str(os.cpu_count() or 1)))
+_scoring_pool: Optional[ThreadPoolExecutor] = None
+_scoring_pool_lock = threading.Lock()
+
+# Supported precisions for the persistent candidate matrix
+CANDIDATE_DTYPES = ("float32", "float16")
+
+# Candidate matrices with at least this many rows get an HNSW index for inexact searches
+_ANN_MIN_ROWS = int(os.environ.get("NLC_ANN_MIN_ROWS", "10000"))
+
+# Single-text embedding requests arriving within this window are coalesced into one
+# encode call of at most _MICROBATCH_SIZE texts (0 disables coalescing)
+_MICROBATCH_WAIT_MS = float(os.environ.get("NLC_EMBED_MICROBATCH_MS", "0"))
+_MICROBATCH_SIZE = int(os.environ.get("NLC_EMBED_MICROBATCH_SIZE", "64"))
+
+
+def _get_scoring_pool() -> ThreadPoolExecutor:
+    """Return the shared scoring thread pool, creating it on first use."""
+    global _scoring_pool
+    if _scoring_pool is None:
+        with _scoring_pool_lock:
+            if _scoring_pool is None:
+                _scoring_pool = ThreadPoolExecutor(
+                    max_workers=_SCORING_THREADS, thread_name_prefix="nlc-scoring"
+                )
+    return _scoring_pool
+
+
+def cosine_similarities(
+    query: np.ndarray, matrix: np.ndarray, normalized: bool = False
+) -> np.ndarray:
+    """Cosine similarity of one query vector against every row of a matrix.
+
+    Uses SimSIMD's runtime-dispatched SIMD kernels when the package is
+    installed, and a NumPy matrix-vector product otherwise (or a Numba kernel
+    for float16 matrices, which have no BLAS path). Large matrices are
+    split into row blocks scored in parallel; both kernels release the GIL.
+
+    Args:
+        query: 1D query vector.
+        matrix: 2D array with one candidate vector per row.
+        normalized: Whether the query and the rows are already unit length,
+            in which case the NumPy path skips computing norms.
+
+    Returns:
+        1D float array of cosine similarities, one per row.
+    """
+    matrix = np.ascontiguousarray(matrix)
+    query = np.asarray(query).ravel()
+    if matrix.shape[0] == 0:
+        return np.empty(0, dtype=np.float32)
+    if _SCORING_THREADS > 1 and matrix.shape[0] > _SCORING_BLOCK_ROWS:
+        blocks = [
+            matrix[start:start + _SCORING_BLOCK_ROWS]
+            for start in range(0, matrix.shape[0], _SCORING_BLOCK_ROWS)
+        ]
+        return np.concatenate(list(_get_scoring_pool().map(
+            lambda block: _score_block(query, block, normalized), blocks
+        )))
+    return _score_block(query, matrix, normalized)
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray, normalized: bool = False) -> float:
+    """Cosine similarity of two 1D vectors; a plain dot product when both are unit length."""
+    dot = float(np.dot(a, b))
+    return dot if normalized else dot / max(float(np.linalg.norm(a)) * float(np.linalg.norm(b)), 1e-12)
+
+
+def _score_block(query: np.ndarray, matrix: np.ndarray, normalized: bool) -> np.ndarray:
+    """Score one contiguous block of rows for `cosine_similarities`."""
+    if simsimd is not None and matrix.dtype in (np.float16, np.float32, np.float64):
+        query = np.ascontiguousarray(query, dtype=matrix.dtype)
+        distances = np.asarray(simsimd.cdist(query.reshape(1, -1), matrix, metric="cosine"))
+        return 1.0 - distances.reshape(-1)
+    if matrix.dtype == np.float16 or matrix.dtype.kind == "i":
+        # NumPy has no BLAS path for float16 or int8: use the compiled kernel when available
+        scores = dot_rows(query, matrix, normalized)
+        if scores is not None:
+            return scores
+        # Otherwise upcast in cache-sized chunks
+        query = query.astype(np.float32)
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], _UPCAST_CHUNK_ROWS):
+            chunk = matrix[start:start + _UPCAST_CHUNK_ROWS].astype(np.float32)
+            scores[start:start + len(chunk)] = chunk @ query
+            if not normalized:
+                scores[start:start + len(chunk)] /= np.maximum(np.sqrt(np.einsum("ij,ij->i", chunk, chunk)), 1e-12)
+        if not normalized:
+            scores /= max(float(np.linalg.norm(query)), 1e-12)
+        return scores
+    if not normalized and matrix.dtype == np.float32:
+        # Dot product and row norm in one fused pass over the matrix
+        scores = dot_rows(query, matrix, normalized)
+        if scores is not None:
+            return scores
+    scores = matrix @ query.astype(matrix.dtype, copy=False)
+    if not normalized:
+        # einsum sums squares row by row without an N x D temporary
+        norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix)) * np.linalg.norm(query)
+        scores = scores / np.maximum(norms, 1e-12)
+    return scores
+
+
+# extract_entities patterns, compiled once.
+# Dates: YYYY-MM-DD, MM/DD/YYYY, M/D/YY (simple pattern - adjust as needed)
+_DATE_RE = re.compile(r"\b(\d{4}-\d{1,2}-\d{1,2})\b|\b(\d{1,2}/\d{1,2}/(\d{2}|\d{4}))\b")
+# Numbers: integers and decimals
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Named entities: runs of capitalized words. This is VERY basic and error-prone;
+# use spaCy, NLTK, etc. for real NER.
+_NAMED_ENTITY_RE = re.compile(r"\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b")
+
+# String similarity: words shorter than this are ignored for coverage, and a pair
+# scores 0.0 unless it clears both minimums
+MIN_WORD_LENGTH = 2
+MIN_WORD_COVERAGE = 0.2
+MIN_SEQUENCE_SIMILARITY = 0.3
+
+# Candidate strings repeat across queries: their word sets and pair scores are memoised
+_WORD_SET_CACHE_SIZE = int(os.environ.get("NLC_WORD_SET_CACHE_SIZE", "100000"))
+_STRING_SIMILARITY_CACHE_SIZE = int(os.environ.get("NLC_STRING_SIMILARITY_CACHE_SIZE", "100000"))
+
+
+@functools.lru_cache(maxsize=_WORD_SET_CACHE_SIZE)
+def _word_set(s: str) -> frozenset:
+    """Lower-cased words of `s` long enough to count towards word coverage."""
+    return frozenset(w for w in s.lower().split() if len(w) >= MIN_WORD_LENGTH)
+
+
+def _word_coverage(words1: frozenset, words2: frozenset) -> float:
+    """Shared words over the smaller word set (0.0 when either is empty)."""
+    if not words1 or not words2:
+        return 0.0
+    return len(words1 & words2) / min(len(words1), len(words2))
+
+
+def _sequence_ratio(s1: str, s2: str) -> float:
+    """Normalised sequence similarity in [0, 1], native when RapidFuzz is installed."""
+    if fuzz is not None:
+        return fuzz.ratio(s1, s2) / 100.0
+    return SequenceMatcher(None, s1, s2).ratio()
+
+
+def _combine_string_scores(word_coverage: float, sequence_score: float) -> float:
+    """Weight word coverage (60%) and sequence similarity (40%) after the minimum checks."""
+    if word_coverage < MIN_WORD_COVERAGE or sequence_score < MIN_SEQUENCE_SIMILARITY:
+        return 0.0
+    return 0.6 * word_coverage + 0.4 * sequence_score
+
+
+@functools.lru_cache(maxsize=_STRING_SIMILARITY_CACHE_SIZE)
+def _string_similarity(s1: str, s2: str) -> float:
+    """Memoised body of `Text2SQLSimilarity.compute_string_similarity`."""
+    word_coverage = _word_coverage(_word_set(s1), _word_set(s2))
+    if word_coverage < MIN_WORD_COVERAGE:
+        return 0.0
+    return _combine_string_scores(word_coverage, _sequence_ratio(s1, s2))
+
+
+# Without RapidFuzz, string scoring of at least _STRING_PARALLEL_MIN candidates is split
+# across NLC_STRING_WORKERS processes (0 keeps it in-process); difflib holds the GIL
+_STRING_WORKERS = int(os.environ.get("NLC_STRING_WORKERS", "0"))
+_STRING_PARALLEL_MIN = int(os.environ.get("NLC_STRING_PARALLEL_MIN", "2000"))
+_STRING_CHUNK_SIZE = 256
+_string_pool: Optional[ProcessPoolExecutor] = None
+_string_pool_lock = threading.Lock()
+
+
+def _get_string_pool() -> ProcessPoolExecutor:
+    """Return the shared string-scoring process pool, creating it on first use."""
+    global _string_pool
+    if _string_pool is None:
+        with _string_pool_lock:
+            if _string_pool is None:
+                # spawn: forking a process that runs torch threads can deadlock the child
+                _string_pool = ProcessPoolExecutor(
+                    max_workers=_STRING_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _string_pool
+
+
+def _score_string_chunk(query: str, candidates: List[str]) -> List[float]:
+    """String similarity of `query` against a chunk of candidates (process pool task)."""
+    return [_string_similarity(query, c) for c in candidates]
+
+
+# Candidates kept by the optional token-overlap prefilter of find_most_similar
+_PREFILTER_CANDIDATES = int(os.environ.get("NLC_PREFILTER_CANDIDATES", "512"))
+
+
+def _token_prefilter(query: str, candidates: List[str], keep: int) -> np.ndarray:
+    """Indices (ascending) of the `keep` candidates sharing the most words with `query`."""
+    query_words = _word_set(str(query) if query is not None else "")
+    overlap = np.fromiter(
+        (len(query_words & _word_set(str(c) if c is not None else "")) for c in candidates),
+        dtype=np.int64,
+        count=len(candidates),
+    )
+    # Stable order: ties at the cut keep the lowest indices
+    return np.sort(np.argsort(-overlap, kind="stable")[:keep])
+
+
+def _batch_string_similarity(query: str, candidates: List[str]) -> List[float]:
+    """`compute_string_similarity` of `query` against every candidate.
+
+    With RapidFuzz the sequence ratios of all candidates come from one threaded
+    `process.cdist` call instead of a Python-level comparison per pair; without
+    it, large batches can be spread over a process pool (NLC_STRING_WORKERS).
+    """
+    query = str(query) if query is not None else ""
+    candidates = [str(c) if c is not None else "" for c in candidates]
+    if process is None and _STRING_WORKERS > 0 and len(candidates) >= _STRING_PARALLEL_MIN:
+        chunks = [
+            candidates[start:start + _STRING_CHUNK_SIZE]
+            for start in range(0, len(candidates), _STRING_CHUNK_SIZE)
+        ]
+        scores = _get_string_pool().map(_score_string_chunk, [query] * len(chunks), chunks)
+        return [score for chunk_scores in scores for score in chunk_scores]
+    if process is None or not candidates:
+        return [_string_similarity(query, c) for c in candidates]
+    query_words = _word_set(query)
+    ratios = (
+        process.cdist(
+            [query], candidates, scorer=fuzz.ratio, dtype=np.float64, workers=-1
+        )[0] / 100.0
+    ).tolist()
+    return [
+        _combine_string_scores(_word_coverage(query_words, _word_set(c)), ratio)
+        for c, ratio in zip(candidates, ratios)
+    ]
+
 
 class Text2SQLSimilarity:
     """Handles text similarity calculations using different methods."""
 
     # Cache loaded models to avoid reloading
     _model_cache: Dict[str, SentenceTransformer] = {}
+    # Serialises first loads so concurrent callers do not load the same model twice
+    _model_lock = threading.Lock()
+    # Micro-batching queues of (text, normalize, Future), one per model, each drained by a daemon thread
+    _batch_queues: Dict[str, "queue.Queue[Tuple[str, bool, Future]]"] = {}
+    _batch_lock = threading.Lock()
 
-    def __init__(self, model_name: str = "sentence-transformers/all-mpnet-base-v2"):
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-mpnet-base-v2",
+        candidate_dtype: Optional[str] = None,
+    ):
         """Initialize the similarity utility.
 
         Args:
             model_name: The name of the Sentence Transformer model to load.
                         Defaults to 'sentence-transformers/all-mpnet-base-v2'.
+            candidate_dtype: Storage precision of the persistent candidate matrix
+                ('float32' or 'float16', which halves its memory traffic). Defaults to
+                the NLC_CANDIDATE_DTYPE environment variable, or 'float32'.
+
+        Raises:
+            ValueError: If candidate_dtype is not supported.
         """
+        candidate_dtype = candidate_dtype or os.environ.get("NLC_CANDIDATE_DTYPE", "float32")
+        if candidate_dtype not in CANDIDATE_DTYPES:
+            raise ValueError(
+                f"Unsupported candidate_dtype '{candidate_dtype}'. Use one of: {', '.join(CANDIDATE_DTYPES)}"
+            )
         self.model_name = model_name
         self.model = self._load_model(model_name)
         if self.model is None:
             logger.warning(
                 f"Failed to load model {model_name}. Some functionality will be limited."
             )
+        # Per-instance persistent candidate slab: rows [0, _cand_n) are live, capacity doubles when full
+        self._cand_mat: Optional[np.ndarray] = None
+        self._cand_n = 0
+        self._cand_dtype = np.dtype(candidate_dtype)
+        # HNSW graph over the slab, keyed by row; rows [0, _cand_indexed) are in it
+        self._cand_index: Optional[HNSWVectorIndex] = None
+        self._cand_indexed = 0
+        self._cand_lock = threading.Lock()
 
     @classmethod
     def _load_model(cls, model_name: str) -> Optional[SentenceTransformer]:
@@ -49,28 +355,126 @@ class Text2SQLSimilarity:
         Returns:
             SentenceTransformer model or None if loading fails.
         """
-        if model_name in cls._model_cache:
-            logger.info(f"Using cached SentenceTransformer model: {model_name}")
-            return cls._model_cache[model_name]
+        with cls._model_lock:
+            if model_name in cls._model_cache:
+                logger.info(f"Using cached SentenceTransformer model: {model_name}")
+                return cls._model_cache[model_name]
+
+            try:
+                logger.info(f"Loading SentenceTransformer model for the first time: {model_name}")
+                model = cls._create_model(model_name)
+                cls._model_cache[model_name] = model
+                logger.info(f"Successfully loaded and cached model: {model_name}")
+                return model
+            except Exception as e:
+                logger.error(
+                    f"Failed to load sentence transformer model '{model_name}': {str(e)}",
+                    exc_info=True,
+                )
+                return None
 
-        try:
-            logger.info(f"Loading SentenceTransformer model for the first time: {model_name}")
-            model = SentenceTransformer(model_name)
-            cls._model_cache[model_name] = model
-            logger.info(f"Successfully loaded and cached model: {model_name}")
-            return model
-        except Exception as e:
-            logger.error(
-                f"Failed to load sentence transformer model '{model_name}': {str(e)}",
-                exc_info=True,
-            )
-            return None
+    @staticmethod
+    def _create_model(model_name: str) -> SentenceTransformer:
+        """
+        Construct a SentenceTransformer on the inference backend named by NLC_EMBEDDING_BACKEND.
+
+        'onnx' (ONNX Runtime with graph optimisations) and 'openvino' are much
+        faster than eager PyTorch on CPU. They need sentence-transformers >= 3.2
+        and `optimum[onnxruntime]` / `optimum[openvino]`; without those the model
+        falls back to the default 'torch' backend. With NLC_ONNX_QUANTIZATION the
+        ONNX model is additionally int8-quantised (VNNI/AVX-512 dot products). Encoding and pooling happen
+        inside SentenceTransformer either way, so embeddings keep the same shape.
+        Torch models on CUDA are cast to half precision per NLC_MODEL_PRECISION.
+        When NLC_TORCH_COMPILE names a mode, the transformer of a torch model on
+        any device is wrapped in `torch.compile` and compiled by a warm-up
+        encode; if compiling fails the model is left eager.
+
+        Args:
+            model_name: Name or path of the model to load.
+
+        Returns:
+            The loaded SentenceTransformer model.
+        """
+        backend = os.environ.get("NLC_EMBEDDING_BACKEND", "torch").lower()
+        if backend == "onnx" and _ONNX_QUANTIZATION:
+            try:
+                return Text2SQLSimilarity._create_quantized_onnx_model(model_name, _ONNX_QUANTIZATION)
+            except Exception as e:
+                logger.warning(
+                    f"Quantised ONNX model '{_ONNX_QUANTIZATION}' unavailable for {model_name} ({e}); using float ONNX"
+                )
+        if backend != "torch":
+            try:
+                # Exports the model to ONNX/OpenVINO on first use when no exported file exists
+                return SentenceTransformer(model_name, backend=backend)
+            except Exception as e:
+                logger.warning(
+                    f"Embedding backend '{backend}' unavailable for {model_name} ({e}); using torch"
+                )
+        model = SentenceTransformer(model_name)
+        if model.device.type == "cuda":
+            if _MODEL_PRECISION in ("auto", "float16"):
+                model.half()
+            elif _MODEL_PRECISION == "bfloat16":
+                model.to(torch.bfloat16)
+        elif _TORCH_THREADS > 0:
+            torch.set_num_threads(_TORCH_THREADS)
+        if _TORCH_COMPILE_MODE and hasattr(torch, "compile"):
+            eager_model = model[0].auto_model
+            try:
+                # dynamic=True: one graph for every padded sequence length
+                model[0].auto_model = torch.compile(
+                    eager_model, mode=_TORCH_COMPILE_MODE, dynamic=True
+                )
+                # Compilation is lazy: encode once so failures surface here, not on the first query
+                model.encode(["warm-up"], convert_to_numpy=True)
+            except Exception as e:
+                model[0].auto_model = eager_model
+                logger.warning(f"torch.compile unavailable for {model_name} ({e}); running eager")
+        return model
+
+    @staticmethod
+    def _create_quantized_onnx_model(model_name: str, config: str) -> SentenceTransformer:
+        """
+        Load the dynamically int8-quantised ONNX export of a model, exporting it on first use.
+
+        Args:
+            model_name: Name or path of the model to load.
+            config: Quantisation preset passed to `export_dynamic_quantized_onnx_model`.
+
+        Returns:
+            The quantised SentenceTransformer on the ONNX backend.
+        """
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        export_dir = os.path.join(_ONNX_EXPORT_DIR, model_name.replace("/", "__"))
+        file_name = f"onnx/model_qint8_{config}.onnx"
+        if not os.path.isfile(os.path.join(export_dir, file_name)):
+            logger.info(f"Exporting {config} int8 ONNX model for {model_name} to {export_dir}")
+            model = SentenceTransformer(model_name, backend="onnx")
+            model.save(export_dir)
+            export_dynamic_quantized_onnx_model(model, config, export_dir)
+        return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
 
-    def get_embedding(self, text: List[str]) -> Optional[np.ndarray]:
+    @staticmethod
+    def _inference_context(model: SentenceTransformer):
+        """Return the autocast context for CPU inference (a no-op unless bfloat16 is requested)."""
+        if _MODEL_PRECISION == "bfloat16" and model.device.type == "cpu":
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return nullcontext()
+
+    def get_embedding(
+        self, text: List[str], batch_size: int = 64, normalize: bool = False
+    ) -> Optional[np.ndarray]:
         """Generate sentence embeddings for a list of text strings.
 
         Args:
             text: A list of strings to embed.
+            batch_size: Number of strings encoded per model forward pass.
+            normalize: Whether to return unit-length embeddings.
+
+        Single-text calls are coalesced across threads into one encode call when
+        NLC_EMBED_MICROBATCH_MS is set.
 
         Returns:
             A NumPy array containing the embeddings (one row per string),
@@ -85,16 +489,86 @@ class Text2SQLSimilarity:
         try:
             # Ensure all elements are strings
             processed_text = [str(t) if t is not None else "" for t in text]
+            if _MICROBATCH_WAIT_MS > 0 and len(processed_text) == 1:
+                return self._submit_coalesced(processed_text[0], normalize).result()
             # Log the model being used for embeddings
-            logger.info(f"Generating embeddings using model: {self.model._modules['0'].auto_model.config._name_or_path}")
-            embeddings = self.model.encode(processed_text, convert_to_numpy=True)
-            return embeddings
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Generating embeddings using model: {self.model_name}")
+            return self._encode(self.model, processed_text, batch_size, normalize)
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}", exc_info=True)
             return None
 
+    @classmethod
+    def _encode(
+        cls, model: SentenceTransformer, texts: List[str], batch_size: int, normalize: bool
+    ) -> np.ndarray:
+        """Run `model` over `texts` and return float32 rows."""
+        with cls._inference_context(model):
+            embeddings = model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=normalize,
+            )
+        # Half-precision models return float16 rows; callers expect float32
+        return embeddings.astype(np.float32, copy=False)
+
+    def _submit_coalesced(self, text: str, normalize: bool) -> Future:
+        """Queue one text for the micro-batching worker and return its Future (a 1-row array)."""
+        pending = self._batch_queues.get(self.model_name)
+        if pending is None:
+            with self._batch_lock:
+                pending = self._batch_queues.get(self.model_name)
+                if pending is None:
+                    pending = queue.Queue()
+                    # The worker holds only the shared model, never this instance's candidates
+                    threading.Thread(
+                        target=self._coalesce_loop,
+                        args=(self.model, pending),
+                        name="nlc-embed-batcher",
+                        daemon=True,
+                    ).start()
+                    self._batch_queues[self.model_name] = pending
+        future: Future = Future()
+        pending.put((text, bool(normalize), future))
+        return future
+
+    @classmethod
+    def _coalesce_loop(
+        cls, model: SentenceTransformer, pending: "queue.Queue[Tuple[str, bool, Future]]"
+    ) -> None:
+        """Collect queued texts for up to `_MICROBATCH_WAIT_MS` and encode them together."""
+        wait = _MICROBATCH_WAIT_MS / 1000.0
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + wait
+            while len(batch) < _MICROBATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Callers may differ in `normalize`: one encode call per flag
+            for normalize in (False, True):
+                group = [item for item in batch if item[1] is normalize]
+                if not group:
+                    continue
+                try:
+                    embeddings = cls._encode(
+                        model, [item[0] for item in group], _MICROBATCH_SIZE, normalize
+                    )
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                    continue
+                for row, (_, _, future) in zip(embeddings, group):
+                    future.set_result(row.reshape(1, -1))
+
     def compute_string_similarity(self, s1: str, s2: str) -> float:
-        """Compute similarity between two strings using SequenceMatcher with word coverage.
+        """Compute similarity between two strings using sequence ratio with word coverage.
 
         Args:
             s1: First string.
@@ -106,37 +580,7 @@ class Text2SQLSimilarity:
         # Ensure inputs are strings
         s1 = str(s1) if s1 is not None else ""
         s2 = str(s2) if s2 is not None else ""
-        
-        # Get word sets
-        words1 = set(s1.lower().split())
-        words2 = set(s2.lower().split())
-        
-        # Minimum word length requirement (reduced to 2 to include more words)
-        MIN_WORD_LENGTH = 2
-        words1 = {w for w in words1 if len(w) >= MIN_WORD_LENGTH}
-        words2 = {w for w in words2 if len(w) >= MIN_WORD_LENGTH}
-        
-        if not words1 or not words2:
-            return 0.0
-        
-        # Calculate word coverage using a more lenient approach
-        common_words = words1.intersection(words2)
-        # Use min instead of max to be more lenient with partial matches
-        word_coverage = len(common_words) / min(len(words1), len(words2))
-        
-        # Calculate sequence similarity
-        sequence_score = SequenceMatcher(None, s1, s2).ratio()
-        
-        # Minimum thresholds (reduced to be more lenient)
-        MIN_WORD_COVERAGE = 0.2  # At least 20% of words must match
-        MIN_SEQUENCE_SIMILARITY = 0.3  # At least 30% sequence similarity
-        
-        if word_coverage < MIN_WORD_COVERAGE or sequence_score < MIN_SEQUENCE_SIMILARITY:
-            return 0.0
-        
-        # Weight the scores (60% word coverage, 40% sequence similarity)
-        # This gives more weight to sequence similarity to catch similar words
-        return 0.6 * word_coverage + 0.4 * sequence_score
+        return _string_similarity(s1, s2)
 
     def compute_cosine_similarity(self, emb1: np.ndarray, emb2: np.ndarray) -> float:
         """Compute cosine similarity between two vector embeddings.
@@ -146,52 +590,34 @@ class Text2SQLSimilarity:
             emb2: Second embedding (1D NumPy array).
 
         Returns:
-            Cosine similarity score between -1.0 and 1.0.
+            Cosine similarity mapped to 0.0-1.0, or 0.0 for mismatched or zero vectors.
         """
         try:
-            logger.debug(f"Computing cosine similarity between embeddings of shapes: {emb1.shape} and {emb2.shape}")
-            
-            # Ensure embeddings are NumPy arrays
-            if not isinstance(emb1, np.ndarray):
-                logger.debug(f"Converting emb1 to numpy array from type: {type(emb1)}")
-                emb1 = np.array(emb1)
-            if not isinstance(emb2, np.ndarray):
-                logger.debug(f"Converting emb2 to numpy array from type: {type(emb2)}")
-                emb2 = np.array(emb2)
-
-            # Handle potential shape mismatches or zero vectors if necessary
-            if emb1.shape != emb2.shape:
-                logger.warning(f"Embedding shape mismatch: {emb1.shape} vs {emb2.shape}")
+            a = np.asarray(emb1, dtype=np.float32)
+            b = np.asarray(emb2, dtype=np.float32)
+            if a.shape != b.shape:
+                logger.warning(f"Embedding shape mismatch: {a.shape} vs {b.shape}")
                 return 0.0
-            if np.all(emb1 == 0) or np.all(emb2 == 0):
+            norms = float(np.linalg.norm(a)) * float(np.linalg.norm(b))
+            if norms == 0.0:
                 logger.warning("Zero vector detected in embeddings")
                 return 0.0
-
-            # Reshape for sklearn's cosine_similarity
-            emb1_2d = emb1.reshape(1, -1)
-            emb2_2d = emb2.reshape(1, -1)
-            logger.debug(f"Reshaped embeddings to: {emb1_2d.shape} and {emb2_2d.shape}")
-            
-            # Compute cosine similarity using sklearn
-            similarity = cosine_similarity(emb1_2d, emb2_2d)[0][0]
-            logger.debug(f"Raw cosine similarity score: {similarity}")
-            
-            # Apply stricter scoring
-            # 1. Normalize to 0-1 range (cosine similarity is -1 to 1)
-            score = (similarity + 1) / 2
-            logger.debug(f"Normalized score: {score}")
-            
-            return score
+            # Map cosine similarity from [-1, 1] to [0, 1]
+            return (float(a @ b) / norms + 1.0) / 2.0
         except Exception as e:
             logger.error(f"Error computing cosine similarity: {e}", exc_info=True)
             return 0.0
 
-    def compute_vector_similarities(self, query_emb: np.ndarray, candidate_embs: List[np.ndarray]) -> List[float]:
+    def compute_vector_similarities(
+        self, query_emb: np.ndarray, candidate_embs: List[np.ndarray], normalized: bool = False
+    ) -> List[float]:
         """Compute cosine similarities between a query embedding and a list of candidate embeddings.
 
         Args:
             query_emb: The query embedding (1D NumPy array).
             candidate_embs: A list of candidate embeddings (1D NumPy arrays).
+            normalized: Whether all embeddings are unit length, so the scores
+                are plain dot products and no norms are computed.
 
         Returns:
             A list of cosine similarity scores, one for each candidate.
@@ -199,27 +625,34 @@ class Text2SQLSimilarity:
         if not self.model:
             logger.error("Model not loaded. Cannot compute vector similarities.")
             return [0.0] * len(candidate_embs)
-        if query_emb is None or not candidate_embs:
+        if query_emb is None or len(candidate_embs) == 0:
             logger.warning("Empty query embedding or candidate embeddings")
             return [0.0] * len(candidate_embs)
 
         try:
-            logger.debug(f"Computing vector similarities for {len(candidate_embs)} candidates")
-            logger.debug(f"Query embedding shape: {query_emb.shape}")
-            
-            # Ensure candidates are stacked correctly for sklearn's cosine_similarity
-            candidate_embs_array = np.array(candidate_embs)
-            logger.debug(f"Candidate embeddings array shape: {candidate_embs_array.shape}")
-            
-            # Reshape query embedding to 2D array
-            query_emb_2d = query_emb.reshape(1, -1)
-            logger.debug(f"Reshaped query embedding to: {query_emb_2d.shape}")
-            
-            # Compute cosine similarity using sklearn
-            similarities = cosine_similarity(query_emb_2d, candidate_embs_array)[0]
-            logger.debug(f"Computed similarities shape: {similarities.shape}")
-            logger.debug(f"First few similarity scores: {similarities[:5]}")
-            
+            if len(candidate_embs) <= _SMALL_BATCH_CANDIDATES:
+                # A few dot products cost less than stacking and dispatching a matrix
+                query = np.asarray(query_emb, dtype=np.float32).reshape(-1)
+                query_norm = 1.0 if normalized else max(float(np.linalg.norm(query)), 1e-12)
+                scores = []
+                for emb in candidate_embs:
+                    emb = np.asarray(emb, dtype=np.float32).reshape(-1)
+                    dot = float(query @ emb)
+                    scores.append(
+                        dot if normalized
+                        else dot / max(float(np.linalg.norm(emb)) * query_norm, 1e-12)
+                    )
+                return scores
+
+            # Stack candidates into one contiguous matrix and score them in one call
+            candidate_embs_array = np.asarray(candidate_embs, dtype=np.float32)
+            similarities = cosine_similarities(query_emb, candidate_embs_array, normalized=normalized)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"Scored query {query_emb.shape} against candidates {candidate_embs_array.shape}; "
+                    f"first scores: {similarities[:5]}"
+                )
+
             # Return similarities as a list of floats
             return similarities.tolist()
         except Exception as e:
@@ -243,24 +676,110 @@ class Text2SQLSimilarity:
             ValueError: If an invalid method is specified.
         """
         if method == "string":
-            return [
-                self.compute_string_similarity(query, cand) for cand in candidates
-            ]
+            return _batch_string_similarity(query, candidates)
         elif method == "vector":
-            query_embedding = self.get_embedding([query])
+            # Unit-length embeddings from the model make cosine a plain dot product
+            query_embedding = self.get_embedding([query], normalize=True)
             if query_embedding is None:
                 logger.error("Failed to generate embedding for the query.")
                 return [0.0] * len(candidates)
 
-            candidate_embeddings = self.get_embedding(candidates)
+            candidate_embeddings = self.get_embedding(candidates, normalize=True)
             if candidate_embeddings is None:
                  logger.error("Failed to generate embeddings for candidates.")
                  return [0.0] * len(candidates)
 
-            return self.compute_vector_similarities(query_embedding[0], candidate_embeddings)
+            return self.compute_vector_similarities(query_embedding[0], candidate_embeddings, normalized=True)
         else:
             raise ValueError(f"Invalid similarity method: {method}")
 
+    def add_candidates(self, embs: Any) -> int:
+        """Append candidate embeddings to the persistent candidate matrix.
+
+        The matrix is one contiguous buffer (float32, or float16 per candidate_dtype)
+        that doubles its capacity when full, so adding rows never copies the live
+        block on every call and scoring reuses the same memory.
+
+        Args:
+            embs: A single embedding or a sequence/2D array of embeddings.
+
+        Returns:
+            The index of the first appended row.
+
+        Raises:
+            ValueError: If the embedding dimension differs from the stored rows.
+        """
+        rows = np.asarray(embs, dtype=self._cand_dtype)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        with self._cand_lock:
+            start = self._cand_n
+            if self._cand_mat is None:
+                self._cand_mat = np.empty((max(rows.shape[0], 1024), rows.shape[1]), dtype=self._cand_dtype)
+            elif rows.shape[1] != self._cand_mat.shape[1]:
+                raise ValueError(
+                    f"Embedding dimension {rows.shape[1]} does not match candidate matrix dimension {self._cand_mat.shape[1]}"
+                )
+            needed = start + rows.shape[0]
+            if needed > self._cand_mat.shape[0]:
+                capacity = self._cand_mat.shape[0]
+                while capacity < needed:
+                    capacity *= 2
+                grown = np.empty((capacity, self._cand_mat.shape[1]), dtype=self._cand_dtype)
+                grown[:start] = self._cand_mat[:start]
+                self._cand_mat = grown
+            self._cand_mat[start:needed] = rows
+            self._cand_n = needed
+        return start
+
+    def get_candidate_matrix(self) -> np.ndarray:
+        """Return the live rows of the candidate matrix (a view, not a copy)."""
+        with self._cand_lock:
+            if self._cand_mat is None:
+                return np.empty((0, 0), dtype=self._cand_dtype)
+            return self._cand_mat[:self._cand_n]
+
+    def _ann_candidate_rows(
+        self, query_embedding: np.ndarray, candidate_matrix: np.ndarray, limit: Optional[int]
+    ) -> Optional[np.ndarray]:
+        """Rows of the candidate slab nearest to the query, from its HNSW index.
+
+        The index is built on first use once the slab has NLC_ANN_MIN_ROWS rows, and
+        rows appended since are added before searching.
+
+        Args:
+            query_embedding: Unit-length 1D query embedding.
+            candidate_matrix: Matrix passed to `find_most_similar`.
+            limit: Number of results wanted.
+
+        Returns:
+            Candidate row indices to rescore exactly, or None when the exhaustive
+            scan must run (no faiss, no limit, small slab, or a matrix other than
+            the live `get_candidate_matrix()` view).
+        """
+        if not FAISS_AVAILABLE or not limit or limit <= 0:
+            return None
+        with self._cand_lock:
+            if (
+                self._cand_mat is None
+                or self._cand_n < _ANN_MIN_ROWS
+                or len(candidate_matrix) != self._cand_n
+                or not np.shares_memory(candidate_matrix, self._cand_mat)
+            ):
+                return None
+            if self._cand_index is None:
+                self._cand_index = HNSWVectorIndex(self._cand_mat.shape[1])
+                self._cand_indexed = 0
+            if self._cand_indexed < self._cand_n:
+                rows = self._cand_mat[self._cand_indexed:self._cand_n].astype(np.float32)
+                # Inner product on unit vectors is cosine similarity
+                rows /= np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+                self._cand_index.add(range(self._cand_indexed, self._cand_n), rows)
+                self._cand_indexed = self._cand_n
+            index = self._cand_index
+        neighbours = index.search(query_embedding, limit * 4)
+        return np.fromiter((row for row, _ in neighbours), dtype=np.int64, count=len(neighbours))
+
     def find_most_similar(
         self,
         query: str,
@@ -268,6 +787,10 @@ class Text2SQLSimilarity:
         candidate_embeddings: Optional[List[Optional[np.ndarray]]] = None,
         method: str = "vector",
         threshold: float = 0.7,
+        limit: Optional[int] = None,
+        candidate_matrix: Optional[np.ndarray] = None,
+        cheap_prefilter: bool = False,
+        exact: bool = True,
     ) -> List[Tuple[int, float]]:
         """
         Find the most similar candidates to a query.
@@ -279,34 +802,78 @@ class Text2SQLSimilarity:
             candidate_embeddings: Pre-computed embeddings for candidates (optional, for vector).
             method: Similarity method ('vector' or 'string').
             threshold: Minimum similarity threshold.
+            limit: Optional maximum number of results. Only the top `limit`
+                scores are selected (argpartition) and sorted.
+            candidate_matrix: Pre-stacked 2D candidate embeddings, e.g. from
+                `get_candidate_matrix()` (vector method). Scored directly, with no
+                per-call stacking of `candidate_embeddings`.
+            cheap_prefilter: Vector method only: when there are more than
+                NLC_PREFILTER_CANDIDATES candidates, keep only that many sharing the
+                most words with the query and embed/score just those. Approximate, so
+                off by default; skipped candidates are never returned.
+            exact: Vector method with the `get_candidate_matrix()` view and a
+                `limit`: when False and faiss is installed, take candidates from an
+                HNSW index over the slab (rescored exactly) instead of scanning every
+                row. Large slabs only (NLC_ANN_MIN_ROWS).
 
         Returns:
             List of (candidate_index, similarity_score) tuples for candidates above threshold,
             sorted by similarity descending.
         """
-        logger.info(f"Finding most similar candidates for query: {query}")
-        logger.info(f"Method: {method}, Threshold: {threshold}")
-        logger.info(f"Number of candidates: {len(candidates)}")
+        # Formatting is skipped entirely when the level is off: this runs per query
+        log_info = logger.isEnabledFor(logging.INFO)
+        log_debug = logger.isEnabledFor(logging.DEBUG)
+        if log_info:
+            logger.info(f"Finding most similar candidates for query: {query}")
+            logger.info(f"Method: {method}, Threshold: {threshold}")
+            logger.info(f"Number of candidates: {len(candidates)}")
         
-        similarities: Optional[List[float]] = None
+        similarities: Optional[np.ndarray] = None
+        # Original candidate indices kept by the prefilter (None scores every candidate)
+        survivors: Optional[np.ndarray] = None
 
         if method == "vector":
             if not self.model:
                 logger.error("Vector similarity requested but embedding model is not available.")
                 return []
+
+            if cheap_prefilter and len(candidates) > _PREFILTER_CANDIDATES:
+                all_candidates = candidates
+                survivors = _token_prefilter(query, candidates, _PREFILTER_CANDIDATES)
+                candidates = [all_candidates[i] for i in survivors]
+                if candidate_matrix is not None and len(candidate_matrix) == len(all_candidates):
+                    candidate_matrix = candidate_matrix[survivors]
+                if candidate_embeddings and len(candidate_embeddings) == len(all_candidates):
+                    candidate_embeddings = [candidate_embeddings[i] for i in survivors]
+                if log_debug:
+                    logger.debug(f"Prefilter kept {len(candidates)} of {len(all_candidates)} candidates")
                 
-            logger.debug("Generating query embedding...")
-            query_embedding = self.get_embedding([query])
+            # Unit length, so scoring against model-made candidates skips all norms
+            query_embedding = self.get_embedding([query], normalize=True)
             if query_embedding is None or len(query_embedding) == 0:
                 logger.error("Failed to generate embedding for the query.")
                 return []
                 
             # Ensure query_embedding is 1D
             query_embedding = query_embedding[0] if query_embedding.ndim > 1 else query_embedding
-            logger.debug(f"Query embedding shape: {query_embedding.shape}")
 
-            if candidate_embeddings:
-                logger.debug(f"Using provided candidate embeddings: {len(candidate_embeddings)}")
+            if candidate_matrix is not None and candidates and len(candidate_matrix) != len(candidates):
+                logger.warning(
+                    f"Mismatch between number of candidates ({len(candidates)}) and candidate matrix rows ({len(candidate_matrix)})"
+                )
+                candidate_matrix = None
+
+            ann_rows = None
+            if not exact and candidate_matrix is not None and survivors is None:
+                ann_rows = self._ann_candidate_rows(query_embedding, candidate_matrix, limit)
+
+            if ann_rows is not None:
+                # Rows outside the neighbour set can never pass the threshold
+                similarities = np.full(len(candidate_matrix), -np.inf, dtype=np.float64)
+                similarities[ann_rows] = cosine_similarities(query_embedding, candidate_matrix[ann_rows])
+            elif candidate_matrix is not None:
+                similarities = cosine_similarities(query_embedding, candidate_matrix)
+            elif candidate_embeddings:
                 if len(candidate_embeddings) != len(candidates):
                     logger.warning(
                         f"Mismatch between number of candidates ({len(candidates)}) and provided embeddings ({len(candidate_embeddings)})"
@@ -325,62 +892,60 @@ class Text2SQLSimilarity:
                         logger.warning(f"Invalid embedding at index {i}, using zero vector")
                         valid_embeddings.append(np.zeros_like(query_embedding))
                 
-                logger.debug(f"Valid embeddings count: {len(valid_embeddings)}")
-                
-                # Compute similarities using sklearn's cosine_similarity
-                query_emb_2d = query_embedding.reshape(1, -1)
-                candidate_embs_2d = np.array(valid_embeddings)
-                logger.debug(f"Shapes - Query: {query_emb_2d.shape}, Candidates: {candidate_embs_2d.shape}")
-                
-                similarities = cosine_similarity(query_emb_2d, candidate_embs_2d)[0].tolist()
-                logger.debug(f"Computed similarities: {similarities[:5]}...")
+                candidate_embs_2d = np.asarray(valid_embeddings, dtype=np.float32)
+                similarities = cosine_similarities(query_embedding, candidate_embs_2d)
             else:
-                logger.debug("No candidate embeddings provided, computing new embeddings...")
                 # Calculate embeddings if not provided
-                cand_embeds_calc = self.get_embedding(candidates)
+                cand_embeds_calc = self.get_embedding(candidates, normalize=True)
                 if cand_embeds_calc is None or len(cand_embeds_calc) == 0:
                     logger.error("Failed to generate embeddings for candidates")
                     return []
                 
-                logger.debug(f"Generated candidate embeddings shape: {cand_embeds_calc.shape}")
-                
-                # Compute similarities using sklearn's cosine_similarity
-                query_emb_2d = query_embedding.reshape(1, -1)
-                candidate_embs_2d = cand_embeds_calc
-                logger.debug(f"Shapes - Query: {query_emb_2d.shape}, Candidates: {candidate_embs_2d.shape}")
-                
-                similarities = cosine_similarity(query_emb_2d, candidate_embs_2d)[0].tolist()
-                logger.debug(f"Computed similarities: {similarities[:5]}...")
+                similarities = cosine_similarities(query_embedding, cand_embeds_calc, normalized=True)
 
         elif method == "string":
-            logger.debug("Using string similarity method...")
-            similarities = [
-                self.compute_string_similarity(query, candidate)
-                for candidate in candidates
-            ]
-            logger.debug(f"String similarities: {similarities[:5]}...")
+            similarities = np.asarray(
+                _batch_string_similarity(query, candidates), dtype=np.float64
+            )
         else:
             logger.error(f"Unknown similarity method requested: {method}")
             raise ValueError(f"Unknown similarity method: {method}")
 
+        if survivors is not None and similarities is not None and len(similarities) == len(survivors):
+            # Back to original indices; prefiltered-out candidates can never pass the threshold
+            full = np.full(len(all_candidates), -np.inf, dtype=np.float64)
+            full[survivors] = similarities
+            similarities, candidates = full, all_candidates
+
         if similarities is None or len(similarities) == 0:
             logger.error("No similarities computed")
             return []
-
-        # Log top 5 similarity scores for debugging
-        top_scores = sorted(enumerate(similarities), key=lambda x: x[1], reverse=True)[:5]
-        logger.info(f"Query: {query}")
-        logger.info("Top 5 similarity scores:")
-        for idx, score in top_scores:
-            logger.info(f"Score: {score:.4f} - Candidate: {candidates[idx]}")
-
-        # Filter and sort by similarity
-        similar_indices = [
-            (i, score) for i, score in enumerate(similarities) if score >= threshold
-        ]
-        similar_indices.sort(key=lambda x: x[1], reverse=True)
+        if log_debug:
+            logger.debug(f"{method} similarities, first scores: {similarities[:5]}")
+
+        # Log top 5 similarity scores for debugging (partial sort, not the full list)
+        if log_info:
+            k = min(5, len(similarities))
+            top = np.argpartition(-similarities, k - 1)[:k]
+            logger.info(f"Query: {query}")
+            logger.info("Top 5 similarity scores:")
+            for idx in top[np.argsort(-similarities[top])]:
+                candidate = candidates[idx] if idx < len(candidates) else f"#{idx}"
+                logger.info(f"Score: {similarities[idx]:.4f} - Candidate: {candidate}")
+
+        # Filter, then sort only the top `limit` candidates above the threshold
+        above = np.flatnonzero(similarities >= threshold)
+        if limit is not None and 0 < limit < above.size:
+            # Keep the lowest indices among ties at the cut, as the stable full sort would
+            kth = np.partition(-similarities[above], limit - 1)[limit - 1]
+            above = above[-similarities[above] <= kth]
+        above = above[np.argsort(-similarities[above], kind="stable")]
+        if limit is not None:
+            above = above[:max(limit, 0)]
+        similar_indices = [(int(i), float(similarities[i])) for i in above]
         
-        logger.info(f"Found {len(similar_indices)} candidates above threshold {threshold}")
+        if log_info:
+            logger.info(f"Found {len(similar_indices)} candidates above threshold {threshold}")
         return similar_indices
 
     # Entity extraction is less about similarity and more about NLP/parsing.
@@ -399,31 +964,18 @@ class Text2SQLSimilarity:
             Dictionary of entity types and values.
         """
         entities = {}
-        # Extract dates (simple regex pattern - adjust as needed)
-        # Example: Matches YYYY-MM-DD, MM/DD/YYYY, M/D/YY
-        date_pattern = (
-            r"\b(\d{4}-\d{1,2}-\d{1,2})\b|\b(\d{1,2}/\d{1,2}/(\d{2}|\d{4}))\b"
-        )
-        dates = [match[0] or match[1] for match in re.findall(date_pattern, query)]
+        dates = [match[0] or match[1] for match in _DATE_RE.findall(query)]
         if dates:
             entities["dates"] = list(set(dates))  # Use set to remove duplicates
 
-        # Extract numbers (integers and decimals)
-        number_pattern = r"\b\d+(\.\d+)?\b"
-        numbers = re.findall(number_pattern, query)
-        # Flatten the list of tuples from findall and remove empty strings
-        numbers = [num[0] for num in numbers if num[0]]
+        numbers = _NUMBER_RE.findall(query)
         if numbers:
             entities["numbers"] = list(set(numbers))
 
-        # Extract potential named entities (simple: Capitalized words not at sentence start)
-        # This is VERY basic and error-prone. Use spaCy, NLTK, etc. for real NER.
-        # Matches sequences of capitalized words.
-        named_entity_pattern = r"\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b"
         # Avoid matching words at the very beginning of the string for simplicity
         named_entities = [
             match
-            for match in re.findall(named_entity_pattern, query)
+            for match in _NAMED_ENTITY_RE.findall(query)
             if not query.startswith(match)
         ]
         if named_entities:
@@ -0,0 +1,181 @@
+"""
+Optional approximate nearest-neighbour index for vector search.
+
+Wraps a Faiss HNSW graph over L2-normalised embeddings, where inner product
+equals cosine similarity. HNSW graphs cannot delete vectors, so each vector is
+stored under a sequential label that maps back to its cache entry id; replaced
+or deleted entries are tombstoned and filtered out of search results. Once
+tombstones make up NLC_ANN_COMPACT_RATIO of the stored vectors (default 0.25),
+the graph is rebuilt from the live vectors.
+
+Faiss is an optional dependency. Check `FAISS_AVAILABLE` before constructing
+an index.
+"""
+
+import logging
+import os
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    faiss = None
+    FAISS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Fraction of tombstoned vectors at which the graph is rebuilt without them
+_COMPACT_RATIO = float(os.environ.get("NLC_ANN_COMPACT_RATIO", "0.25"))
+# Small graphs are not worth rebuilding for a handful of tombstones
+_COMPACT_MIN_DEAD = 64
+
+
+class HNSWVectorIndex:
+    """Faiss HNSW index over unit-length embeddings keyed by cache entry id."""
+
+    def __init__(self, dim: int, m: int = 32, ef_construction: int = 80, ef_search: int = 64):
+        """Create an empty index.
+
+        Args:
+            dim: Embedding dimension.
+            m: Number of graph neighbours per node.
+            ef_construction: Candidate list size while building the graph.
+            ef_search: Candidate list size while searching (recall/speed trade-off).
+
+        Raises:
+            ImportError: If faiss is not installed.
+        """
+        if not FAISS_AVAILABLE:
+            raise ImportError("faiss is required for HNSWVectorIndex (pip install faiss-cpu)")
+        self.index = faiss.IndexHNSWFlat(dim, m, faiss.METRIC_INNER_PRODUCT)
+        self.index.hnsw.efConstruction = ef_construction
+        self.index.hnsw.efSearch = ef_search
+        self._label_ids = np.empty(0, dtype=np.int64)  # label -> entry id, -1 when tombstoned
+        self._id_labels: Dict[int, int] = {}
+
+    @property
+    def dim(self) -> int:
+        """Embedding dimension of the index."""
+        return self.index.d
+
+    @property
+    def dead_count(self) -> int:
+        """Number of tombstoned vectors still stored in the graph."""
+        return len(self._label_ids) - len(self._id_labels)
+
+    def __len__(self) -> int:
+        return len(self._id_labels)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray) -> None:
+        """Add or replace vectors for the given entry ids.
+
+        Args:
+            ids: Cache entry ids, one per row of `vectors`.
+            vectors: 2D array of unit-length embeddings.
+        """
+        ids = [int(entry_id) for entry_id in ids]
+        if not ids:
+            return
+        self.remove(ids)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        first_label = len(self._label_ids)
+        self.index.add(vectors)
+        self._label_ids = np.concatenate([self._label_ids, np.asarray(ids, dtype=np.int64)])
+        for offset, entry_id in enumerate(ids):
+            self._id_labels[entry_id] = first_label + offset
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Tombstone the vectors of the given entry ids.
+
+        Args:
+            ids: Cache entry ids to remove.
+        """
+        for entry_id in ids:
+            label = self._id_labels.pop(int(entry_id), None)
+            if label is not None:
+                self._label_ids[label] = -1
+        dead = self.dead_count
+        if dead >= _COMPACT_MIN_DEAD and dead >= _COMPACT_RATIO * len(self._label_ids):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rebuild the graph from the live vectors, dropping every tombstone.
+
+        The stored vectors are exact (HNSW over a flat store), so the rebuilt
+        graph scores the same; only search recall over live entries improves.
+        """
+        live_labels = np.flatnonzero(self._label_ids >= 0)
+        index = faiss.IndexHNSWFlat(
+            self.index.d, self.index.hnsw.nb_neighbors(1), faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = self.index.hnsw.efConstruction
+        index.hnsw.efSearch = self.index.hnsw.efSearch
+        if len(live_labels):
+            index.add(self.index.reconstruct_n(0, self.index.ntotal)[live_labels])
+        logger.info(f"Compacted vector index: dropped {self.dead_count} tombstones, kept {len(live_labels)}")
+        self.index = index
+        self._label_ids = self._label_ids[live_labels]
+        self._id_labels = {int(entry_id): label for label, entry_id in enumerate(self._label_ids)}
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Return up to `k` (entry_id, approximate cosine) pairs, best first.
+
+        Args:
+            query: Unit-length query embedding.
+            k: Number of live neighbours wanted.
+        """
+        if not self._id_labels or k <= 0:
+            return []
+        # Over-fetch by every tombstone, so k live neighbours fit even if all of
+        # them rank first; compaction keeps the tombstone count bounded
+        fetch = min(len(self._label_ids), k + self.dead_count)
+        query = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+        scores, labels = self.index.search(query, fetch)
+        hits = []
+        for score, label in zip(scores[0], labels[0]):
+            if label < 0:
+                continue
+            entry_id = int(self._label_ids[label])
+            if entry_id >= 0:
+                hits.append((entry_id, float(score)))
+                if len(hits) == k:
+                    break
+        return hits
+
+    def save(self, path: str) -> None:
+        """Persist the graph and its label map next to each other.
+
+        Args:
+            path: File path for the Faiss index; the label map is written to `<path>.ids.npy`.
+        """
+        faiss.write_index(self.index, path)
+        np.save(f"{path}.ids.npy", self._label_ids)
+        logger.info(f"Saved vector index with {len(self)} entries to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "HNSWVectorIndex":
+        """Load an index written by `save`.
+
+        Args:
+            path: File path passed to `save`.
+
+        Raises:
+            ImportError: If faiss is not installed.
+            FileNotFoundError: If the index or its label map is missing.
+        """
+        if not FAISS_AVAILABLE:
+            raise ImportError("faiss is required for HNSWVectorIndex (pip install faiss-cpu)")
+        if not os.path.exists(path) or not os.path.exists(f"{path}.ids.npy"):
+            raise FileNotFoundError(f"No vector index found at {path}")
+        instance = cls.__new__(cls)
+        instance.index = faiss.read_index(path)
+        instance._label_ids = np.load(f"{path}.ids.npy")
+        instance._id_labels = {
+            int(entry_id): label
+            for label, entry_id in enumerate(instance._label_ids)
+            if entry_id >= 0
+        }
+        return instance